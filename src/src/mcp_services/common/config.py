@@ -160,7 +160,11 @@ BASE_CONFIG = {
     "embedding": {
         "url": os.getenv("EMBEDDING_SERVICE_URL", "http://192.168.1.160:7000"),
         "model": os.getenv("EMBEDDING_MODEL_NAME", "bge-large-zh-v1.5"),
-        "timeout": int(os.getenv("EMBEDDING_TIMEOUT", "300"))  # 超时时间（秒）
+        "timeout": int(os.getenv("EMBEDDING_TIMEOUT", "300")),  # 超时时间（秒）
+        "batch_timeout": int(os.getenv("EMBEDDING_BATCH_TIMEOUT", "60")),  # 批量向量化时单批超时（秒）
+        "max_in_flight": int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4")),  # 批量向量化时同时在途的批次数
+        "max_batch_chars": int(os.getenv("EMBEDDING_MAX_BATCH_CHARS", "32000")),  # 单批字符预算上限
+        "max_batch_texts": int(os.getenv("EMBEDDING_MAX_BATCH_TEXTS", "256"))  # 单批最大条数
     },
     
     # -------------------------------------------------------------------------
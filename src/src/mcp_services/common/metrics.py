@@ -0,0 +1,388 @@
+"""
+轻量指标库 - Prometheus文本格式
+=============
+
+不依赖prometheus_client,提供三种指标:
+- Counter: 只增计数
+- Gauge: 当前值(可用回调函数在采集时取值)
+- Histogram: 固定分桶直方图(累计分桶 + sum + count)
+
+每个带标签的子指标各自持有一把锁,记录一次只有一次加锁和几次加法,开销可忽略。
+
+多进程部署(gunicorn多个工作进程)时,各进程定期把快照写入共享目录(<pid>.json),
+采集时合并所有存活进程的快照(计数/分桶/当前值均相加)。
+
+用法:
+    from common.metrics import REGISTRY, Counter, Histogram
+
+    REQUESTS = Counter('app_requests_total', '请求数', ['route'])
+    LATENCY = Histogram('app_request_duration_seconds', '请求耗时', ['route'])
+
+    REQUESTS.labels('/api/x').inc()
+    LATENCY.labels('/api/x').observe(0.12)
+    text = REGISTRY.render()
+"""
+import bisect
+import json
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 默认分桶(秒): 覆盖毫秒级的本地操作到数十秒的批量请求
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _CounterChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def reset(self):
+        # 锁也重建: fork时其他线程可能正持有父进程的锁
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def snapshot(self):
+        return self.value
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ('function',)
+
+    def __init__(self):
+        super().__init__()
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        """采集时调用function取值"""
+        self.function = function
+
+    def snapshot(self):
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception as e:
+                logger.warning(f"⚠️ 指标回调失败: {e}")
+                return math.nan
+        return self.value
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', '_bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> '_Timer':
+        """计时上下文: with histogram.labels(...).time(): ..."""
+        return _Timer(self)
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self._bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def snapshot(self):
+        with self._lock:
+            return [list(self.counts), self.sum, self.count]
+
+
+class _Timer:
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: 'Registry' = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """按标签值取子指标(首次使用时创建)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def reset(self):
+        """子指标原地清零(不替换对象,调用方缓存的labels()子指标重置后仍然有效;回调取值的保留回调)"""
+        self._lock = threading.Lock()
+        for child in list(self._children.values()):
+            child.reset()
+
+    def snapshot(self) -> Dict:
+        return {
+            'type': self.type,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'samples': [[list(key), child.snapshot()] for key, child in list(self._children.items())]
+        }
+
+
+class Counter(_Metric):
+    """只增计数"""
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """当前值"""
+    type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self.labels().set_function(function)
+
+
+class Histogram(_Metric):
+    """固定分桶直方图"""
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS, registry: 'Registry' = None):
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def snapshot(self) -> Dict:
+        snapshot = super().snapshot()
+        snapshot['buckets'] = list(self.buckets)
+        return snapshot
+
+
+# ==================== 注册表与输出 ====================
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[str, str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _merge(snapshots: List[Dict]) -> Dict:
+    """合并多个进程的快照(同名同标签的值相加)"""
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, 'samples': {}})
+            for key, value in metric['samples']:
+                key = tuple(key)
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = value
+                elif metric['type'] == 'histogram':
+                    target['samples'][key] = [
+                        [a + b for a, b in zip(current[0], value[0])], current[1] + value[1], current[2] + value[2]
+                    ]
+                else:
+                    target['samples'][key] = current + value
+    return merged
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self.multiprocess_dir: Optional[Path] = None
+        self._writer: Optional[threading.Thread] = None
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标重复注册: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def reset(self):
+        """清空所有指标的值(fork出的子进程不继承父进程的计数)"""
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def snapshot(self) -> Dict:
+        return {name: metric.snapshot() for name, metric in list(self._metrics.items())}
+
+    # ==================== 多进程 ====================
+
+    def enable_multiprocess(self, directory: Path, interval: float = 5.0):
+        """
+        启用多进程合并: 本进程每interval秒把快照写入directory/<pid>.json
+
+        可重复调用(fork后在子进程中再次调用会启动子进程自己的写入线程)。
+        """
+        self.multiprocess_dir = Path(directory)
+        self.multiprocess_dir.mkdir(parents=True, exist_ok=True)
+
+        if self._writer and self._writer.is_alive():
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.write_snapshot()
+
+        self._writer = threading.Thread(target=run, name='metrics-writer', daemon=True)
+        self._writer.start()
+
+    def write_snapshot(self):
+        """写入本进程快照(原子替换)"""
+        if not self.multiprocess_dir:
+            return
+        path = self.multiprocess_dir / f'{os.getpid()}.json'
+        temp = path.with_suffix('.tmp')
+        try:
+            temp.write_text(json.dumps(self.snapshot()), encoding='utf-8')
+            os.replace(temp, path)
+        except Exception as e:
+            logger.warning(f"⚠️ 写入指标快照失败: {e}")
+
+    def _process_snapshots(self) -> List[Dict]:
+        """本进程最新快照 + 其他存活进程的快照(已退出进程的文件删除)"""
+        snapshots = [self.snapshot()]
+        if not self.multiprocess_dir:
+            return snapshots
+
+        for path in self.multiprocess_dir.glob('*.json'):
+            try:
+                pid = int(path.stem)
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            if not _pid_alive(pid):
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                snapshots.append(json.loads(path.read_text(encoding='utf-8')))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    # ==================== 输出 ====================
+
+    def render(self) -> str:
+        """Prometheus文本格式"""
+        lines = []
+        for name, metric in sorted(_merge(self._process_snapshots()).items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            labelnames = metric['labelnames']
+
+            for key, value in sorted(metric['samples'].items()):
+                if metric['type'] != 'histogram':
+                    lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+                    continue
+
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(metric['buckets'] + [math.inf], counts):
+                    cumulative += bucket_count
+                    le = _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, key, ('le', le))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labelnames, key)} {count}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid: int) -> bool:
+    # Windows上os.kill会结束目标进程,不能用于探测
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# 默认注册表
+REGISTRY = Registry()
@@ -0,0 +1,410 @@
+"""
+轻量请求追踪 - 内存环形缓冲
+=============
+
+每个请求一条追踪(trace),请求内的各阶段(Dify调用、内容解析、序列化、SQLite写入等)各记一个跨度(span):
+- 跨度通过contextvars关联到当前请求,嵌套调用自动形成父子关系
+- 完成的追踪保存在固定容量的环形缓冲中(只保留最近的N条)
+- 多进程部署时各进程定期把每个请求名最慢的N条写入快照文件,查询时合并所有存活进程的快照
+- 可导出为JSON,或OTLP/JSON格式(可直接导入Jaeger/Tempo等OpenTelemetry后端)
+
+没有进行中的追踪时(后台线程、启动预热),span()直接返回,几乎没有开销。
+
+用法:
+    from common.tracing import TRACER, span, traced
+
+    TRACER.start_trace('GET /api/x')
+    with span('dify.get_segment', segment_id='...'):
+        ...
+    TRACER.end_trace(status=200)
+
+    @traced('parse')
+    def parse(...): ...
+
+线程池中执行的任务需用 contextvars.copy_context().run 提交,跨度才会归入提交它的请求。
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .metrics import _pid_alive
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('current_trace', default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+class Span:
+    """一个阶段的耗时记录"""
+    __slots__ = ('name', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+
+class Trace:
+    """一个请求的全部跨度(根跨度为请求本身)"""
+
+    def __init__(self, name: str, attributes: Dict):
+        self.trace_id = _new_id(16)
+        self.root = Span(name, None, attributes)
+        self.spans: List[Span] = [self.root]
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        # 线程池中的任务可能并发追加
+        with self._lock:
+            self.spans.append(span)
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ms
+
+    def stages(self) -> Dict[str, Dict]:
+        """按阶段名汇总耗时(并发执行的同名阶段耗时相加,可能超过请求总耗时)"""
+        stages: Dict[str, Dict] = {}
+        for span in self.spans[1:]:
+            stage = stages.setdefault(span.name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stage['count'] += 1
+            stage['total_ms'] += span.duration_ms
+            stage['max_ms'] = max(stage['max_ms'], span.duration_ms)
+        for stage in stages.values():
+            stage['total_ms'] = round(stage['total_ms'], 3)
+            stage['max_ms'] = round(stage['max_ms'], 3)
+        return dict(sorted(stages.items(), key=lambda item: item[1]['total_ms'], reverse=True))
+
+    def to_dict(self) -> Dict:
+        depth = {self.root.span_id: 0}
+        spans = []
+        for span in sorted(self.spans, key=lambda item: item.start_ns):
+            depth[span.span_id] = depth.get(span.parent_id, -1) + 1
+            spans.append({
+                'name': span.name,
+                'span_id': span.span_id,
+                'parent_id': span.parent_id,
+                'depth': depth[span.span_id],
+                'offset_ms': round((span.start_ns - self.root.start_ns) / 1e6, 3),
+                'duration_ms': round(span.duration_ms, 3),
+                'attributes': span.attributes,
+                'error': span.error
+            })
+        return {
+            'trace_id': self.trace_id,
+            'name': self.root.name,
+            'started_at': self.root.start_ns / 1e9,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': self.root.attributes,
+            'error': self.root.error,
+            'stages': self.stages(),
+            'spans': spans
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Trace':
+        """由to_dict()的结果还原(合并其他进程的快照用,时间精度为微秒)"""
+        trace = cls.__new__(cls)
+        trace.trace_id = data['trace_id']
+        trace.spans = []
+        trace._lock = threading.Lock()
+        root_start_ns = int(data['started_at'] * 1e9)
+        for item in data['spans']:
+            span = Span.__new__(Span)
+            span.name = item['name']
+            span.span_id = item['span_id']
+            span.parent_id = item['parent_id']
+            span.start_ns = root_start_ns + int(item['offset_ms'] * 1e6)
+            span.end_ns = span.start_ns + int(item['duration_ms'] * 1e6)
+            span.attributes = item['attributes']
+            span.error = item['error']
+            trace.spans.append(span)
+        trace.root = next(span for span in trace.spans if span.parent_id is None)
+        return trace
+
+
+class _SpanContext:
+    """span()返回的上下文(没有进行中的追踪时不记录)"""
+    __slots__ = ('_name', '_attributes', '_trace', '_span', '_token')
+
+    def __init__(self, name: str, attributes: Dict):
+        self._name = name
+        self._attributes = attributes
+        self._span = None
+
+    def __enter__(self) -> Optional[Span]:
+        trace = _current_trace.get()
+        if trace is None:
+            return None
+        parent = _current_span.get()
+        self._trace = trace
+        self._span = Span(self._name, parent.span_id if parent else trace.root.span_id, self._attributes)
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is None:
+            return False
+        self._span.end_ns = time.time_ns()
+        if exc is not None:
+            self._span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self._trace.add(self._span)
+        return False
+
+
+class Tracer:
+    """追踪器: 管理当前请求的追踪,保存最近完成的追踪"""
+
+    def __init__(self, capacity: int = 500, enabled: bool = True):
+        self.enabled = enabled
+        self._finished: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._recorded = 0
+        self.multiprocess_dir: Optional[Path] = None
+        self._snapshot_per_name = 20
+        self._written: Optional[int] = None
+        self._writer: Optional[threading.Thread] = None
+
+    def configure(self, capacity: int = None, enabled: bool = None):
+        """调整容量(保留最近的追踪)或启用状态"""
+        if enabled is not None:
+            self.enabled = enabled
+        if capacity is not None:
+            with self._lock:
+                self._finished = deque(self._finished, maxlen=capacity)
+
+    @property
+    def capacity(self) -> int:
+        return self._finished.maxlen
+
+    def start_trace(self, name: str, **attributes) -> Optional[Trace]:
+        """开始一条追踪(绑定到当前上下文)"""
+        if not self.enabled:
+            return None
+        trace = Trace(name, attributes)
+        _current_trace.set(trace)
+        _current_span.set(trace.root)
+        return trace
+
+    def end_trace(self, error: str = None, **attributes) -> Optional[Trace]:
+        """结束当前追踪并放入环形缓冲"""
+        trace = _current_trace.get()
+        if trace is None:
+            return None
+        trace.root.end_ns = time.time_ns()
+        trace.root.attributes.update(attributes)
+        trace.root.error = error
+        _current_trace.set(None)
+        _current_span.set(None)
+        with self._lock:
+            self._finished.append(trace)
+            self._recorded += 1
+        return trace
+
+    def current_trace(self) -> Optional[Trace]:
+        return _current_trace.get()
+
+    def traces(self) -> List[Trace]:
+        """最近完成的追踪(从旧到新)"""
+        with self._lock:
+            return list(self._finished)
+
+    def slowest(self, limit: int = 20, name: str = None) -> List[Trace]:
+        """最近完成的追踪中耗时最长的limit条(可按请求名过滤)"""
+        traces = [trace for trace in self.traces() if name is None or trace.root.name == name]
+        return sorted(traces, key=lambda trace: trace.duration_ms, reverse=True)[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._finished.clear()
+            self._recorded += 1
+
+    # ==================== 多进程 ====================
+
+    def enable_multiprocess(self, directory: Path, interval: float = 5.0, per_name: int = 20):
+        """
+        启用多进程合并: 本进程每interval秒把每个请求名最慢的per_name条追踪写入directory/<pid>.json
+
+        limit不超过per_name时,merged_slowest()按请求名或全局取到的都是所有进程中最慢的追踪。
+        可重复调用(fork后在子进程中再次调用会启动子进程自己的写入线程)。
+        """
+        self.multiprocess_dir = Path(directory)
+        self.multiprocess_dir.mkdir(parents=True, exist_ok=True)
+        self._snapshot_per_name = per_name
+
+        if self._writer and self._writer.is_alive():
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.write_snapshot()
+
+        self._writer = threading.Thread(target=run, name='traces-writer', daemon=True)
+        self._writer.start()
+
+    def snapshot(self) -> List[Dict]:
+        """本进程每个请求名最慢的per_name条追踪(to_dict格式)"""
+        by_name: Dict[str, List[Trace]] = {}
+        for trace in self.traces():
+            by_name.setdefault(trace.root.name, []).append(trace)
+        result = []
+        for traces in by_name.values():
+            traces.sort(key=lambda trace: trace.duration_ms, reverse=True)
+            result.extend(trace.to_dict() for trace in traces[:self._snapshot_per_name])
+        return result
+
+    def write_snapshot(self):
+        """写入本进程快照(原子替换,没有新追踪时跳过)"""
+        if not self.multiprocess_dir:
+            return
+        recorded = self._recorded
+        if recorded == self._written:
+            return
+        path = self.multiprocess_dir / f'{os.getpid()}.json'
+        temp = path.with_suffix('.tmp')
+        try:
+            temp.write_text(json.dumps(self.snapshot(), ensure_ascii=False, default=str), encoding='utf-8')
+            os.replace(temp, path)
+            self._written = recorded
+        except Exception as e:
+            logger.warning(f"⚠️ 写入追踪快照失败: {e}")
+
+    def _process_snapshots(self) -> List[List[Dict]]:
+        """其他存活进程的快照(已退出进程的文件删除)"""
+        snapshots = []
+        if not self.multiprocess_dir:
+            return snapshots
+
+        for path in self.multiprocess_dir.glob('*.json'):
+            try:
+                pid = int(path.stem)
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            if not _pid_alive(pid):
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                snapshots.append(json.loads(path.read_text(encoding='utf-8')))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def merged_slowest(self, limit: int = 20, name: str = None) -> Dict:
+        """
+        所有进程中耗时最长的limit条追踪(本进程最新 + 其他进程快照,快照最多滞后一个写入间隔)
+
+        返回 {'traces': [...], 'processes': 进程数}
+        """
+        traces = self.traces()
+        snapshots = self._process_snapshots()
+        for snapshot in snapshots:
+            traces.extend(Trace.from_dict(item) for item in snapshot)
+        traces = [trace for trace in traces if name is None or trace.root.name == name]
+        return {
+            'traces': sorted(traces, key=lambda trace: trace.duration_ms, reverse=True)[:limit],
+            'processes': len(snapshots) + 1
+        }
+
+    # ==================== 导出 ====================
+
+    def export_json(self, traces: List[Trace] = None) -> List[Dict]:
+        return [trace.to_dict() for trace in (self.traces() if traces is None else traces)]
+
+    def export_otlp(self, service_name: str, traces: List[Trace] = None) -> Dict:
+        """OTLP/JSON格式(ExportTraceServiceRequest)"""
+        spans = []
+        for trace in (self.traces() if traces is None else traces):
+            for span in trace.spans:
+                spans.append({
+                    'traceId': trace.trace_id,
+                    'spanId': span.span_id,
+                    'parentSpanId': span.parent_id or '',
+                    'name': span.name,
+                    'kind': 2 if span is trace.root else 1,  # SERVER / INTERNAL
+                    'startTimeUnixNano': str(span.start_ns),
+                    'endTimeUnixNano': str(span.end_ns or span.start_ns),
+                    'attributes': [_otlp_attribute(key, value) for key, value in span.attributes.items()],
+                    'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+                })
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', service_name)]},
+                'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}]
+            }]
+        }
+
+    def export_file(self, path: Path, service_name: str, fmt: str = 'otlp', traces: List[Trace] = None) -> Path:
+        """导出到文件(fmt: json / otlp)"""
+        payload = self.export_otlp(service_name, traces) if fmt == 'otlp' else self.export_json(traces)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(payload, ensure_ascii=False), encoding='utf-8')
+        return path
+
+
+def _otlp_attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+def span(name: str, **attributes) -> _SpanContext:
+    """记录一个阶段: with span('dify.add_segment'): ..."""
+    return _SpanContext(name, attributes)
+
+
+def traced(name: str):
+    """函数装饰器: 每次调用记为一个阶段(支持协程函数)"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _SpanContext(name, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _SpanContext(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# 默认追踪器
+TRACER = Tracer()
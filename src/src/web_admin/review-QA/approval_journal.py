@@ -0,0 +1,184 @@
+"""
+审核转移事务日志 - 多步骤转移的崩溃恢复
+====================================
+
+审核通过/文档间转移 = 在目标文档添加分段 + 删除原分段,两步之间任何失败或进程崩溃
+都会留下重复分段。本模块在每一步执行前后记录状态:
+
+    adding  -> 已记录意图,添加请求可能已发出
+    added   -> 目标文档已添加(记录新分段ID),原分段待删除
+    done    -> 原分段已删除,转移完成
+    aborted -> 目标文档未添加,转移放弃(原分段保持不变)
+
+后台恢复任务定期处理一段时间内没有进展的未完成转移(请求中途失败、进程崩溃或被终止遗留的):
+- added: 重新删除原分段(原分段已不存在视为完成)
+- adding: 在目标文档中查找相同内容的分段,找到则继续删除原分段,否则放弃
+"""
+
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ApprovalJournal:
+    """SQLite持久化的转移事务日志"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path), timeout=10)
+
+    def init_db(self):
+        """初始化事务日志表"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS approval_moves (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                segment_id TEXT NOT NULL,
+                source_dataset_id TEXT NOT NULL,
+                source_document_id TEXT NOT NULL,
+                target_dataset_id TEXT NOT NULL,
+                target_document_id TEXT NOT NULL,
+                content TEXT NOT NULL,
+                new_segment_id TEXT,
+                status TEXT NOT NULL DEFAULT 'adding',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_moves_status ON approval_moves(status, created_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_moves_updated ON approval_moves(status, updated_at)')
+        conn.commit()
+        conn.close()
+
+    def _update(self, move_id: int, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{key} = ?' for key in fields)
+        conn = self._connect()
+        conn.execute(f'UPDATE approval_moves SET {assignments} WHERE id = ?', (*fields.values(), move_id))
+        conn.commit()
+        conn.close()
+
+    def begin(self, segment_id: str, source_dataset_id: str, source_document_id: str,
+              target_dataset_id: str, target_document_id: str, content: str) -> int:
+        """记录转移意图(在发出添加请求之前调用),返回转移ID"""
+        now = time.time()
+        conn = self._connect()
+        cursor = conn.execute('''
+            INSERT INTO approval_moves (
+                segment_id, source_dataset_id, source_document_id,
+                target_dataset_id, target_document_id, content, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (segment_id, source_dataset_id, source_document_id,
+              target_dataset_id, target_document_id, content, now, now))
+        conn.commit()
+        move_id = cursor.lastrowid
+        conn.close()
+        return move_id
+
+    def mark_added(self, move_id: int, new_segment_id: Optional[str]):
+        """目标文档已添加"""
+        self._update(move_id, status='added', new_segment_id=new_segment_id)
+
+    def mark_done(self, move_id: int):
+        """原分段已删除,转移完成"""
+        self._update(move_id, status='done', last_error=None)
+
+    def mark_aborted(self, move_id: int, error: str):
+        """目标文档未添加,放弃转移"""
+        self._update(move_id, status='aborted', last_error=error)
+
+    def record_error(self, move_id: int, error: str):
+        """记录一次失败(状态不变,留待恢复任务处理)"""
+        conn = self._connect()
+        conn.execute('''
+            UPDATE approval_moves SET attempts = attempts + 1, last_error = ?, updated_at = ?
+            WHERE id = ?
+        ''', (error, time.time(), move_id))
+        conn.commit()
+        conn.close()
+
+    def incomplete(self, stale_seconds: float = 0) -> List[Dict]:
+        """未完成的转移(可限定为最近stale_seconds秒内没有更新的)"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute('''
+            SELECT * FROM approval_moves
+            WHERE status IN ('adding', 'added') AND updated_at < ?
+            ORDER BY id
+        ''', (time.time() - stale_seconds,)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def recover(self, client, stale_seconds: float = 0) -> Dict[str, int]:
+        """
+        完成或放弃未完成的转移
+
+        Args:
+            client: Dify客户端(需提供 get_all_segments / delete_segment)
+            stale_seconds: 只处理最近stale_seconds秒内没有更新的转移,避免干扰正在进行的请求
+                (需大于一次转移请求的最长耗时;每次失败会更新时间,相当于重试间隔)
+
+        Returns:
+            {'finished': 完成数, 'aborted': 放弃数, 'failed': 仍未完成数}
+        """
+        summary = {'finished': 0, 'aborted': 0, 'failed': 0}
+        moves = self.incomplete(stale_seconds)
+
+        if not moves:
+            return summary
+
+        logger.info(f"🔄 恢复未完成的审核转移 [数量={len(moves)}]")
+        target_contents = {}  # (dataset_id, document_id) -> {content: segment_id}
+
+        for move in moves:
+            move_id = move['id']
+
+            if move['status'] == 'adding':
+                key = (move['target_dataset_id'], move['target_document_id'])
+                if key not in target_contents:
+                    result = client.get_all_segments(*key)
+                    target_contents[key] = (
+                        {seg.get('content'): seg.get('id') for seg in result['data']}
+                        if result['success'] else None
+                    )
+
+                contents = target_contents[key]
+                if contents is None:
+                    self.record_error(move_id, '获取目标文档失败')
+                    summary['failed'] += 1
+                    continue
+
+                new_segment_id = contents.get(move['content'])
+                if not new_segment_id:
+                    # 添加请求未生效,原分段保持不变
+                    self.mark_aborted(move_id, '目标文档中未找到添加的分段')
+                    summary['aborted'] += 1
+                    continue
+
+                self.mark_added(move_id, new_segment_id)
+
+            delete_result = client.delete_segment(
+                move['source_dataset_id'], move['source_document_id'], move['segment_id']
+            )
+
+            if delete_result['success'] or delete_result.get('status_code') == 404:
+                self.mark_done(move_id)
+                summary['finished'] += 1
+            else:
+                self.record_error(move_id, delete_result.get('error', '删除原分段失败'))
+                summary['failed'] += 1
+
+        logger.info(
+            f"✅ 审核转移恢复完成 [完成={summary['finished']}, 放弃={summary['aborted']}, 未完成={summary['failed']}]"
+        )
+        return summary
@@ -0,0 +1,278 @@
+"""
+异步HTTP客户端 - Dify / 本地查询API / BGE嵌入服务
+====================================
+
+供ASGI模式(review_qa_asgi.py)使用,全部请求共用同一个事件循环和连接池:
+1. AsyncDifyClient: 只读接口,返回结构与DifyAPIClient一致({'success': ..., 'data': ...})
+2. AsyncEmbeddingClient: 与EmbeddingClient相同的字符预算组批/失败分类与拆分重试/自适应预算,
+   批次以协程并发在途(拆分后的两半依次请求,在途请求数不超过max_in_flight);同步调用embed()时把请求提交到事件循环执行(供线程池中的查重任务使用)
+
+等待I/O的请求只占用一个协程,不再各占一个线程。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from embedding_client import EmbeddingClient
+from review_metrics import track_dify_async
+from common.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDifyClient:
+    """Dify API异步客户端(只读)"""
+
+    def __init__(self, session: aiohttp.ClientSession, base_url: str, api_key: str, max_concurrency: int = 16):
+        """
+        Args:
+            session: 共用的aiohttp会话(连接池)
+            base_url: Dify API地址
+            api_key: Dify知识库API密钥
+            max_concurrency: 同时发往Dify的最大请求数
+        """
+        self.session = session
+        self.base_url = base_url
+        self.headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _get(self, url: str, params: dict = None, timeout: float = 30) -> dict:
+        async with self._semaphore:
+            async with self.session.get(
+                url, headers=self.headers, params=params, timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
+
+    @traced('dify.get_segment')
+    @track_dify_async('get_segment')
+    async def get_segment(self, dataset_id: str, document_id: str, segment_id: str) -> dict:
+        """获取单个分段"""
+        url = f"{self.base_url}/datasets/{dataset_id}/documents/{document_id}/segments/{segment_id}"
+
+        try:
+            result = await self._get(url, timeout=10)
+            return {'success': True, 'data': result.get('data')}
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"获取分段失败 [segment_id={segment_id}]: {e}")
+            return {'success': False, 'error': str(e), 'status_code': e.status}
+        except Exception as e:
+            logger.error(f"获取分段失败 [segment_id={segment_id}]: {e}")
+            return {'success': False, 'error': str(e)}
+
+    @traced('dify.get_document_segments')
+    @track_dify_async('get_document_segments')
+    async def get_document_segments(self, dataset_id: str, document_id: str, page: int = 1, limit: int = 100) -> dict:
+        """获取文档的一页分段"""
+        url = f"{self.base_url}/datasets/{dataset_id}/documents/{document_id}/segments"
+
+        try:
+            return {'success': True, 'data': await self._get(url, params={'page': page, 'limit': limit})}
+        except Exception as e:
+            logger.error(f"获取分段失败: {e}")
+            return {'success': False, 'error': str(e)}
+
+    @traced('dify.get_all_segments')
+    @track_dify_async('get_all_segments')
+    async def get_all_segments(self, dataset_id: str, document_id: str, limit: int = 100) -> dict:
+        """
+        获取文档的所有分段
+
+        第一页返回total时其余页并发请求,否则按has_more逐页请求。
+        """
+        first = await self.get_document_segments(dataset_id, document_id, page=1, limit=limit)
+        if not first['success']:
+            return first
+
+        data = first['data']
+        all_segments = list(data.get('data', []))
+        if not data.get('has_more', False):
+            return {'success': True, 'data': all_segments}
+
+        total = data.get('total')
+        if isinstance(total, int) and total > limit:
+            pages = range(2, (total + limit - 1) // limit + 1)
+            results = await asyncio.gather(*[
+                self.get_document_segments(dataset_id, document_id, page=page, limit=limit) for page in pages
+            ])
+            for result in results:
+                if not result['success']:
+                    return result
+                all_segments.extend(result['data'].get('data', []))
+            return {'success': True, 'data': all_segments}
+
+        page = 2
+        while True:
+            result = await self.get_document_segments(dataset_id, document_id, page=page, limit=limit)
+            if not result['success']:
+                return result
+            all_segments.extend(result['data'].get('data', []))
+            if not result['data'].get('has_more', False):
+                break
+            page += 1
+
+        return {'success': True, 'data': all_segments}
+
+
+class AsyncEmbeddingClient(EmbeddingClient):
+    """BGE嵌入服务异步客户端(组批与自适应策略同EmbeddingClient)"""
+
+    def __init__(self, session: aiohttp.ClientSession, url: str, model: str, **kwargs):
+        """
+        Args:
+            session: 共用的aiohttp会话(必须在事件循环中创建)
+            url / model / kwargs: 同EmbeddingClient
+        """
+        super().__init__(url, model, **kwargs)
+        self.session = session
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+
+    def bind(self):
+        """绑定当前线程的事件循环(在事件循环中调用;同步embed()把请求提交到该循环)"""
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.current_thread()
+
+    async def _arequest(self, texts: List[str]) -> np.ndarray:
+        async with self.session.post(
+            f"{self.url}/v1/embeddings",
+            json={"input": texts, "model": self.model},
+            timeout=aiohttp.ClientTimeout(total=self.timeout, sock_connect=self.connect_timeout)
+        ) as response:
+            response.raise_for_status()
+            payload = await response.json()
+        data = sorted(payload['data'], key=lambda item: item.get('index', 0))
+        if len(data) != len(texts):
+            raise ValueError(f"返回向量数量不匹配: {len(data)} != {len(texts)}")
+        return np.array([item['embedding'] for item in data])
+
+    @staticmethod
+    def _error_status(error: Exception) -> Optional[int]:
+        # 响应格式错误(如ContentTypeError)也是ClientResponseError,状态码为200,按格式错误处理
+        if isinstance(error, aiohttp.ClientResponseError) and error.status >= 400:
+            return error.status
+        return EmbeddingClient._error_status(error)
+
+    @staticmethod
+    def _is_unreachable(error: Exception) -> bool:
+        # 连接超时不可达;读取超时/总超时(也是ClientConnectionError或asyncio.TimeoutError)按批次过大处理
+        if isinstance(error, getattr(aiohttp, 'ConnectionTimeoutError', ())):
+            return True
+        if isinstance(error, asyncio.TimeoutError):
+            return False
+        return isinstance(error, aiohttp.ClientConnectionError) or EmbeddingClient._is_unreachable(error)
+
+    async def _aembed_batch(self, texts: List[str], metrics: Dict, attempt: int = 0) -> np.ndarray:
+        """请求一个批次,与批次内容有关的失败对半拆分重试(两半依次请求),不可恢复的失败立即报错"""
+        self._check_aborted(metrics)
+        start = time.perf_counter()
+        try:
+            self._count(metrics, 'requests')
+            embeddings = await self._arequest(texts)
+            self._adjust_budget(time.perf_counter() - start)
+            return embeddings
+        except Exception as e:
+            self._adjust_budget(None)
+            kind = self._record_failure(e, metrics)
+            if kind == 'fatal':
+                raise
+
+            if kind == 'split' and len(texts) > 1:
+                self._count(metrics, 'splits')
+                middle = len(texts) // 2
+                logger.warning(f"⚠️ 向量批次失败,拆分重试 [数量={len(texts)}]: {e}")
+                return np.vstack([
+                    await self._aembed_batch(texts[:middle], metrics),
+                    await self._aembed_batch(texts[middle:], metrics)
+                ])
+
+            if attempt < self.max_retries:
+                self._count(metrics, 'retries')
+                await asyncio.sleep(2 ** attempt)
+                return await self._aembed_batch(texts, metrics, attempt + 1)
+
+            logger.error(f"❌ 向量生成失败 [重试{attempt}次]: {e}")
+            raise
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        """
+        生成文本向量(协程)
+
+        Returns:
+            向量矩阵 (n, dim),顺序与输入一致
+        """
+        embeddings, self.last_metrics = await self._aembed(texts)
+        return embeddings
+
+    async def _aembed(self, texts: List[str]) -> Tuple[np.ndarray, Dict]:
+        """生成文本向量,同时返回本次的吞吐指标"""
+        metrics = {
+            'texts': len(texts),
+            'chars': sum(len(text) for text in texts),
+            'batches': 0,
+            'requests': 0,
+            'failures': 0,
+            'retries': 0,
+            'splits': 0,
+            'aborted': False
+        }
+        if not texts:
+            return np.zeros((0, 0)), {**metrics, 'seconds': 0.0, 'texts_per_second': 0.0, 'chars_per_second': 0.0}
+
+        started = time.perf_counter()
+        results = {}
+        position = 0
+        in_flight = {}
+
+        while position < len(texts) or in_flight:
+            # 补满在途批次(每批按最新的字符预算组批)
+            while position < len(texts) and len(in_flight) < self.max_in_flight:
+                end = self._next_batch(texts, position)
+                task = asyncio.ensure_future(self._aembed_batch(texts[position:end], metrics))
+                in_flight[task] = position
+                metrics['batches'] += 1
+                position = end
+
+            finished, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                offset = in_flight.pop(task)
+                try:
+                    results[offset] = task.result()
+                except Exception:
+                    # 取消其余在途批次并等待其结束,aembed()返回后不再有遗留请求
+                    metrics['aborted'] = True
+                    for pending in in_flight:
+                        pending.cancel()
+                    await asyncio.gather(*in_flight, return_exceptions=True)
+                    raise
+
+        embeddings = np.vstack([results[offset] for offset in sorted(results)])
+
+        seconds = time.perf_counter() - started
+        metrics['seconds'] = round(seconds, 3)
+        metrics['texts_per_second'] = round(len(texts) / seconds, 1) if seconds else 0.0
+        metrics['chars_per_second'] = round(metrics['chars'] / seconds, 1) if seconds else 0.0
+
+        logger.info(
+            f"✅ 向量生成完成 [数量={len(texts)}, 批次={metrics['batches']}, 请求={metrics['requests']}, "
+            f"拆分={metrics['splits']}, 耗时={metrics['seconds']}秒, {metrics['texts_per_second']}条/秒]"
+        )
+        return embeddings, metrics
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """同步接口: 在工作线程中调用,请求在绑定的事件循环上执行"""
+        if self.loop is None:
+            raise RuntimeError("AsyncEmbeddingClient 尚未绑定事件循环")
+        if threading.current_thread() is self._loop_thread:
+            raise RuntimeError("不能在事件循环线程中同步调用embed(),请使用 await aembed()")
+        embeddings, self.last_metrics = asyncio.run_coroutine_threadsafe(self._aembed(texts), self.loop).result()
+        return embeddings
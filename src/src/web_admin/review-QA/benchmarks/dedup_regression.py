@@ -0,0 +1,302 @@
+"""
+查重引擎微基准与回归门禁 - DuplicateChecker.find_duplicates / format_duplicate_groups
+====================================
+
+在合成向量(重复结构已知)上运行查重,不依赖BGE服务:
+- 紧密簇:     2~5个分段,两两相似度约0.95以上
+- 传递链:     相邻相似度0.9、隔一个约0.62,全链应合并为一组(并查集传递)
+- 字面重复:   只差标点/全半角/空白的文本,由字面预筛合并(共用一个向量)
+- 独立分段:   随机单位向量,与其他分段相似度远低于阈值
+各规模分别测量:
+- 耗时: find_duplicates 与 format_duplicate_groups(重复多次取最小值)
+- 内存峰值: tracemalloc(含numpy分配)
+- 分组: 规范化分组(代表分段 + 排序后的成员)的摘要,以及对预置结构的召回
+
+与基准文件(dedup_baseline.json)比较,任一规模出现以下情况即失败(退出码1):
+- 分组摘要与基准不同(查重结果变化)
+- 耗时超过 基准 × (1 + --time-tolerance) 且超出 --time-slack 秒
+- 内存峰值超过 基准 × (1 + --memory-tolerance)
+耗时基准与机器相关,换机器后先用 --update-baseline 重新生成;分组摘要与机器无关。
+
+用法:
+    python benchmarks/dedup_regression.py                      # 与基准比较(部署前运行)
+    python benchmarks/dedup_regression.py --update-baseline    # 重新生成基准
+    python benchmarks/dedup_regression.py --sizes 1000,5000 --repeats 5
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from duplicate_checker import DuplicateChecker
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'dedup_baseline.json'
+
+# 合成数据中各结构的占比(其余为独立分段)
+CLUSTER_SHARE = 0.15
+CHAIN_SHARE = 0.05
+LEXICAL_SHARE = 0.05
+
+
+class PlantedEmbeddingClient:
+    """按文本返回预置向量的嵌入客户端(替代BGE服务,接口同EmbeddingClient)"""
+
+    def __init__(self, vectors: np.ndarray, rows: Dict[str, int]):
+        self.vectors = vectors
+        self.rows = rows
+        self.last_metrics = {}
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        embeddings = self.vectors[[self.rows[text] for text in texts]]
+        self.last_metrics = {
+            'texts': len(texts), 'chars': sum(len(text) for text in texts), 'batches': 1, 'requests': 1,
+            'failures': 0, 'retries': 0, 'splits': 0, 'seconds': 0.0
+        }
+        return embeddings
+
+
+def _random_text(rng: random.Random, length: int) -> str:
+    return ''.join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(length))
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    return vector / np.linalg.norm(vector)
+
+
+def build_dataset(n: int, dim: int, seed: int = 0) -> Tuple[List[Dict], np.ndarray, Dict[str, int], List[List[str]]]:
+    """
+    生成n个分段及其向量
+
+    Returns:
+        (分段列表(已打乱), 向量矩阵, 文本 -> 向量行, 预置的重复组[分段ID列表])
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    vectors: List[np.ndarray] = []
+    rows: Dict[str, int] = {}
+    segments: List[Dict] = []
+    planted: List[List[str]] = []
+
+    def add(question: str, answer: str, vector_row: int) -> str:
+        segment_id = f'seg-{len(segments):07d}'
+        segments.append({
+            'id': segment_id,
+            'question': question,
+            'answer': answer,
+            'document_id': 'doc',
+            'document_name': '合成',
+            'classification': '-',
+            'created_at': 0,
+            'updated_at': 0
+        })
+        rows[DuplicateChecker.segment_text(segments[-1])] = vector_row
+        return segment_id
+
+    def new_vector(vector: np.ndarray) -> int:
+        vectors.append(_unit(vector).astype(np.float32))
+        return len(vectors) - 1
+
+    def new_text() -> Tuple[str, str]:
+        return _random_text(rng, rng.randint(12, 30)), _random_text(rng, rng.randint(40, 120))
+
+    # 紧密簇: 中心向量加小噪声
+    remaining = int(n * CLUSTER_SHARE)
+    while remaining >= 2:
+        size = min(rng.randint(2, 5), remaining)
+        center = np_rng.normal(size=dim)
+        center /= np.linalg.norm(center)
+        planted.append([
+            add(*new_text(), new_vector(center + np_rng.normal(scale=0.1 / np.sqrt(dim), size=dim)))
+            for _ in range(size)
+        ])
+        remaining -= size
+
+    # 传递链: 平面内按固定角度旋转,相邻cos=0.9
+    theta = np.arccos(0.9)
+    remaining = int(n * CHAIN_SHARE)
+    while remaining >= 3:
+        size = min(rng.randint(3, 4), remaining)
+        basis = np.linalg.qr(np_rng.normal(size=(dim, 2)))[0].T
+        planted.append([
+            add(*new_text(), new_vector(np.cos(k * theta) * basis[0] + np.sin(k * theta) * basis[1]))
+            for k in range(size)
+        ])
+        remaining -= size
+
+    # 字面重复: 同一向量,文本只差标点/空白
+    remaining = int(n * LEXICAL_SHARE)
+    while remaining >= 2:
+        question, answer = new_text()
+        row = new_vector(np_rng.normal(size=dim))
+        planted.append([
+            add(question, answer, row),
+            add(question + '?', ' ' + answer + '。', row)
+        ])
+        remaining -= 2
+
+    # 独立分段
+    while len(segments) < n:
+        add(*new_text(), new_vector(np_rng.normal(size=dim)))
+
+    rng.shuffle(segments)
+    return segments, np.vstack(vectors), rows, planted
+
+
+def canonical_groups(formatted: Dict) -> List[Tuple[str, List[str]]]:
+    """规范化分组: (代表分段, 排序后的成员),按代表分段排序"""
+    return sorted(
+        (group['representative_id'], sorted(item['segment_id'] for item in group['items']))
+        for group in formatted['groups']
+    )
+
+
+def grouping_digest(groups: List[Tuple[str, List[str]]]) -> str:
+    return hashlib.sha256(json.dumps(groups).encode('utf-8')).hexdigest()[:16]
+
+
+def planted_recall(groups: List[Tuple[str, List[str]]], planted: List[List[str]]) -> float:
+    """预置的重复组被完整找出的比例"""
+    found = {tuple(members) for _, members in groups}
+    return sum(tuple(sorted(group)) in found for group in planted) / len(planted) if planted else 1.0
+
+
+def measure(n: int, args) -> Dict:
+    """一个规模的耗时/内存/分组"""
+    segments, vectors, rows, planted = build_dataset(n, args.dim, args.seed)
+    checker = DuplicateChecker(precision=args.precision, embedding_client=PlantedEmbeddingClient(vectors, rows))
+
+    def run():
+        # find_duplicates会在分段上写入similarity_score,每次使用副本
+        batch = [dict(seg) for seg in segments]
+        start = time.perf_counter()
+        groups = checker.find_duplicates(batch, similarity_threshold=args.threshold)
+        middle = time.perf_counter()
+        formatted = checker.format_duplicate_groups(groups)
+        return middle - start, time.perf_counter() - middle, formatted
+
+    find_times, format_times = [], []
+    formatted = None
+    for _ in range(args.repeats):
+        find_seconds, format_seconds, formatted = run()
+        find_times.append(find_seconds)
+        format_times.append(format_seconds)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    groups = canonical_groups(formatted)
+    return {
+        'find_seconds': round(min(find_times), 4),
+        'format_seconds': round(min(format_times), 4),
+        'peak_mb': round(peak / 2**20, 2),
+        'total_groups': formatted['total_groups'],
+        'total_duplicates': formatted['total_duplicates'],
+        'grouping_digest': grouping_digest(groups),
+        'planted_recall': round(planted_recall(groups, planted), 4)
+    }
+
+
+def compare(size: str, current: Dict, baseline: Dict, args) -> List[str]:
+    """与基准比较,返回失败原因"""
+    failures = []
+    if current['grouping_digest'] != baseline['grouping_digest']:
+        failures.append(
+            f"分组变化 (组数 {baseline['total_groups']} -> {current['total_groups']}, "
+            f"条目 {baseline['total_duplicates']} -> {current['total_duplicates']})"
+        )
+    for key in ('find_seconds', 'format_seconds'):
+        budget = max(baseline[key] * (1 + args.time_tolerance), baseline[key] + args.time_slack)
+        if current[key] > budget:
+            failures.append(f"{key} {current[key]:.3f}s 超出预算 {budget:.3f}s (基准 {baseline[key]:.3f}s)")
+    budget = baseline['peak_mb'] * (1 + args.memory_tolerance)
+    if current['peak_mb'] > budget:
+        failures.append(f"peak_mb {current['peak_mb']:.1f}MB 超出预算 {budget:.1f}MB (基准 {baseline['peak_mb']:.1f}MB)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查重引擎微基准与回归门禁')
+    parser.add_argument('--sizes', default='1000,5000,20000', help='分段数,逗号分隔')
+    parser.add_argument('--dim', type=int, default=256, help='向量维度')
+    parser.add_argument('--threshold', type=float, default=0.85, help='相似度阈值')
+    parser.add_argument('--precision', default='float32', help='向量精度 float32 / float16 / int8')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--repeats', type=int, default=3, help='计时重复次数(取最小值)')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH), help='基准文件')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基准文件')
+    parser.add_argument('--time-tolerance', type=float, default=0.5, help='耗时允许超出基准的比例')
+    parser.add_argument('--time-slack', type=float, default=0.05, help='耗时允许超出基准的最小秒数(避免小规模抖动)')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25, help='内存峰值允许超出基准的比例')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    config = {'dim': args.dim, 'threshold': args.threshold, 'precision': args.precision, 'seed': args.seed}
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text(encoding='utf-8')) if baseline_path.exists() else None
+    if baseline and not args.update_baseline:
+        if baseline['config'] != config:
+            print(f"❌ 基准配置 {baseline['config']} 与本次 {config} 不一致,无法比较")
+            sys.exit(2)
+        if baseline.get('machine') != platform.node():
+            print(f"⚠️ 基准生成于 {baseline.get('machine')},耗时比较可能不准确(分组比较不受影响)")
+
+    print(f"配置: {config}")
+    print(f"\n{'规模':>8}{'find(秒)':>11}{'format(秒)':>12}{'内存峰值(MB)':>14}{'重复组':>8}{'重复条目':>10}"
+          f"{'预置召回':>10}  {'分组摘要':<18}结果")
+
+    results = {}
+    failed = False
+    for size in sizes:
+        current = measure(int(size), args)
+        results[size] = current
+
+        if args.update_baseline or not baseline:
+            status = '已记录'
+        elif size not in baseline['sizes']:
+            status = '无基准'
+        else:
+            failures = compare(size, current, baseline['sizes'][size], args)
+            failed = failed or bool(failures)
+            status = '通过' if not failures else '失败: ' + '; '.join(failures)
+
+        print(f"{size:>8}{current['find_seconds']:>11.3f}{current['format_seconds']:>12.3f}{current['peak_mb']:>14.1f}"
+              f"{current['total_groups']:>8}{current['total_duplicates']:>10}{current['planted_recall']:>10.2%}  "
+              f"{current['grouping_digest']:<18}{status}")
+
+    if args.update_baseline or not baseline:
+        baseline_path.write_text(json.dumps({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'machine': platform.node(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'config': config,
+            # 配置相同时保留本次未运行规模的基准
+            'sizes': {**(baseline['sizes'] if baseline and baseline['config'] == config else {}), **results}
+        }, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\n✅ 基准已写入 {baseline_path}")
+        return
+
+    if failed:
+        print("\n❌ 查重引擎回归检查未通过")
+        sys.exit(1)
+    print("\n✅ 查重引擎回归检查通过")
+
+
+if __name__ == '__main__':
+    main()
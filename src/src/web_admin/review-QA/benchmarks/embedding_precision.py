@@ -0,0 +1,99 @@
+"""
+查重向量精度基准 - float64 / float32 / float16 / int8
+====================================
+
+对比不同存储精度下的内存占用、相似边计算耗时和相对float64的精度漂移:
+- 内存: 向量矩阵占用字节数
+- 耗时: 分块计算全部相似边(上三角)
+- 漂移: 抽样行与全部向量的相似度最大/平均绝对误差
+- 边一致性: 阈值以上的相似边相对float64的召回率/精确率
+
+默认使用合成的聚簇单位向量(不依赖BGE服务),也可传入真实向量文件(.npy)。
+
+用法:
+    python benchmarks/embedding_precision.py --n 8000 --dim 1024 --threshold 0.85
+    python benchmarks/embedding_precision.py --npy embeddings.npy
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from embedding_quant import PRECISIONS, QuantizedEmbeddings
+
+
+def synthetic_embeddings(n: int, dim: int, clusters: int, noise: float, seed: int = 0) -> np.ndarray:
+    """聚簇的单位向量(簇内相似度分布在常用阈值附近)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + rng.normal(scale=noise, size=(n, dim))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def float64_pairs(embeddings: np.ndarray, threshold: float, block_size: int) -> set:
+    """float64基准相似边"""
+    edges = set()
+    for start in range(0, len(embeddings), block_size):
+        block = embeddings[start:start + block_size] @ embeddings[start:].T
+        rows, cols = np.nonzero(np.triu(block >= threshold, k=1))
+        edges.update(zip((rows + start).tolist(), (cols + start).tolist()))
+    return edges
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查重向量精度基准')
+    parser.add_argument('--npy', help='真实向量文件(.npy),不传则使用合成向量')
+    parser.add_argument('--n', type=int, default=8000, help='合成向量条数')
+    parser.add_argument('--dim', type=int, default=1024, help='合成向量维度')
+    parser.add_argument('--clusters', type=int, default=2000, help='合成向量簇数')
+    parser.add_argument('--noise', type=float, default=0.012, help='合成向量簇内噪声')
+    parser.add_argument('--threshold', type=float, default=0.85, help='相似度阈值')
+    parser.add_argument('--block-size', type=int, default=1024, help='分块大小')
+    parser.add_argument('--sample', type=int, default=200, help='计算漂移的抽样行数')
+    args = parser.parse_args()
+
+    if args.npy:
+        embeddings = np.load(args.npy).astype(np.float64)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    else:
+        embeddings = synthetic_embeddings(args.n, args.dim, args.clusters, args.noise * np.sqrt(1024 / args.dim))
+
+    n, dim = embeddings.shape
+    print(f"向量: n={n}, dim={dim}, 阈值={args.threshold}, 分块={args.block_size}")
+
+    start = time.perf_counter()
+    baseline_edges = float64_pairs(embeddings, args.threshold, args.block_size)
+    baseline_seconds = time.perf_counter() - start
+
+    sample = np.random.default_rng(1).choice(n, size=min(args.sample, n), replace=False)
+    baseline_sample = embeddings[sample] @ embeddings.T
+
+    print(f"\n{'精度':<8}{'内存(MB)':>10}{'内存比':>8}{'耗时(秒)':>10}{'加速':>8}"
+          f"{'最大误差':>12}{'平均误差':>12}{'边召回':>9}{'边精确':>9}")
+    print(f"{'float64':<8}{embeddings.nbytes / 2**20:>10.1f}{1.0:>8.1f}{baseline_seconds:>10.2f}{1.0:>8.1f}"
+          f"{0.0:>12.2e}{0.0:>12.2e}{1.0:>9.4f}{1.0:>9.4f}   边数={len(baseline_edges)}")
+
+    for precision in PRECISIONS:
+        quantized = QuantizedEmbeddings(embeddings, precision)
+
+        start = time.perf_counter()
+        edges = {(i, j) for i, j, _ in quantized.similar_pairs(args.threshold, args.block_size)}
+        seconds = time.perf_counter() - start
+
+        errors = np.abs(quantized.rows(sample) @ quantized.rows(slice(None)).T - baseline_sample)
+        common = len(edges & baseline_edges)
+        recall = common / len(baseline_edges) if baseline_edges else 1.0
+        precision_rate = common / len(edges) if edges else 1.0
+
+        print(f"{precision:<8}{quantized.nbytes / 2**20:>10.1f}{embeddings.nbytes / quantized.nbytes:>8.1f}"
+              f"{seconds:>10.2f}{baseline_seconds / seconds:>8.1f}"
+              f"{errors.max():>12.2e}{errors.mean():>12.2e}{recall:>9.4f}{precision_rate:>9.4f}   边数={len(edges)}")
+
+
+if __name__ == '__main__':
+    main()
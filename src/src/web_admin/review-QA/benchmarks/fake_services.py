@@ -0,0 +1,567 @@
+"""
+基准测试用本地替身服务 - Dify / 本地查询API / BGE嵌入服务
+====================================
+
+在本机启动三个HTTP服务,后端通过环境变量指向它们后即可离线运行全部接口:
+1. Dify知识库API: 文档列表、分段分页/单个查询、添加(批量)、更新、删除
+2. 本地查询API: GET /api/local/query?dataset_id=... (未审核知识库的全部分段)
+3. BGE嵌入服务: POST /v1/embeddings,返回确定性向量
+   (字符二元组哈希投影后归一化: 相同文本向量相同,近似文本相似度高)
+
+合成语料按真实内容格式生成(未审核区域):
+- 旧QA:          问:...\\n答:...(部分为中文冒号、多行答案)
+- 微信每日QA:    问：...\\n答：...\\n#source#:微信群...
+- 人工/用户添加: 问:...\\n答:...\\n添加人员:人工添加|用户添加
+已审核区域按 format_qa_content 的格式(含分类)分布在各分类文档中。
+约10%的分段是已有分段的近似改写,查重可得到重复组。
+
+用法(单独启动,供前端或手工测试):
+    python benchmarks/fake_services.py --size 10000
+    # 按输出的环境变量启动后端
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+# 与 review_qa_backend 中的知识库配置一致
+UNREVIEWED_DATASET_ID = "1397b9d1-8e25-4269-ba12-046059a425b6"
+REVIEWED_DATASET_ID = "2df8ca5b-ac31-4dba-8b48-fc09f678b62d"
+
+OLD_QA_DOCUMENT_ID = "1a92b558-2051-4ebc-9441-2209dfd356b8"       # 旧QA
+WECHAT_QA_DOCUMENT_ID = "ee3a5cb0-3fa9-4cd1-9a1a-113bc43b5d5a"    # 微信每日QA
+MANUAL_QA_DOCUMENT_ID = "a025564c-33b4-458e-835b-324ac75c0e24"    # 人工/用户添加
+
+UNREVIEWED_DOCUMENTS = {
+    OLD_QA_DOCUMENT_ID: "旧QA",
+    WECHAT_QA_DOCUMENT_ID: "微信每日QA",
+    MANUAL_QA_DOCUMENT_ID: "人工/用户添加"
+}
+
+REVIEWED_DOCUMENTS = {
+    "e4d103ba-ab38-4c0b-8c4d-5fd65da451e0": "接线类",
+    "6ed1a963-f4f4-4755-8f58-65ed4ccad67e": "电机类",
+    "0f615db6-35be-40b8-ad48-34db22ed2fb0": "触摸屏类",
+    "b22e210a-0bc8-496a-9828-c6016389bca2": "程序类",
+    "d894cff9-c9aa-4d56-a8ae-d09f979779bf": "产品型号功能类",
+    "fce7c466-da39-4c37-a281-225087f29dee": "产品维修类",
+    "4bc158d8-72e1-4881-a3c9-75d94f0c9e2a": "产品功能类",
+    "55e92a15-cc40-49de-a69d-2ef9e863a88a": "modbus通信地址表_SEN类",
+    "8f4f53d9-8a48-4a0a-aad3-b14b96a46c93": "产品知识类",
+    "9ac2c969-aea2-40a5-a57d-91b98e9421a2": "通信参数类",
+    "56f3277a-46d5-4dc0-9d1b-c86b92b979cd": "下载功能类",
+    "dbb66ae8-4d9a-4ea9-b5de-603f8d18e1b6": "咨询类",
+    "175f56a9-47ec-4c8f-b75e-cd57d8c99627": "通讯类",
+    "010a4033-033e-456d-8e13-452d86cb2c16": "操作类"
+}
+
+# 未审核区域各文档的占比
+UNREVIEWED_SHARES = {OLD_QA_DOCUMENT_ID: 0.4, WECHAT_QA_DOCUMENT_ID: 0.4, MANUAL_QA_DOCUMENT_ID: 0.2}
+
+DUPLICATE_RATE = 0.1  # 近似改写已有分段的比例
+
+
+# ==================== 合成语料 ====================
+
+PRODUCTS = ['PLC', '伺服驱动器', '伺服电机', '触摸屏', '变频器', '步进电机', '编码器', '扩展模块', '温控模块', '运动控制卡']
+MODELS = ['XD3-32T', 'XD5-48R', 'XL3-16T', 'DS5C-20P7', 'MS6H-60C', 'TG765S', 'TH765-N', 'VH5-20P7', 'XDH-60T4', 'DS3E-21P5']
+TOPICS = ['通信', '接线', '参数设置', '程序下载', '报警', '固件升级', '回原点', '脉冲输出', '模拟量', '高速计数', '密码', '掉电保持']
+DETAILS = ['波特率', '站号', 'modbus地址', '485端口', '网口', 'USB口', '刹车线', '编码器线', '电子齿轮比', 'PID参数', '定时器', '数据寄存器']
+QUESTION_TEMPLATES = [
+    '{model}{product}的{topic}怎么设置?',
+    '{product}{topic}时提示{detail}错误怎么办',
+    '{model}怎么修改{detail}',
+    '{product}和触摸屏{topic}失败,{detail}要怎么配置?',
+    '请问{product}的{detail}在哪里查看',
+    '{model}{topic}后{detail}不生效是什么原因',
+]
+ANSWER_SENTENCES = [
+    '先确认{product}已上电并且{detail}连接正常。',
+    '在编程软件中打开{topic}设置界面,将{detail}改为与上位机一致。',
+    '{model}出厂默认{detail}为1,修改后需要断电重启才能生效。',
+    '如果仍然报警,请检查{detail}接线是否松动,必要时更换线缆。',
+    '具体参数可参考{model}用户手册{chapter}章。',
+    '{topic}完成后建议做一次掉电保持测试。',
+    '也可以通过触摸屏直接修改{detail},无需连接电脑。',
+]
+WECHAT_GROUPS = ['技术交流1群', '技术交流2群', '售后服务群', '代理商群']
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    return template.format(
+        product=rng.choice(PRODUCTS), model=rng.choice(MODELS), topic=rng.choice(TOPICS),
+        detail=rng.choice(DETAILS), chapter=rng.randint(1, 12)
+    )
+
+
+def _question_answer(rng: random.Random) -> Tuple[str, str]:
+    question = _fill(rng.choice(QUESTION_TEMPLATES), rng)
+    answer = ''.join(_fill(sentence, rng) for sentence in rng.sample(ANSWER_SENTENCES, rng.randint(2, 4)))
+    return question, answer
+
+
+def _paraphrase(question: str, answer: str, rng: random.Random) -> Tuple[str, str]:
+    """近似改写(查重应判为重复)"""
+    question = question.rstrip('?？') + rng.choice(['?', '？', '', '呢?'])
+    if rng.random() < 0.5:
+        question = rng.choice(['请问', '你好,', '']) + question
+    if rng.random() < 0.5:
+        answer = answer + rng.choice(['谢谢。', '如有问题请联系售后。', ''])
+    return question, answer
+
+
+def _timestamp(rng: random.Random) -> int:
+    # 2024-01-01 ~ 2025-12-01
+    return rng.randint(1704067200, 1764547200)
+
+
+def format_unreviewed_content(document_id: str, question: str, answer: str, rng: random.Random) -> str:
+    """未审核区域的真实内容格式"""
+    if document_id == OLD_QA_DOCUMENT_ID:
+        if rng.random() < 0.3:
+            # 老数据: 中文冒号、答案分多行
+            return f"问：{question}\n答：\n" + answer.replace('。', '。\n', 1)
+        return f"问:{question}\n答:{answer}"
+    if document_id == WECHAT_QA_DOCUMENT_ID:
+        day = datetime.fromtimestamp(_timestamp(rng), tz=timezone.utc).strftime('%Y-%m-%d')
+        return f"问：{question}\n答：{answer}\n#source#:{rng.choice(WECHAT_GROUPS)} {day}"
+    add_type = '人工添加' if rng.random() < 0.6 else '用户添加'
+    source = f"\n#source#:{rng.choice(WECHAT_GROUPS)}" if rng.random() < 0.3 else ''
+    return f"问:{question}\n答:{answer}{source}\n添加人员:{add_type}"
+
+
+def format_reviewed_content(question: str, answer: str, classification: str) -> str:
+    """已审核区域的内容格式(同format_qa_content)"""
+    return f"问:{question}\n答:{answer}\n分类:{classification}"
+
+
+def _split(total: int, shares: Dict[str, float]) -> Dict[str, int]:
+    counts = {key: int(total * share) for key, share in shares.items()}
+    first = next(iter(counts))
+    counts[first] += total - sum(counts.values())
+    return counts
+
+
+def build_corpus(size: int, reviewed_ratio: float = 0.5, seed: int = 0) -> Dict[str, Dict[str, List[Dict]]]:
+    """
+    生成合成语料
+
+    Args:
+        size: 两个知识库的分段总数
+        reviewed_ratio: 已审核区域占比
+
+    Returns:
+        {dataset_id: {document_id: [segment, ...]}},segment为Dify分段结构
+    """
+    rng = random.Random(seed)
+    reviewed_total = int(size * reviewed_ratio)
+    plan = [
+        (UNREVIEWED_DATASET_ID, _split(size - reviewed_total, UNREVIEWED_SHARES)),
+        (REVIEWED_DATASET_ID, _split(reviewed_total, {doc_id: 1 / len(REVIEWED_DOCUMENTS) for doc_id in REVIEWED_DOCUMENTS}))
+    ]
+
+    corpus: Dict[str, Dict[str, List[Dict]]] = {}
+    for dataset_id, counts in plan:
+        pairs: List[Tuple[str, str]] = []
+        corpus[dataset_id] = {}
+        for document_id, count in counts.items():
+            segments = []
+            for position in range(1, count + 1):
+                if pairs and rng.random() < DUPLICATE_RATE:
+                    question, answer = _paraphrase(*rng.choice(pairs), rng)
+                else:
+                    question, answer = _question_answer(rng)
+                pairs.append((question, answer))
+
+                if dataset_id == UNREVIEWED_DATASET_ID:
+                    content = format_unreviewed_content(document_id, question, answer, rng)
+                else:
+                    content = format_reviewed_content(question, answer, REVIEWED_DOCUMENTS[document_id])
+                created_at = _timestamp(rng)
+                segments.append(make_segment(document_id, content, position, created_at, rng))
+            corpus[dataset_id][document_id] = segments
+    return corpus
+
+
+def make_segment(document_id: str, content: str, position: int, created_at: int, rng: random.Random = None,
+                 keywords: List[str] = None) -> Dict:
+    """Dify分段结构"""
+    segment_id = str(uuid.UUID(int=rng.getrandbits(128), version=4)) if rng else str(uuid.uuid4())
+    return {
+        'id': segment_id,
+        'position': position,
+        'document_id': document_id,
+        'content': content,
+        'answer': None,
+        'word_count': len(content),
+        'tokens': len(content),
+        'keywords': keywords or [],
+        'index_node_id': segment_id,
+        'index_node_hash': format(zlib.crc32(content.encode('utf-8')), 'x'),
+        'hit_count': 0,
+        'enabled': True,
+        'status': 'completed',
+        'created_at': created_at,
+        'updated_at': created_at
+    }
+
+
+# ==================== 知识库 ====================
+
+class FakeKnowledgeBase:
+    """内存中的Dify知识库(线程安全)"""
+
+    def __init__(self, corpus: Dict[str, Dict[str, List[Dict]]]):
+        self._lock = threading.Lock()
+        self._documents: Dict[str, Dict[str, Dict[str, Dict]]] = {}
+        self._document_meta: Dict[Tuple[str, str], Dict] = {}
+        self._lists: Dict[Tuple[str, str], List[Dict]] = {}
+        self._location: Dict[str, Tuple[str, str]] = {}
+
+        for dataset_id, documents in corpus.items():
+            self._documents[dataset_id] = {}
+            for document_id, segments in documents.items():
+                self._documents[dataset_id][document_id] = {segment['id']: segment for segment in segments}
+                self._document_meta[(dataset_id, document_id)] = {'updated_at': int(time.time())}
+                for segment in segments:
+                    self._location[segment['id']] = (dataset_id, document_id)
+
+    def _touch(self, dataset_id: str, document_id: str):
+        self._lists.pop((dataset_id, document_id), None)
+        self._document_meta[(dataset_id, document_id)]['updated_at'] = int(time.time())
+
+    def segments(self, dataset_id: str, document_id: str) -> Optional[List[Dict]]:
+        """文档的分段列表(按position排序,写入前缓存)"""
+        key = (dataset_id, document_id)
+        with self._lock:
+            documents = self._documents.get(dataset_id)
+            if documents is None or document_id not in documents:
+                return None
+            if key not in self._lists:
+                self._lists[key] = sorted(documents[document_id].values(), key=lambda segment: segment['position'])
+            return self._lists[key]
+
+    def documents(self, dataset_id: str) -> Optional[List[Dict]]:
+        with self._lock:
+            documents = self._documents.get(dataset_id)
+            if documents is None:
+                return None
+            result = []
+            for document_id, segments in documents.items():
+                result.append({
+                    'id': document_id,
+                    'name': {**UNREVIEWED_DOCUMENTS, **REVIEWED_DOCUMENTS}.get(document_id, document_id),
+                    'word_count': sum(segment['word_count'] for segment in segments.values()),
+                    'tokens': len(segments),
+                    'indexing_status': 'completed',
+                    'enabled': True,
+                    'created_at': 1704067200,
+                    'updated_at': self._document_meta[(dataset_id, document_id)]['updated_at']
+                })
+            return result
+
+    def get(self, segment_id: str) -> Optional[Dict]:
+        with self._lock:
+            location = self._location.get(segment_id)
+            return self._documents[location[0]][location[1]].get(segment_id) if location else None
+
+    def add(self, dataset_id: str, document_id: str, items: List[Dict]) -> Optional[List[Dict]]:
+        with self._lock:
+            documents = self._documents.get(dataset_id)
+            if documents is None or document_id not in documents:
+                return None
+            segments = documents[document_id]
+            position = max((segment['position'] for segment in segments.values()), default=0)
+            now = int(time.time())
+            created = []
+            for item in items:
+                position += 1
+                segment = make_segment(document_id, item.get('content', ''), position, now,
+                                       keywords=item.get('keywords'))
+                segments[segment['id']] = segment
+                self._location[segment['id']] = (dataset_id, document_id)
+                created.append(segment)
+            self._touch(dataset_id, document_id)
+            return created
+
+    def update(self, segment_id: str, content: str, keywords: List[str] = None) -> Optional[Dict]:
+        with self._lock:
+            location = self._location.get(segment_id)
+            if not location:
+                return None
+            segment = self._documents[location[0]][location[1]][segment_id]
+            segment.update({
+                'content': content, 'word_count': len(content), 'tokens': len(content),
+                'updated_at': int(time.time())
+            })
+            if keywords:
+                segment['keywords'] = keywords
+            self._touch(*location)
+            return segment
+
+    def delete(self, segment_id: str) -> bool:
+        with self._lock:
+            location = self._location.pop(segment_id, None)
+            if not location:
+                return False
+            del self._documents[location[0]][location[1]][segment_id]
+            self._touch(*location)
+            return True
+
+
+# ==================== HTTP服务 ====================
+
+class _Handler(BaseHTTPRequestHandler):
+    """路由表驱动的JSON处理器(keep-alive)"""
+    protocol_version = 'HTTP/1.1'
+    routes: List[Tuple[str, re.Pattern, str]] = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload=None):
+        body = b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+    def _dispatch(self, method: str):
+        parsed = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(parsed.path)
+            if route_method == method and match:
+                latency = self.server.latency
+                if latency:
+                    time.sleep(latency)
+                try:
+                    status, payload = getattr(self, handler)(query, **match.groupdict())
+                except Exception as e:
+                    status, payload = 500, {'code': 'internal_error', 'message': str(e)}
+                self._send(status, payload)
+                return
+        self._send(404, {'code': 'not_found', 'message': parsed.path})
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+_SEGMENTS = r'/v1/datasets/(?P<dataset_id>[^/]+)/documents/(?P<document_id>[^/]+)/segments'
+
+
+class DifyHandler(_Handler):
+    """Dify知识库API(/v1/datasets/...)"""
+    routes = [
+        ('GET', re.compile(r'/v1/datasets/(?P<dataset_id>[^/]+)/documents'), 'list_documents'),
+        ('GET', re.compile(_SEGMENTS), 'list_segments'),
+        ('POST', re.compile(_SEGMENTS), 'add_segments'),
+        ('GET', re.compile(_SEGMENTS + r'/(?P<segment_id>[^/]+)'), 'get_segment'),
+        ('POST', re.compile(_SEGMENTS + r'/(?P<segment_id>[^/]+)'), 'update_segment'),
+        ('DELETE', re.compile(_SEGMENTS + r'/(?P<segment_id>[^/]+)'), 'delete_segment'),
+    ]
+
+    @staticmethod
+    def _page(items: list, query: dict) -> dict:
+        page = max(1, int(query.get('page', 1)))
+        limit = max(1, min(100, int(query.get('limit', 20))))
+        start = (page - 1) * limit
+        return {
+            'data': items[start:start + limit],
+            'has_more': start + limit < len(items),
+            'limit': limit,
+            'total': len(items),
+            'page': page
+        }
+
+    def list_documents(self, query, dataset_id):
+        documents = self.server.kb.documents(dataset_id)
+        if documents is None:
+            return 404, {'code': 'not_found', 'message': 'Dataset not found'}
+        return 200, self._page(documents, query)
+
+    def list_segments(self, query, dataset_id, document_id):
+        segments = self.server.kb.segments(dataset_id, document_id)
+        if segments is None:
+            return 404, {'code': 'not_found', 'message': 'Document not found'}
+        return 200, {**self._page(segments, query), 'doc_form': 'text_model'}
+
+    def add_segments(self, query, dataset_id, document_id):
+        created = self.server.kb.add(dataset_id, document_id, self._body().get('segments', []))
+        if created is None:
+            return 404, {'code': 'not_found', 'message': 'Document not found'}
+        return 200, {'data': created, 'doc_form': 'text_model'}
+
+    def get_segment(self, query, dataset_id, document_id, segment_id):
+        segment = self.server.kb.get(segment_id)
+        if segment is None or segment['document_id'] != document_id:
+            return 404, {'code': 'not_found', 'message': 'Segment not found'}
+        return 200, {'data': segment, 'doc_form': 'text_model'}
+
+    def update_segment(self, query, dataset_id, document_id, segment_id):
+        payload = self._body().get('segment', {})
+        segment = self.server.kb.update(segment_id, payload.get('content', ''), payload.get('keywords'))
+        if segment is None:
+            return 404, {'code': 'not_found', 'message': 'Segment not found'}
+        return 200, {'data': segment, 'doc_form': 'text_model'}
+
+    def delete_segment(self, query, dataset_id, document_id, segment_id):
+        if not self.server.kb.delete(segment_id):
+            return 404, {'code': 'not_found', 'message': 'Segment not found'}
+        return 204, None
+
+
+class LocalQueryHandler(_Handler):
+    """本地查询API(直接查询Dify数据库的未审核分段)"""
+    routes = [('GET', re.compile(r'/api/local/query'), 'query')]
+
+    def query(self, query):
+        rows = []
+        for document_id in UNREVIEWED_DOCUMENTS:
+            for segment in self.server.kb.segments(query.get('dataset_id', ''), document_id) or []:
+                rows.append({
+                    'segment_id': segment['id'],
+                    'document_id': document_id,
+                    'content': segment['content'],
+                    'created_at': _utc_string(segment['created_at']),
+                    'updated_at': _utc_string(segment['updated_at'])
+                })
+        return 200, {'success': True, 'data': rows, 'total': len(rows)}
+
+
+def _utc_string(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def deterministic_embedding(text: str, dim: int) -> np.ndarray:
+    """字符二元组哈希投影(同一文本结果固定,共享二元组越多相似度越高)"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for index in range(max(1, len(text) - 1)):
+        digest = zlib.crc32(text[index:index + 2].encode('utf-8'))
+        vector[digest % dim] += 1.0 if digest & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class EmbeddingHandler(_Handler):
+    """BGE嵌入服务(OpenAI兼容的 /v1/embeddings)"""
+    routes = [('POST', re.compile(r'/v1/embeddings'), 'embeddings')]
+
+    def embeddings(self, query):
+        texts = self._body().get('input', [])
+        if isinstance(texts, str):
+            texts = [texts]
+        data = [
+            {'object': 'embedding', 'index': index,
+             'embedding': np.round(deterministic_embedding(text, self.server.dim), 6).tolist()}
+            for index, text in enumerate(texts)
+        ]
+        return 200, {'object': 'list', 'data': data, 'model': self.server.model}
+
+
+class FakeServices:
+    """同时运行三个替身服务(各自一个线程化HTTP服务器,端口为0时自动分配)"""
+
+    def __init__(self, corpus: Dict[str, Dict[str, List[Dict]]], host: str = '127.0.0.1',
+                 dify_port: int = 0, local_query_port: int = 0, embedding_port: int = 0,
+                 dify_latency_ms: float = 0, embedding_latency_ms: float = 0, embedding_dim: int = 256):
+        self.kb = FakeKnowledgeBase(corpus)
+        self.host = host
+        self._servers: List[ThreadingHTTPServer] = []
+        self._specs = [
+            ('dify', DifyHandler, dify_port, dify_latency_ms),
+            ('local_query', LocalQueryHandler, local_query_port, dify_latency_ms),
+            ('embedding', EmbeddingHandler, embedding_port, embedding_latency_ms),
+        ]
+        self.embedding_dim = embedding_dim
+        self.ports: Dict[str, int] = {}
+
+    def start(self) -> 'FakeServices':
+        for name, handler, port, latency_ms in self._specs:
+            server = ThreadingHTTPServer((self.host, port), handler)
+            server.daemon_threads = True
+            server.kb = self.kb
+            server.latency = latency_ms / 1000
+            server.dim = self.embedding_dim
+            server.model = 'bge-large-zh-v1.5'
+            threading.Thread(target=server.serve_forever, name=f'fake-{name}', daemon=True).start()
+            self._servers.append(server)
+            self.ports[name] = server.server_address[1]
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def env(self) -> Dict[str, str]:
+        """后端指向替身服务所需的环境变量"""
+        return {
+            'DIFY_API_BASE': f"http://{self.host}:{self.ports['dify']}/v1",
+            'REVIEW_LOCAL_QUERY_API_BASE': f"http://{self.host}:{self.ports['local_query']}/api/local/query",
+            'EMBEDDING_SERVICE_URL': f"http://{self.host}:{self.ports['embedding']}"
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动Dify/本地查询API/嵌入服务替身')
+    parser.add_argument('--size', type=int, default=1000, help='两个知识库的分段总数')
+    parser.add_argument('--reviewed-ratio', type=float, default=0.5, help='已审核区域占比')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--dify-port', type=int, default=18080)
+    parser.add_argument('--local-query-port', type=int, default=18081)
+    parser.add_argument('--embedding-port', type=int, default=18082)
+    parser.add_argument('--dify-latency-ms', type=float, default=0, help='每个Dify请求附加的延迟(毫秒)')
+    parser.add_argument('--embedding-latency-ms', type=float, default=0, help='每个向量请求附加的延迟(毫秒)')
+    parser.add_argument('--embedding-dim', type=int, default=256, help='向量维度')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    corpus = build_corpus(args.size, args.reviewed_ratio, args.seed)
+    services = FakeServices(
+        corpus, args.host, args.dify_port, args.local_query_port, args.embedding_port,
+        args.dify_latency_ms, args.embedding_latency_ms, args.embedding_dim
+    ).start()
+    print(f"✅ 替身服务已启动 [分段={args.size}, 生成耗时={time.perf_counter() - start:.1f}秒]")
+    for key, value in services.env().items():
+        print(f"export {key}={value}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        services.stop()
+
+
+if __name__ == '__main__':
+    main()
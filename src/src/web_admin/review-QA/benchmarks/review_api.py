@@ -0,0 +1,279 @@
+"""
+审核系统接口基准 - 离线运行(本地替身服务)
+====================================
+
+每个语料规模依次:
+1. 生成合成语料并启动Dify/本地查询API/嵌入服务替身(见 fake_services.py)
+2. 以 serve.py 启动后端子进程(数据目录为临时目录,不影响 resource/data),等待 /api/ready
+3. 按顺序运行场景,统计 p50/p99/平均耗时与吞吐(请求/秒):
+   - list_unreviewed  GET  /api/unreviewed/segments
+   - list_reviewed    GET  /api/reviewed/segments/<document_id>(轮流各分类文档)
+   - total_reviewed   GET  /api/stats/total-reviewed
+   - duplicate_check  POST /api/duplicates/check(首次为冷启动建索引,单独列出)
+   - approve          POST /api/segment/approve(每个请求一个不同的未审核分段)
+   - bulk_approve     POST /api/segments/batch(每个请求 --batch-size 个审核通过操作)
+   写操作会消耗未审核分段,放在最后运行。
+
+用法:
+    python benchmarks/review_api.py
+    python benchmarks/review_api.py --sizes 1000,10000,100000 --workers 2 --threads 8
+    python benchmarks/review_api.py --scenarios list_unreviewed,approve --dify-latency-ms 20 --no-mirror
+    python benchmarks/review_api.py --json-out bench.json
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_services import FakeServices, build_corpus, REVIEWED_DOCUMENTS, UNREVIEWED_DATASET_ID
+
+REVIEW_QA_DIR = Path(__file__).resolve().parent.parent
+
+SCENARIOS = ['list_unreviewed', 'list_reviewed', 'total_reviewed', 'duplicate_check', 'approve', 'bulk_approve']
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_load(name: str, make_request: Callable[[int], requests.Response], count: int, concurrency: int) -> Dict:
+    """并发执行count个请求,返回耗时统计"""
+    latencies = []
+    errors = 0
+
+    def one(index: int):
+        start = time.perf_counter()
+        try:
+            response = make_request(index)
+            ok = response.status_code < 400 and response.json().get('success', True)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for seconds, ok in executor.map(one, range(count)):
+            latencies.append(seconds)
+            errors += 0 if ok else 1
+    wall = time.perf_counter() - started
+
+    return {
+        'scenario': name,
+        'requests': count,
+        'concurrency': concurrency,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        'throughput': round(count / wall, 1) if wall else 0.0
+    }
+
+
+class BackendProcess:
+    """以serve.py启动的后端子进程"""
+
+    def __init__(self, env: Dict[str, str], port: int, workers: int, threads: int, log_path: Path):
+        self.base_url = f'http://127.0.0.1:{port}'
+        self.log_path = log_path
+        self._log = open(log_path, 'w', encoding='utf-8')
+        self.process = subprocess.Popen(
+            [sys.executable, 'serve.py', '--bind', f'127.0.0.1:{port}',
+             '--workers', str(workers), '--threads', str(threads)],
+            cwd=REVIEW_QA_DIR, env={**os.environ, **env}, stdout=self._log, stderr=subprocess.STDOUT
+        )
+
+    def wait_ready(self, timeout: float) -> float:
+        """等待 /api/ready 返回200,返回等待秒数(含启动预热)"""
+        started = time.perf_counter()
+        while time.perf_counter() - started < timeout:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'后端进程已退出,日志见 {self.log_path}')
+            try:
+                if requests.get(f'{self.base_url}/api/ready', timeout=2).status_code == 200:
+                    return time.perf_counter() - started
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        raise TimeoutError(f'后端未在{timeout}秒内就绪,日志见 {self.log_path}')
+
+    def tail(self, lines: int = 30) -> str:
+        """后端日志的最后几行"""
+        self._log.flush()
+        return '\n'.join(self.log_path.read_text(encoding='utf-8', errors='replace').splitlines()[-lines:])
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self._log.close()
+
+
+def run_size(size: int, args) -> List[Dict]:
+    """运行一个语料规模的全部场景"""
+    print(f"\n==================== 分段总数 {size} ====================")
+    started = time.perf_counter()
+    corpus = build_corpus(size, args.reviewed_ratio, args.seed)
+    print(f"语料生成: {time.perf_counter() - started:.1f}秒")
+
+    # 待审核通过的分段(approve与bulk_approve各自使用不重叠的分段)
+    rng = random.Random(args.seed)
+    pending = [
+        (document_id, segment)
+        for document_id, segments in corpus[UNREVIEWED_DATASET_ID].items()
+        for segment in segments
+    ]
+    rng.shuffle(pending)
+    reviewed_ids = list(REVIEWED_DOCUMENTS)
+
+    def take(count: int) -> List:
+        taken = pending[:count]
+        del pending[:count]
+        return taken
+
+    def approve_operation(item, index: int) -> Dict:
+        document_id, segment = item
+        question, _, answer = segment['content'].partition('\n答')
+        answer = re.split(r'\n(?:#source#|添加人员)', answer[1:])[0]
+        return {
+            'source_document_id': document_id,
+            'segment_id': segment['id'],
+            'target_document_id': reviewed_ids[index % len(reviewed_ids)],
+            'question': question[2:].strip() or '问题',
+            'answer': answer.strip() or '答案'
+        }
+
+    results = []
+    with FakeServices(corpus, dify_latency_ms=args.dify_latency_ms,
+                      embedding_latency_ms=args.embedding_latency_ms, embedding_dim=args.embedding_dim) as services, \
+            tempfile.TemporaryDirectory(prefix='review-bench-') as data_dir:
+        env = {
+            **services.env(),
+            'REVIEW_DATA_DIR': data_dir,
+            'REVIEW_MIRROR_ENABLED': 'false' if args.no_mirror else 'true',
+            'REVIEW_WRITE_BEHIND_ENABLED': 'true' if args.write_behind else 'false'
+        }
+        backend = BackendProcess(env, args.port, args.workers, args.threads, Path(data_dir) / 'backend.log')
+        try:
+            try:
+                ready_seconds = backend.wait_ready(args.ready_timeout)
+            except (RuntimeError, TimeoutError):
+                print(backend.tail())
+                raise
+            print(f"后端就绪(含启动预热): {ready_seconds:.1f}秒")
+            base = backend.base_url
+            session = requests.Session()
+            session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=max(args.concurrency, 10)))
+
+            for scenario in args.scenarios:
+                if scenario == 'list_unreviewed':
+                    result = run_load(scenario, lambda i: session.get(f'{base}/api/unreviewed/segments', timeout=600),
+                                      args.requests, args.concurrency)
+                elif scenario == 'list_reviewed':
+                    result = run_load(scenario, lambda i: session.get(
+                        f'{base}/api/reviewed/segments/{reviewed_ids[i % len(reviewed_ids)]}', timeout=600
+                    ), args.requests, args.concurrency)
+                elif scenario == 'total_reviewed':
+                    result = run_load(scenario, lambda i: session.get(f'{base}/api/stats/total-reviewed', timeout=600),
+                                      args.requests, args.concurrency)
+                elif scenario == 'duplicate_check':
+                    def check(i):
+                        return session.post(f'{base}/api/duplicates/check', timeout=3600, json={
+                            'scope': 'reviewed', 'similarity_threshold': args.threshold
+                        })
+                    results.append({**run_load('duplicate_check_cold', check, 1, 1), 'size': size})
+                    result = run_load(scenario, check, args.dedup_repeats, 1)
+                elif scenario == 'approve':
+                    items = take(args.requests)
+                    result = run_load(scenario, lambda i: session.post(
+                        f'{base}/api/segment/approve', json=approve_operation(items[i], i), timeout=600
+                    ), len(items), args.concurrency)
+                elif scenario == 'bulk_approve':
+                    batches = [take(args.batch_size) for _ in range(args.bulk_requests)]
+                    batches = [batch for batch in batches if batch]
+                    result = run_load(scenario, lambda i: session.post(f'{base}/api/segments/batch', timeout=600, json={
+                        'operations': [
+                            {'op': 'approve', **approve_operation(item, index)} for index, item in enumerate(batches[i])
+                        ]
+                    }), len(batches), args.concurrency)
+                    result['batch_size'] = args.batch_size
+                else:
+                    raise ValueError(f'未知场景: {scenario}')
+                results.append({**result, 'size': size})
+        finally:
+            backend.stop()
+
+    return results
+
+
+def print_table(results: List[Dict]):
+    print(f"\n{'规模':>8}  {'场景':<22}{'请求':>6}{'并发':>6}{'失败':>6}"
+          f"{'p50(ms)':>11}{'p99(ms)':>11}{'平均(ms)':>11}{'吞吐(请求/秒)':>15}")
+    for result in results:
+        print(f"{result['size']:>8}  {result['scenario']:<22}{result['requests']:>6}{result['concurrency']:>6}"
+              f"{result['errors']:>6}{result['p50_ms']:>11}{result['p99_ms']:>11}{result['mean_ms']:>11}"
+              f"{result['throughput']:>15}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='审核系统接口基准(本地替身服务)')
+    parser.add_argument('--sizes', default='1000', help='语料规模(分段总数),逗号分隔,如 1000,10000,100000')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f'场景,逗号分隔: {",".join(SCENARIOS)}')
+    parser.add_argument('--requests', type=int, default=50, help='每个场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发客户端数')
+    parser.add_argument('--bulk-requests', type=int, default=5, help='bulk_approve的请求数')
+    parser.add_argument('--batch-size', type=int, default=50, help='bulk_approve每个请求的操作数')
+    parser.add_argument('--dedup-repeats', type=int, default=3, help='duplicate_check热启动的重复次数')
+    parser.add_argument('--threshold', type=float, default=0.85, help='查重相似度阈值')
+    parser.add_argument('--reviewed-ratio', type=float, default=0.5, help='已审核区域占比')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--workers', type=int, default=2, help='后端工作进程数')
+    parser.add_argument('--threads', type=int, default=8, help='后端每个进程的线程数')
+    parser.add_argument('--port', type=int, default=15003, help='后端监听端口')
+    parser.add_argument('--dify-latency-ms', type=float, default=0, help='每个Dify/本地查询请求附加的延迟(毫秒)')
+    parser.add_argument('--embedding-latency-ms', type=float, default=0, help='每个向量请求附加的延迟(毫秒)')
+    parser.add_argument('--embedding-dim', type=int, default=256, help='替身向量维度')
+    parser.add_argument('--no-mirror', action='store_true', help='关闭本地镜像(列表/计数直接请求Dify)')
+    parser.add_argument('--write-behind', action='store_true', help='开启write-behind模式')
+    parser.add_argument('--ready-timeout', type=float, default=1800, help='等待后端就绪的最长秒数')
+    parser.add_argument('--json-out', help='结果写入JSON文件')
+    args = parser.parse_args()
+    args.scenarios = [scenario.strip() for scenario in args.scenarios.split(',') if scenario.strip()]
+
+    results = []
+    for size in (int(size) for size in args.sizes.split(',')):
+        results.extend(run_size(size, args))
+        print_table([result for result in results if result['size'] == size])
+
+    if len(args.sizes.split(',')) > 1:
+        print("\n==================== 汇总 ====================")
+        print_table(results)
+
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps({
+            'args': {key: value for key, value in vars(args).items() if key != 'json_out'},
+            'results': results
+        }, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\n结果已写入 {args.json_out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,14 +4,15 @@ QA查重模块 - 使用BGE嵌入模型 + 余弦相似度
 
 功能:
 1. 加载已审核知识库的所有QA
-2. 使用BGE模型生成向量
-3. 计算余弦相似度
-4. 返回重复组
+2. 字面预筛: 规范化哈希 + MinHash LSH 找出完全/近似逐字重复,每簇只保留一个代表
+3. 使用BGE模型为代表分段生成向量(按字符预算自适应组批,多批并发)
+4. 分块计算余弦相似度,得到不低于阈值的相似边(向量默认float32存储,可选float16/int8)
+5. 并查集合并相似边,连通分量即重复组(含代表分段和组内统计)
+6. 交叉查重: 未审核分段逐个查询已审核分段的向量(分块矩阵乘),按未审核分段分组
 """
 
-import requests
 import numpy as np
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Tuple
 import logging
 from pathlib import Path
 import sys
@@ -19,25 +20,74 @@ import sys
 # 添加项目路径
 sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'mcp_services'))
 from common.config import BASE_CONFIG
+from embedding_client import EmbeddingClient
+from embedding_quant import QuantizedEmbeddings
+from lexical_dedup import LexicalDeduplicator, normalize_text
+from review_metrics import record_embedding
 
 logger = logging.getLogger(__name__)
 
 
+class UnionFind:
+    """并查集(路径压缩 + 按大小合并)"""
+    
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+    
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+    
+    def union(self, x: int, y: int):
+        x, y = self.find(x), self.find(y)
+        if x == y:
+            return
+        if self.size[x] < self.size[y]:
+            x, y = y, x
+        self.parent[y] = x
+        self.size[x] += self.size[y]
+
+
 class DuplicateChecker:
     """QA查重器"""
     
-    def __init__(self):
-        """初始化查重器"""
+    def __init__(self, lexical_threshold: float = 0.9, precision: str = 'float32',
+                 embedding_client: EmbeddingClient = None):
+        """
+        初始化查重器
+        
+        Args:
+            lexical_threshold: 字面近似重复的Jaccard阈值(与相似度阈值取较大者)
+            precision: 向量存储与打分精度 float32 / float16 / int8
+            embedding_client: 共用的嵌入服务客户端(如ASGI模式下绑定事件循环的客户端),默认按配置新建
+        """
+        self.lexical_threshold = lexical_threshold
+        self.precision = precision
+        
         # BGE嵌入模型配置
-        self.embedding_url = BASE_CONFIG['embedding']['url']
-        self.embedding_model = BASE_CONFIG['embedding']['model']
-        self.embedding_timeout = BASE_CONFIG['embedding']['timeout']
+        embedding_config = BASE_CONFIG['embedding']
+        self.embedding_url = embedding_config['url']
+        self.embedding_model = embedding_config['model']
+        self.embedding_client = embedding_client or EmbeddingClient(
+            self.embedding_url,
+            self.embedding_model,
+            timeout=embedding_config.get('batch_timeout', 60),
+            max_in_flight=embedding_config.get('max_in_flight', 4),
+            max_batch_chars=embedding_config.get('max_batch_chars', 32000),
+            max_batch_texts=embedding_config.get('max_batch_texts', 256)
+        )
+        self._embedding_runs = []
         
         logger.info(f"✅ 查重器初始化完成 [模型={self.embedding_model}, 服务={self.embedding_url}]")
     
     def get_embeddings(self, texts: List[str]) -> np.ndarray:
         """
-        调用BGE模型生成文本向量 (OpenAI兼容接口)
+        调用BGE模型生成文本向量 (OpenAI兼容接口,自适应批量并发请求)
         
         Args:
             texts: 文本列表
@@ -45,28 +95,20 @@ class DuplicateChecker:
         Returns:
             向量矩阵 (n, 1024)
         """
-        try:
-            # 使用OpenAI兼容的API接口
-            response = requests.post(
-                f"{self.embedding_url}/v1/embeddings",
-                json={
-                    "input": texts,
-                    "model": self.embedding_model
-                },
-                timeout=self.embedding_timeout
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            # 解析OpenAI格式的响应
-            embeddings = [item['embedding'] for item in result['data']]
-            embeddings = np.array(embeddings)
-            logger.info(f"✅ 向量生成成功 [数量={len(texts)}, 维度={embeddings.shape}]")
-            return embeddings
-            
-        except Exception as e:
-            logger.error(f"❌ 向量生成失败: {e}")
-            raise
+        return self.embedding_client.embed(texts)
+    
+    @property
+    def embedding_metrics(self) -> Dict:
+        """本查重器累计的向量生成吞吐指标"""
+        totals = {key: 0 for key in ('texts', 'chars', 'batches', 'requests', 'failures', 'retries', 'splits')}
+        seconds = 0.0
+        for metrics in self._embedding_runs:
+            for key in totals:
+                totals[key] += metrics[key]
+            seconds += metrics['seconds']
+        totals['seconds'] = round(seconds, 3)
+        totals['texts_per_second'] = round(totals['texts'] / seconds, 1) if seconds else 0.0
+        return totals
     
     def cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
         """
@@ -88,126 +130,306 @@ class DuplicateChecker:
         
         return dot_product / (norm1 * norm2)
     
+    def embed_texts(self, texts: List[str]) -> QuantizedEmbeddings:
+        """
+        生成向量,按行归一化后以查重器精度存储
+        
+        Returns:
+            单位向量矩阵,余弦相似度即点积
+        """
+        if not texts:
+            return QuantizedEmbeddings(np.zeros((0, 0), dtype=np.float32), self.precision)
+        
+        embeddings = np.asarray(self.get_embeddings(texts), dtype=np.float32)
+        self._embedding_runs.append(self.embedding_client.last_metrics)
+        record_embedding(self.embedding_client.last_metrics)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        embeddings /= norms
+        
+        quantized = QuantizedEmbeddings(embeddings, self.precision)
+        logger.info(f"🗜️ 向量存储 [精度={self.precision}, 占用={quantized.nbytes / 1024 / 1024:.1f}MB]")
+        return quantized
+    
+    @staticmethod
+    def segment_text(seg: Dict) -> str:
+        """组合问题和答案作为完整文本"""
+        return f"问:{seg['question']}\n答:{seg['answer']}"
+    
+    def group_edges(
+        self,
+        segments: List[Dict],
+        edges: List[Tuple[int, int, float]],
+        vectors: Callable[[List[int]], np.ndarray]
+    ) -> List[Dict]:
+        """
+        并查集合并相似边,连通分量即重复组
+        
+        Args:
+            segments: 分段列表
+            edges: 相似边 [(i, j, 相似度)],i/j为segments中的索引
+            vectors: 按分段索引取单位向量(float32)的函数,用于确定代表分段
+            
+        Returns:
+            重复组列表,每组 {'items': 分段列表(代表分段在首位,含similarity_score),
+            'representative': 代表分段, 'stats': 组内统计}
+        """
+        groups = UnionFind(len(segments))
+        for i, j, _ in edges:
+            groups.union(i, j)
+        
+        members = {}
+        for i, j, _ in edges:
+            for idx in (i, j):
+                members.setdefault(groups.find(idx), set()).add(idx)
+        edge_scores = {}
+        for i, j, score in edges:
+            edge_scores.setdefault(groups.find(i), []).append(score)
+        
+        duplicate_groups = []
+        for root, member_set in members.items():
+            indices = sorted(member_set)
+            
+            # 代表分段: 最接近组内向量均值(质心)的分段,并列时取ID最小者(与输入顺序无关)
+            group_vectors = vectors(indices)
+            centroid_scores = group_vectors @ group_vectors.mean(axis=0)
+            best = centroid_scores.max()
+            rep_pos = min(
+                (pos for pos in range(len(indices)) if centroid_scores[pos] >= best - 1e-3),
+                key=lambda pos: str(segments[indices[pos]]['id'])
+            )
+            similarities = np.clip(group_vectors @ group_vectors[rep_pos], 0.0, 1.0)
+            
+            order = [rep_pos] + sorted(
+                (pos for pos in range(len(indices)) if pos != rep_pos),
+                key=lambda pos: (-similarities[pos], str(segments[indices[pos]]['id']))
+            )
+            items = []
+            for pos in order:
+                seg = segments[indices[pos]]
+                seg['similarity_score'] = float(similarities[pos])
+                items.append(seg)
+            
+            scores = edge_scores[root]
+            duplicate_groups.append({
+                'items': items,
+                'representative': items[0],
+                'stats': {
+                    'edges': len(scores),
+                    'min_similarity': min(scores),
+                    'avg_similarity': sum(scores) / len(scores),
+                    'max_similarity': max(scores)
+                }
+            })
+        
+        return duplicate_groups
+    
     def find_duplicates(
         self, 
         segments: List[Dict], 
         similarity_threshold: float = 0.85,
-        batch_size: int = 100
-    ) -> List[List[Dict]]:
+        block_size: int = 1024
+    ) -> List[Dict]:
         """
         查找重复的QA分段
         
+        字面重复边与向量相似度边一起做并查集合并,连通分量即重复组,
+        结果与输入顺序无关,传递相似的分段归入同一组。
+        
         Args:
             segments: 分段列表,每个包含 {id, question, answer, document_id, document_name}
             similarity_threshold: 相似度阈值 (0-1)
-            batch_size: 批处理大小
+            block_size: 相似度分块行数
             
         Returns:
-            重复组列表,每组包含相似的分段
+            重复组列表,每组 {'items': 分段列表(代表分段在首位,含similarity_score),
+            'representative': 代表分段, 'stats': 组内统计}
         """
         if not segments:
             return []
         
         logger.info(f"🔍 开始查重 [总数={len(segments)}, 阈值={similarity_threshold}]")
+        n = len(segments)
         
         # 1. 准备文本数据(问题+答案)
-        texts = []
-        for seg in segments:
-            # 组合问题和答案作为完整文本
-            combined_text = f"问:{seg['question']}\n答:{seg['answer']}"
-            texts.append(combined_text)
-        
-        # 2. 分批生成向量(避免内存溢出)
-        all_embeddings = []
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i+batch_size]
-            batch_embeddings = self.get_embeddings(batch_texts)
-            all_embeddings.append(batch_embeddings)
-            logger.info(f"📊 进度: {min(i+batch_size, len(texts))}/{len(texts)}")
-        
-        # 合并所有向量
-        embeddings = np.vstack(all_embeddings)
-        
-        # 3. 计算相似度矩阵
+        texts = [self.segment_text(seg) for seg in segments]
+        
+        # 2. 字面预筛: 每个字面重复簇只保留索引最小的分段生成向量
+        deduplicator = LexicalDeduplicator(threshold=max(self.lexical_threshold, similarity_threshold))
+        lexical_edges = deduplicator.find_pairs(texts)
+        lexical_groups = UnionFind(n)
+        for i, j, _ in lexical_edges:
+            lexical_groups.union(i, j)
+        
+        representatives = []
+        row_of = [0] * n  # 分段索引 -> 向量行(字面重复簇共用代表的向量)
+        component_row = {}
+        for idx in range(n):
+            root = lexical_groups.find(idx)
+            if root not in component_row:
+                component_row[root] = len(representatives)
+                representatives.append(idx)
+            row_of[idx] = component_row[root]
+        logger.info(
+            f"🔤 字面预筛完成 [字面重复边={len(lexical_edges)}, 待向量化={len(representatives)}/{n}]"
+        )
+        
+        # 3. 分批生成向量
+        embeddings = self.embed_texts([texts[idx] for idx in representatives])
+        
+        # 4. 分块计算相似度边
         logger.info("🧮 计算相似度矩阵...")
-        n = len(segments)
-        visited = set()
-        duplicate_groups = []
+        semantic_edges = [
+            (representatives[i], representatives[j], score)
+            for i, j, score in embeddings.similar_pairs(similarity_threshold, block_size)
+        ]
+        
+        # 5. 并查集合并所有边,连通分量即重复组
+        edges = lexical_edges + semantic_edges
+        duplicate_groups = self.group_edges(
+            segments, edges, lambda indices: embeddings.rows([row_of[idx] for idx in indices])
+        )
+        
+        logger.info(f"✅ 查重完成 [相似边={len(edges)}, 发现{len(duplicate_groups)}个重复组]")
+        return duplicate_groups
+    
+    def find_cross_duplicates(
+        self,
+        queries: List[Dict],
+        corpus: List[Dict],
+        similarity_threshold: float = 0.85,
+        top_k: int = 5,
+        block_size: int = 1024
+    ) -> List[Tuple[Dict, List[Tuple[Dict, float]]]]:
+        """
+        交叉查重: 为每个查询分段(未审核)查找语料(已审核)中的重复分段
+        
+        只计算 查询 × 语料 的相似度(按block_size行分块做矩阵乘),
+        不构建两者并集上的全量相似度矩阵。规范化后与语料完全相同的查询直接命中,不生成向量。
         
-        for i in range(n):
-            if i in visited:
-                continue
+        Args:
+            queries: 查询分段列表
+            corpus: 语料分段列表
+            similarity_threshold: 相似度阈值 (0-1)
+            top_k: 每个查询最多返回的匹配数
+            block_size: 相似度分块行数
             
-            # 当前分段的重复组
-            current_group = [(segments[i], 1.0)]  # (segment, similarity_to_first)
-            visited.add(i)
+        Returns:
+            [(查询分段, [(语料分段, 相似度)])],只包含有匹配的查询,按最高相似度降序
+        """
+        if not queries or not corpus:
+            return []
+        
+        logger.info(f"🔍 开始交叉查重 [查询={len(queries)}, 语料={len(corpus)}, 阈值={similarity_threshold}]")
+        
+        corpus_texts = [self.segment_text(seg) for seg in corpus]
+        query_texts = [self.segment_text(seg) for seg in queries]
+        
+        # 1. 规范化文本完全相同: 直接命中
+        exact_index = {}
+        for idx, text in enumerate(corpus_texts):
+            exact_index.setdefault(normalize_text(text), []).append(idx)
+        
+        matches = {}
+        remaining = []
+        for q_idx, text in enumerate(query_texts):
+            exact = exact_index.get(normalize_text(text))
+            if exact:
+                matches[q_idx] = [(c_idx, 1.0) for c_idx in exact[:top_k]]
+            else:
+                remaining.append(q_idx)
+        logger.info(f"🔤 字面完全重复 [{len(matches)}条], 待向量化查询 [{len(remaining)}条]")
+        
+        # 2. 向量相似度(分块矩阵乘)
+        if remaining:
+            corpus_embeddings = self.embed_texts(corpus_texts)
+            query_embeddings = self.embed_texts([query_texts[idx] for idx in remaining])
             
-            # 与后续分段比较
-            for j in range(i+1, n):
-                if j in visited:
-                    continue
-                
-                # 计算余弦相似度
-                similarity = self.cosine_similarity(embeddings[i], embeddings[j])
-                
-                if similarity >= similarity_threshold:
-                    current_group.append((segments[j], float(similarity)))
-                    visited.add(j)
+            for row, hits in query_embeddings.query(corpus_embeddings, similarity_threshold, block_size).items():
+                matches[remaining[row]] = hits[:top_k]
+        
+        results = [
+            (queries[q_idx], [(corpus[c_idx], sim) for c_idx, sim in hits])
+            for q_idx, hits in matches.items()
+        ]
+        results.sort(key=lambda item: item[1][0][1], reverse=True)
+        
+        logger.info(f"✅ 交叉查重完成 [有重复的查询分段={len(results)}]")
+        return results
+    
+    @staticmethod
+    def format_item(seg: Dict, similarity: float) -> Dict:
+        """格式化重复组中的单个分段"""
+        return {
+            'segment_id': seg['id'],
+            'document_id': seg['document_id'],
+            'document_name': seg['document_name'],
+            'classification': seg.get('classification', '-'),
+            'question': seg['question'],
+            'answer': seg['answer'],
+            'similarity': round(similarity * 100, 1),
+            'created_at': seg.get('created_at', 0),
+            'updated_at': seg.get('updated_at', 0)
+        }
+    
+    def format_cross_duplicates(self, results: List[Tuple[Dict, List[Tuple[Dict, float]]]]) -> Dict:
+        """
+        格式化交叉查重结果(每个未审核分段一组,组内第一项为该未审核分段)
+        
+        Args:
+            results: find_cross_duplicates的返回值
             
-            # 只保留有重复的组(至少2个)
-            if len(current_group) >= 2:
-                # 添加相似度信息到每个分段
-                for seg, sim in current_group:
-                    seg['similarity_score'] = sim
-                # 只保存segment对象
-                duplicate_groups.append([seg for seg, _ in current_group])
-        
-        logger.info(f"✅ 查重完成 [发现{len(duplicate_groups)}个重复组]")
-        return duplicate_groups
+        Returns:
+            格式化后的数据
+        """
+        formatted_groups = []
+        
+        for idx, (query, hits) in enumerate(results, 1):
+            formatted_groups.append({
+                'group_id': idx,
+                'segment_id': query['id'],
+                'similarity': round(hits[0][1] * 100, 1),  # 最高相似度
+                'count': len(hits) + 1,
+                'items': [self.format_item(query, 1.0)] + [self.format_item(seg, sim) for seg, sim in hits]
+            })
+        
+        return {
+            'total_groups': len(formatted_groups),
+            'total_duplicates': len(formatted_groups),  # 与已审核重复的未审核分段数
+            'groups': formatted_groups
+        }
     
-    def format_duplicate_groups(self, duplicate_groups: List[List[Dict]]) -> Dict:
+    def format_duplicate_groups(self, duplicate_groups: List[Dict]) -> Dict:
         """
         格式化重复组为前端需要的格式
         
         Args:
-            duplicate_groups: 重复组列表
+            duplicate_groups: find_duplicates的返回值
             
         Returns:
             格式化后的数据
         """
         formatted_groups = []
         
-        for idx, group in enumerate(duplicate_groups, 1):
-            # 计算组内平均相似度(除了第一个100%)
-            similarities = [seg.get('similarity_score', 0.0) for seg in group]
-            avg_similarity = sum(similarities) / len(similarities) if similarities else 0.0
-            
-            # 组内分段按相似度降序排序
-            sorted_group = sorted(group, key=lambda x: x.get('similarity_score', 0.0), reverse=True)
-            
-            formatted_group = {
-                'group_id': idx,
-                'similarity': round(avg_similarity * 100, 1),  # 转换为百分比
-                'count': len(group),
-                'items': [
-                    {
-                        'segment_id': seg['id'],
-                        'document_id': seg['document_id'],
-                        'document_name': seg['document_name'],
-                        'classification': seg.get('classification', '-'),
-                        'question': seg['question'],
-                        'answer': seg['answer'],
-                        'similarity': round(seg.get('similarity_score', 0.0) * 100, 1),
-                        'created_at': seg.get('created_at', 0),
-                        'updated_at': seg.get('updated_at', 0)
-                    }
-                    for seg in sorted_group
-                ]
-            }
-            formatted_groups.append(formatted_group)
-        
-        # 按相似度降序排序
-        formatted_groups.sort(key=lambda x: x['similarity'], reverse=True)
+        for group in duplicate_groups:
+            stats = group['stats']
+            formatted_groups.append({
+                'similarity': round(stats['avg_similarity'] * 100, 1),  # 组内相似边的平均相似度(百分比)
+                'count': len(group['items']),
+                'representative_id': group['representative']['id'],
+                'stats': {
+                    'edges': stats['edges'],
+                    'min_similarity': round(stats['min_similarity'] * 100, 1),
+                    'max_similarity': round(stats['max_similarity'] * 100, 1)
+                },
+                # 代表分段在首位,其余按与代表的相似度降序
+                'items': [self.format_item(seg, seg.get('similarity_score', 0.0)) for seg in group['items']]
+            })
+        
+        # 按相似度降序排序(相同时按代表分段ID,保证结果稳定)
+        formatted_groups.sort(key=lambda x: (-x['similarity'], x['representative_id']))
+        for idx, formatted_group in enumerate(formatted_groups, 1):
+            formatted_group['group_id'] = idx
         
         return {
             'total_groups': len(formatted_groups),
@@ -0,0 +1,512 @@
+"""
+增量查重索引 - 持久化的相似对
+====================================
+
+查重结果不再每次从头计算:
+1. 首次查重时为知识库全部分段生成向量,计算不低于下限阈值(min_threshold)的相似对,
+   向量和相似对写入SQLite(向量以float32存储)
+2. 审核操作(审核通过/编辑/删除)后只重算该分段: 生成一次向量,与知识库全部向量做一次矩阵乘,
+   替换该分段的相似对
+3. 查询任意不低于下限的阈值时,直接按阈值读取相似对并做并查集分组
+4. 相似对按分数降序缓存在内存中: 任意阈值只需二分截取前缀,
+   一次扫描即可得到各阈值档位的相似对数/重复组数(阈值扫描直方图)
+
+文本未变化(内容哈希相同)的分段不会重新生成向量;查询前按分段列表对账,
+补齐镜像同步带来的外部变更。内存缓存记录加载时索引的updated_at,
+其他进程更新索引后(多进程部署)自动重新加载。
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from duplicate_checker import UnionFind
+from lexical_dedup import LexicalDeduplicator
+
+logger = logging.getLogger(__name__)
+
+
+class _VectorTable:
+    """内存中的知识库向量表(按容量倍增,删除的行置零并复用)"""
+
+    def __init__(self, dim: int = 0):
+        self.dim = dim
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.ids: List[Optional[str]] = []
+        self.row_of: Dict[str, int] = {}
+        self.free: List[int] = []
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def set(self, segment_id: str, vector: np.ndarray) -> int:
+        if self.dim == 0:
+            self.dim = len(vector)
+            self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+
+        row = self.row_of.get(segment_id)
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+            else:
+                row = len(self.ids)
+                self.ids.append(None)
+                if row >= len(self.matrix):
+                    grown = np.zeros((max(64, len(self.matrix) * 2), self.dim), dtype=np.float32)
+                    grown[:len(self.matrix)] = self.matrix
+                    self.matrix = grown
+            self.ids[row] = segment_id
+            self.row_of[segment_id] = row
+
+        self.matrix[row] = vector
+        return row
+
+    def remove(self, segment_id: str):
+        row = self.row_of.pop(segment_id, None)
+        if row is not None:
+            self.matrix[row] = 0.0
+            self.ids[row] = None
+            self.free.append(row)
+
+    def vectors(self, segment_ids: List[str]) -> np.ndarray:
+        return self.matrix[[self.row_of[segment_id] for segment_id in segment_ids]]
+
+    @property
+    def active(self) -> np.ndarray:
+        """已使用部分(含已删除的零行,零行与任何向量的相似度为0)"""
+        return self.matrix[:len(self.ids)]
+
+
+class DuplicateIndex:
+    """按知识库维护的持久化查重索引"""
+
+    def __init__(self, db_path: Path, checker_factory: Callable, min_threshold: float = 0.8, block_size: int = 1024):
+        """
+        Args:
+            db_path: 索引数据库路径
+            checker_factory: 创建DuplicateChecker的函数(用于生成向量和分组)
+            min_threshold: 保存相似对的下限阈值,查询阈值不能低于该值
+            block_size: 相似度分块行数
+        """
+        self.db_path = Path(db_path)
+        self.checker_factory = checker_factory
+        self.min_threshold = min_threshold
+        self.block_size = block_size
+
+        self._lock = threading.RLock()
+        self._tables: Dict[str, _VectorTable] = {}
+        # 按分数降序的相似对缓存: {dataset_id: (a列表, b列表, 分数数组)}
+        self._edges: Dict[str, Tuple[List[str], List[str], np.ndarray]] = {}
+        # 内存缓存对应的索引版本(dup_index_state.updated_at)
+        self._versions: Dict[str, Optional[float]] = {}
+
+        self.init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def init_db(self):
+        """初始化索引表"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS dup_vectors (
+                segment_id TEXT PRIMARY KEY,
+                dataset_id TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_dup_vectors_dataset ON dup_vectors(dataset_id)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS dup_pairs (
+                dataset_id TEXT NOT NULL,
+                a TEXT NOT NULL,
+                b TEXT NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (a, b)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_dup_pairs_score ON dup_pairs(dataset_id, score DESC)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_dup_pairs_b ON dup_pairs(b)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS dup_index_state (
+                dataset_id TEXT PRIMARY KEY,
+                min_threshold REAL NOT NULL,
+                built_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    # ==================== 状态 ====================
+
+    def state(self, dataset_id: str) -> Optional[Dict]:
+        """知识库的索引状态,未建立返回None"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('SELECT * FROM dup_index_state WHERE dataset_id = ?', (dataset_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def covers(self, dataset_id: str, threshold: float) -> bool:
+        """索引已建立且下限不高于threshold"""
+        state = self.state(dataset_id)
+        return bool(state) and state['min_threshold'] <= threshold + 1e-9
+
+    def _check_version(self, dataset_id: str):
+        """索引已被其他进程更新时丢弃内存缓存"""
+        state = self.state(dataset_id)
+        version = state['updated_at'] if state else None
+        if self._versions.get(dataset_id) != version:
+            self._tables.pop(dataset_id, None)
+            self._edges.pop(dataset_id, None)
+            self._versions[dataset_id] = version
+
+    def _table(self, dataset_id: str) -> _VectorTable:
+        """内存向量表(首次使用时从数据库加载)"""
+        self._check_version(dataset_id)
+        table = self._tables.get(dataset_id)
+        if table is None:
+            table = _VectorTable()
+            conn = self._connect()
+            for segment_id, blob in conn.execute(
+                'SELECT segment_id, vector FROM dup_vectors WHERE dataset_id = ?', (dataset_id,)
+            ):
+                table.set(segment_id, np.frombuffer(blob, dtype=np.float32))
+            conn.close()
+            self._tables[dataset_id] = table
+        return table
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+    # ==================== 构建与增量更新 ====================
+
+    def rebuild(self, dataset_id: str, segments: List[Dict], min_threshold: float = None, checker=None):
+        """
+        重建知识库索引
+
+        Args:
+            segments: 知识库全部分段(含id/question/answer)
+            min_threshold: 下限阈值,默认使用索引的下限
+            checker: 生成向量使用的DuplicateChecker(可从中读取向量生成指标),默认新建
+        """
+        min_threshold = self.min_threshold if min_threshold is None else min_threshold
+        start = time.time()
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute('DELETE FROM dup_vectors WHERE dataset_id = ?', (dataset_id,))
+                conn.execute('DELETE FROM dup_pairs WHERE dataset_id = ?', (dataset_id,))
+                conn.execute('''
+                    INSERT OR REPLACE INTO dup_index_state (dataset_id, min_threshold, built_at, updated_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (dataset_id, min_threshold, start, start))
+            conn.close()
+            self._tables[dataset_id] = _VectorTable()
+            self._edges.pop(dataset_id, None)
+            self._versions[dataset_id] = start
+
+            self.upsert_many(dataset_id, segments, lexical=True, checker=checker)
+
+        logger.info(
+            f"✅ 查重索引重建完成 [dataset_id={dataset_id}, 分段={len(segments)}, "
+            f"下限={min_threshold}, 耗时={time.time() - start:.1f}秒]"
+        )
+
+    def upsert_many(self, dataset_id: str, segments: List[Dict], lexical: bool = False, checker=None) -> int:
+        """
+        新增或更新分段: 生成向量并重算其相似对(文本未变化的跳过)
+
+        Args:
+            segments: 分段列表(含id/question/answer)
+            lexical: 是否先做字面预筛(近似逐字重复的分段共用代表分段的向量),用于大批量
+            checker: 生成向量使用的DuplicateChecker,默认新建
+
+        Returns:
+            重算的分段数
+        """
+        with self._lock:
+            state = self.state(dataset_id)
+            if not state:
+                return 0
+
+            checker = checker or self.checker_factory()
+            texts = {seg['id']: checker.segment_text(seg) for seg in segments}
+            conn = self._connect()
+            known = {}
+            for segment_id, text_hash in conn.execute(
+                'SELECT segment_id, text_hash FROM dup_vectors WHERE dataset_id = ?', (dataset_id,)
+            ):
+                known[segment_id] = text_hash
+            conn.close()
+
+            changed = [
+                segment_id for segment_id, text in texts.items()
+                if known.get(segment_id) != self.text_hash(text)
+            ]
+            if not changed:
+                return 0
+
+            vectors = self._embed(checker, [texts[segment_id] for segment_id in changed], lexical, state['min_threshold'])
+
+            table = self._table(dataset_id)
+            rows = [table.set(segment_id, vector) for segment_id, vector in zip(changed, vectors)]
+            pairs = self._pairs_for_rows(table, rows, state['min_threshold'])
+
+            now = time.time()
+            conn = self._connect()
+            with conn:
+                conn.executemany('DELETE FROM dup_pairs WHERE a = ? OR b = ?', [(sid, sid) for sid in changed])
+                conn.executemany('''
+                    INSERT OR REPLACE INTO dup_vectors (segment_id, dataset_id, text_hash, vector, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [
+                    (segment_id, dataset_id, self.text_hash(texts[segment_id]), vector.tobytes(), now)
+                    for segment_id, vector in zip(changed, vectors)
+                ])
+                conn.executemany(
+                    'INSERT OR REPLACE INTO dup_pairs (dataset_id, a, b, score) VALUES (?, ?, ?, ?)',
+                    [(dataset_id, a, b, score) for a, b, score in pairs]
+                )
+                conn.execute('UPDATE dup_index_state SET updated_at = ? WHERE dataset_id = ?', (now, dataset_id))
+            conn.close()
+            self._edges.pop(dataset_id, None)
+            self._versions[dataset_id] = now
+
+            logger.info(f"🔄 查重索引更新 [dataset_id={dataset_id}, 重算={len(changed)}, 相似对={len(pairs)}]")
+            return len(changed)
+
+    def _embed(self, checker, texts: List[str], lexical: bool, min_threshold: float) -> np.ndarray:
+        """生成float32单位向量;lexical时近似逐字重复的文本只生成一次"""
+        if not lexical or len(texts) < 2:
+            return checker.embed_texts(texts).rows(slice(None))
+
+        deduplicator = LexicalDeduplicator(threshold=max(checker.lexical_threshold, min_threshold))
+        source = list(range(len(texts)))
+        for i, j, _ in deduplicator.find_pairs(texts):
+            if source[j] == j:
+                source[j] = source[i]
+
+        unique = sorted(set(source))
+        embedded = checker.embed_texts([texts[idx] for idx in unique]).rows(slice(None))
+        position = {idx: pos for pos, idx in enumerate(unique)}
+        return embedded[[position[idx] for idx in source]]
+
+    def _pairs_for_rows(self, table: _VectorTable, rows: List[int], threshold: float) -> List[Tuple[str, str, float]]:
+        """指定行与表中全部向量的相似对(a < b,去除自身和重复)"""
+        pairs = {}
+        matrix = table.active
+        for start in range(0, len(rows), self.block_size):
+            block_rows = rows[start:start + self.block_size]
+            block = table.matrix[block_rows] @ matrix.T
+            hit_rows, hit_cols = np.nonzero(block >= threshold)
+            for r, c in zip(hit_rows.tolist(), hit_cols.tolist()):
+                row = block_rows[r]
+                if c == row or table.ids[c] is None:
+                    continue
+                a, b = sorted((table.ids[row], table.ids[c]))
+                pairs[(a, b)] = min(float(block[r, c]), 1.0)
+        return [(a, b, score) for (a, b), score in pairs.items()]
+
+    def remove(self, segment_ids: Iterable[str]):
+        """删除分段及其相似对"""
+        segment_ids = list(segment_ids)
+        if not segment_ids:
+            return
+
+        with self._lock:
+            for dataset_id in list(self._tables):
+                self._check_version(dataset_id)
+
+            now = time.time()
+            conn = self._connect()
+            with conn:
+                placeholders = ','.join('?' * len(segment_ids))
+                datasets = [
+                    row[0] for row in conn.execute(
+                        f'SELECT DISTINCT dataset_id FROM dup_vectors WHERE segment_id IN ({placeholders})',
+                        segment_ids
+                    )
+                ]
+                conn.executemany('DELETE FROM dup_pairs WHERE a = ? OR b = ?', [(sid, sid) for sid in segment_ids])
+                conn.executemany('DELETE FROM dup_vectors WHERE segment_id = ?', [(sid,) for sid in segment_ids])
+                conn.executemany(
+                    'UPDATE dup_index_state SET updated_at = ? WHERE dataset_id = ?',
+                    [(now, dataset_id) for dataset_id in datasets]
+                )
+            conn.close()
+            for table in self._tables.values():
+                for segment_id in segment_ids:
+                    table.remove(segment_id)
+            for dataset_id in datasets:
+                self._edges.pop(dataset_id, None)
+                self._versions[dataset_id] = now
+
+    def reconcile(self, dataset_id: str, segments: List[Dict], checker=None,
+                  remove_missing: bool = True) -> Dict[str, int]:
+        """
+        按当前分段列表对账: 新增/变化的分段重算,已不存在的分段删除
+
+        Args:
+            remove_missing: 分段列表不完整(部分文档获取失败)时传False,只重算不删除
+
+        Returns:
+            {'upserted': 重算数, 'removed': 删除数}
+        """
+        with self._lock:
+            conn = self._connect()
+            indexed = {
+                row[0] for row in conn.execute(
+                    'SELECT segment_id FROM dup_vectors WHERE dataset_id = ?', (dataset_id,)
+                )
+            }
+            conn.close()
+
+            current = {seg['id'] for seg in segments}
+            removed = indexed - current if remove_missing else set()
+            self.remove(removed)
+            upserted = self.upsert_many(
+                dataset_id, segments, lexical=len(segments) - len(indexed) > 100, checker=checker
+            )
+
+        return {'upserted': upserted, 'removed': len(removed)}
+
+    # ==================== 查询 ====================
+
+    def _edge_list(self, dataset_id: str) -> Tuple[List[str], List[str], np.ndarray]:
+        """按分数降序的全部相似对(首次使用或索引变化后从数据库加载)"""
+        with self._lock:
+            self._check_version(dataset_id)
+            edges = self._edges.get(dataset_id)
+            if edges is None:
+                conn = self._connect()
+                rows = conn.execute(
+                    'SELECT a, b, score FROM dup_pairs WHERE dataset_id = ? ORDER BY score DESC, a, b',
+                    (dataset_id,)
+                ).fetchall()
+                conn.close()
+                edges = (
+                    [row[0] for row in rows],
+                    [row[1] for row in rows],
+                    np.array([row[2] for row in rows], dtype=np.float64)
+                )
+                self._edges[dataset_id] = edges
+            return edges
+
+    def warm(self, dataset_id: str):
+        """预加载知识库的向量表和相似对缓存(索引未建立时跳过)"""
+        with self._lock:
+            if self.state(dataset_id):
+                self._table(dataset_id)
+                self._edge_list(dataset_id)
+
+    def pairs(self, dataset_id: str, threshold: float) -> List[Tuple[str, str, float]]:
+        """不低于阈值的相似对(按分数降序)"""
+        a_ids, b_ids, scores = self._edge_list(dataset_id)
+        count = int(np.searchsorted(-scores, -threshold, side='right'))
+        return list(zip(a_ids[:count], b_ids[:count], scores[:count].tolist()))
+
+    def sweep(self, dataset_id: str, step: float = 0.01, segment_ids: Iterable[str] = None) -> List[Dict]:
+        """
+        阈值扫描: 从1.0到索引下限按step分档,统计每个阈值下的结果规模
+
+        相似对按分数降序逐条并入并查集,一次扫描得到全部档位。
+
+        Args:
+            step: 档位间隔
+            segment_ids: 只统计这些分段之间的相似对(默认全部)
+
+        Returns:
+            按阈值升序的档位列表,每档含:
+            threshold(阈值)、pairs(不低于阈值的相似对数)、bucket_pairs(落在本档的相似对数)、
+            groups(重复组数)、duplicates(重复条目数)
+        """
+        state = self.state(dataset_id)
+        if not state:
+            return []
+
+        a_ids, b_ids, scores = self._edge_list(dataset_id)
+        allowed = set(segment_ids) if segment_ids is not None else None
+
+        node_of: Dict[str, int] = {}
+        for a, b in zip(a_ids, b_ids):
+            node_of.setdefault(a, len(node_of))
+            node_of.setdefault(b, len(node_of))
+        uf = UnionFind(len(node_of))
+
+        thresholds = []
+        k = 0
+        while 1.0 - k * step >= state['min_threshold'] - 1e-9:
+            thresholds.append(round(1.0 - k * step, 6))
+            k += 1
+
+        buckets = []
+        position = 0
+        total_pairs = groups = duplicates = 0
+        for threshold in thresholds:
+            bucket_pairs = 0
+            while position < len(scores) and scores[position] >= threshold:
+                a, b = a_ids[position], b_ids[position]
+                position += 1
+                if allowed is not None and (a not in allowed or b not in allowed):
+                    continue
+                bucket_pairs += 1
+
+                x, y = uf.find(node_of[a]), uf.find(node_of[b])
+                if x == y:
+                    continue
+                size_x, size_y = uf.size[x], uf.size[y]
+                duplicates += (size_x == 1) + (size_y == 1)
+                # 两个单点新成一组;单点并入已有组不变;两组合并减一
+                if size_x == 1 and size_y == 1:
+                    groups += 1
+                elif size_x > 1 and size_y > 1:
+                    groups -= 1
+                uf.union(x, y)
+
+            total_pairs += bucket_pairs
+            buckets.append({
+                'threshold': threshold,
+                'pairs': total_pairs,
+                'bucket_pairs': bucket_pairs,
+                'groups': groups,
+                'duplicates': duplicates
+            })
+
+        return buckets[::-1]
+
+    def groups(self, dataset_id: str, segments: List[Dict], threshold: float) -> List[Dict]:
+        """
+        按阈值分组(格式同DuplicateChecker.find_duplicates)
+
+        Args:
+            segments: 知识库当前分段(提供展示字段)
+            threshold: 相似度阈值,不能低于索引下限
+        """
+        index_of = {seg['id']: idx for idx, seg in enumerate(segments)}
+
+        # 读取边和向量在同一把锁内,避免其间并发移除/重新加载导致分段不在向量表中
+        with self._lock:
+            table = self._table(dataset_id)
+            edges = [
+                (index_of[a], index_of[b], score)
+                for a, b, score in self.pairs(dataset_id, threshold)
+                if a in index_of and b in index_of and a in table.row_of and b in table.row_of
+            ]
+            return self.checker_factory().group_edges(
+                segments, edges, lambda indices: table.vectors([segments[idx]['id'] for idx in indices])
+            )
@@ -0,0 +1,279 @@
+"""
+BGE嵌入服务客户端 - 自适应批量 + 并发请求
+====================================
+
+功能:
+1. 按字符预算组批(单批同时受最大条数限制),长文本自动少装几条
+2. 同时保持多个批次在途,充分利用BGE服务的并发能力
+3. 按失败原因处理: 与批次内容有关的失败(413/5xx)对半拆分重试,单条仍失败才报错,一个坏批次不会中断整体;
+   读取超时(批次过大、处理慢)同样拆分并缩小字符预算;连接失败、连接超时和其他4xx立即失败,
+   单次embed()累计失败超过上限也中止(不再逐个批次等待超时)
+4. 批次大小按延迟自适应: 慢于目标延迟或失败时减半,快速成功时逐步放大
+5. 统计吞吐指标(条数/字符数/请求数/重试/拆分/耗时)
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingClient:
+    """BGE嵌入服务客户端 (OpenAI兼容接口)"""
+
+    def __init__(
+        self,
+        url: str,
+        model: str,
+        timeout: float = 60,
+        max_in_flight: int = 4,
+        max_batch_chars: int = 32000,
+        min_batch_chars: int = 2000,
+        max_batch_texts: int = 256,
+        target_latency: float = 5.0,
+        max_retries: int = 2,
+        max_failures: int = 50,
+        connect_timeout: float = 10
+    ):
+        """
+        Args:
+            url: 嵌入服务地址
+            model: 模型名称
+            timeout: 单次请求超时(秒)
+            max_in_flight: 同时在途的批次数
+            max_batch_chars: 单批字符预算上限
+            min_batch_chars: 单批字符预算下限
+            max_batch_texts: 单批最大条数
+            target_latency: 目标单批延迟(秒),用于调整字符预算
+            max_retries: 单条文本的最大重试次数
+            max_failures: 单次embed()允许的最大失败请求数,超过则中止
+            connect_timeout: 建立连接的超时(秒),超时视为服务不可达
+        """
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.max_batch_chars = max_batch_chars
+        self.min_batch_chars = min_batch_chars
+        self.max_batch_texts = max_batch_texts
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.max_failures = max_failures
+        self.connect_timeout = min(connect_timeout, timeout)
+
+        self.batch_chars = max_batch_chars // 2
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def last_metrics(self) -> Dict:
+        """当前线程最近一次embed()的吞吐指标(客户端可被多个线程共用)"""
+        return getattr(self._local, 'metrics', {})
+
+    @last_metrics.setter
+    def last_metrics(self, metrics: Dict):
+        self._local.metrics = metrics
+
+    def _session(self) -> requests.Session:
+        # requests.Session不保证线程安全,每个工作线程一个
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        """单次请求,返回 (n, dim) 向量"""
+        response = self._session().post(
+            f"{self.url}/v1/embeddings",
+            json={"input": texts, "model": self.model},
+            timeout=(self.connect_timeout, self.timeout)
+        )
+        response.raise_for_status()
+        data = sorted(response.json()['data'], key=lambda item: item.get('index', 0))
+        if len(data) != len(texts):
+            raise ValueError(f"返回向量数量不匹配: {len(data)} != {len(texts)}")
+        return np.array([item['embedding'] for item in data])
+
+    def _adjust_budget(self, latency: float = None):
+        """按批次延迟调整字符预算(失败时latency为None)"""
+        with self._lock:
+            if latency is None or latency > self.target_latency:
+                self.batch_chars = max(self.min_batch_chars, self.batch_chars // 2)
+            elif latency < self.target_latency / 2:
+                self.batch_chars = min(self.max_batch_chars, int(self.batch_chars * 1.25))
+
+    def _count(self, metrics: Dict, key: str, value: float = 1):
+        with self._lock:
+            metrics[key] += value
+
+    @staticmethod
+    def _error_status(error: Exception) -> Optional[int]:
+        """HTTP错误的状态码(非HTTP错误返回None)"""
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            return error.response.status_code
+        return None
+
+    @staticmethod
+    def _is_unreachable(error: Exception) -> bool:
+        """连接失败或连接超时(读取超时不算,可能只是批次过大)"""
+        return isinstance(error, requests.ConnectionError)
+
+    def _classify(self, error: Exception) -> str:
+        """
+        批次失败的处理方式
+
+        Returns:
+            split: 与批次内容有关(413/5xx/读取超时/返回格式错误),对半拆分重试,单条时退避重试
+            retry: 限流(429),不拆分,退避重试
+            fatal: 连接失败、连接超时或其他4xx,拆分和重试都无济于事,立即失败
+        """
+        if self._is_unreachable(error):
+            return 'fatal'
+        status = self._error_status(error)
+        if status is None or status == 413 or status >= 500:
+            return 'split'
+        if status == 429:
+            return 'retry'
+        return 'fatal'
+
+    def _record_failure(self, error: Exception, metrics: Dict) -> str:
+        """
+        记录一次失败,返回处理方式
+
+        不可恢复的失败或累计失败超过上限时标记中止,其他在途批次在下次请求前停止。
+        """
+        kind = self._classify(error)
+        with self._lock:
+            metrics['failures'] += 1
+            exceeded = metrics['failures'] > self.max_failures
+            if kind == 'fatal' or exceeded:
+                metrics['aborted'] = True
+
+        if exceeded:
+            raise RuntimeError(f"向量生成失败次数超过上限({self.max_failures}): {error}") from error
+        if kind == 'fatal':
+            logger.error(f"❌ 嵌入服务请求失败,停止生成向量: {error}")
+        return kind
+
+    def _check_aborted(self, metrics: Dict):
+        if metrics['aborted']:
+            raise RuntimeError('向量生成已中止')
+
+    def _embed_batch(self, texts: List[str], metrics: Dict, attempt: int = 0) -> np.ndarray:
+        """请求一个批次,与批次内容有关的失败对半拆分重试,不可恢复的失败立即报错"""
+        self._check_aborted(metrics)
+        start = time.perf_counter()
+        try:
+            self._count(metrics, 'requests')
+            embeddings = self._request(texts)
+            self._adjust_budget(time.perf_counter() - start)
+            return embeddings
+        except Exception as e:
+            self._adjust_budget(None)
+            kind = self._record_failure(e, metrics)
+            if kind == 'fatal':
+                raise
+
+            if kind == 'split' and len(texts) > 1:
+                self._count(metrics, 'splits')
+                middle = len(texts) // 2
+                logger.warning(f"⚠️ 向量批次失败,拆分重试 [数量={len(texts)}]: {e}")
+                return np.vstack([
+                    self._embed_batch(texts[:middle], metrics),
+                    self._embed_batch(texts[middle:], metrics)
+                ])
+
+            if attempt < self.max_retries:
+                self._count(metrics, 'retries')
+                time.sleep(2 ** attempt)
+                return self._embed_batch(texts, metrics, attempt + 1)
+
+            logger.error(f"❌ 向量生成失败 [重试{attempt}次]: {e}")
+            raise
+
+    def _next_batch(self, texts: List[str], start: int) -> int:
+        """从start开始按当前字符预算组批,返回批次结束位置"""
+        budget = self.batch_chars
+        end = start
+        chars = 0
+        while end < len(texts) and end - start < self.max_batch_texts:
+            length = len(texts[end])
+            if end > start and chars + length > budget:
+                break
+            chars += length
+            end += 1
+        return end
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        生成文本向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            向量矩阵 (n, dim),顺序与输入一致
+        """
+        metrics = {
+            'texts': len(texts),
+            'chars': sum(len(text) for text in texts),
+            'batches': 0,
+            'requests': 0,
+            'failures': 0,
+            'retries': 0,
+            'splits': 0,
+            'aborted': False
+        }
+        if not texts:
+            self.last_metrics = {**metrics, 'seconds': 0.0, 'texts_per_second': 0.0, 'chars_per_second': 0.0}
+            return np.zeros((0, 0))
+
+        started = time.perf_counter()
+        results = {}
+        position = 0
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            in_flight = {}
+            while position < len(texts) or in_flight:
+                # 补满在途批次(每批按最新的字符预算组批)
+                while position < len(texts) and len(in_flight) < self.max_in_flight:
+                    end = self._next_batch(texts, position)
+                    future = executor.submit(self._embed_batch, texts[position:end], metrics)
+                    in_flight[future] = position
+                    metrics['batches'] += 1
+                    position = end
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    offset = in_flight.pop(future)
+                    try:
+                        results[offset] = future.result()
+                    except Exception:
+                        # 其余批次不再发起新请求
+                        metrics['aborted'] = True
+                        for pending in in_flight:
+                            pending.cancel()
+                        raise
+                    done += len(results[offset])
+                logger.info(f"📊 向量进度: {done}/{len(texts)} [字符预算={self.batch_chars}]")
+
+        embeddings = np.vstack([results[offset] for offset in sorted(results)])
+
+        seconds = time.perf_counter() - started
+        metrics['seconds'] = round(seconds, 3)
+        metrics['texts_per_second'] = round(len(texts) / seconds, 1) if seconds else 0.0
+        metrics['chars_per_second'] = round(metrics['chars'] / seconds, 1) if seconds else 0.0
+        self.last_metrics = metrics
+
+        logger.info(
+            f"✅ 向量生成完成 [数量={len(texts)}, 维度={embeddings.shape}, 批次={metrics['batches']}, "
+            f"请求={metrics['requests']}, 拆分={metrics['splits']}, 耗时={metrics['seconds']}秒, "
+            f"{metrics['texts_per_second']}条/秒]"
+        )
+        return embeddings
@@ -0,0 +1,137 @@
+"""
+查重向量的压缩存储与分块打分
+====================================
+
+归一化后的向量默认以float32保存(原为float64),可选:
+- float16: 内存减半
+- int8: 每行对称量化(每行一个float32缩放系数),内存为float32的约1/4
+
+打分按 block × block 分块进行,每块反量化为float32后用BLAS矩阵乘(numpy的float16/int8
+矩阵乘没有BLAS实现,比反量化后再乘慢得多)。反量化的块在上限(默认256MB)以内缓存,
+每块只反量化一次;超出上限的块用完即弃,峰值内存只与块大小和缓存上限有关,与分段总数无关。
+
+float16/int8只减少向量的常驻内存,打分耗时与float32基本相同(矩阵乘仍是float32):
+反量化的开销约为矩阵乘的 1/block_size。
+"""
+
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+PRECISIONS = ('float32', 'float16', 'int8')
+
+DEFAULT_BLOCK_CACHE_BYTES = 256 * 1024 * 1024  # 打分时缓存的反量化块上限
+
+Index = Union[slice, List[int], np.ndarray]
+
+
+class QuantizedEmbeddings:
+    """归一化向量矩阵(按指定精度存储)"""
+
+    def __init__(self, embeddings: np.ndarray, precision: str = 'float32'):
+        """
+        Args:
+            embeddings: 单位向量矩阵 (n, dim)
+            precision: 存储精度 float32 / float16 / int8
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"不支持的向量精度: {precision}")
+
+        self.precision = precision
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        if precision == 'int8':
+            scales = np.abs(embeddings).max(axis=1) / 127.0 if len(embeddings) else np.zeros(0)
+            scales[scales == 0] = 1.0
+            self.values = np.round(embeddings / scales[:, None]).astype(np.int8)
+            self.scales = scales.astype(np.float32)
+        else:
+            self.values = embeddings.astype(precision)
+            self.scales = None
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nbytes(self) -> int:
+        """占用内存(字节)"""
+        return self.values.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def rows(self, index: Index) -> np.ndarray:
+        """反量化指定行为float32"""
+        values = self.values[index].astype(np.float32)
+        if self.scales is not None:
+            values *= self.scales[index][:, None]
+        return values
+
+    def block(self, start: int, block_size: int) -> np.ndarray:
+        """float32的行块(float32存储时直接返回视图,不复制)"""
+        if self.precision == 'float32':
+            return self.values[start:start + block_size]
+        return self.rows(slice(start, start + block_size))
+
+    def similar_pairs(self, threshold: float, block_size: int = 1024,
+                      cache_bytes: int = DEFAULT_BLOCK_CACHE_BYTES) -> List[Tuple[int, int, float]]:
+        """
+        矩阵内不低于阈值的相似对(只计算上三角分块)
+
+        Returns:
+            [(i, j, 相似度)], i < j
+        """
+        n = len(self)
+        blocks = _BlockCache(self, block_size, cache_bytes)
+        edges = []
+        for i0 in range(0, n, block_size):
+            left = blocks.get(i0)
+            for j0 in range(i0, n, block_size):
+                block = left @ blocks.get(j0).T
+                mask = block >= threshold
+                if i0 == j0:
+                    mask = np.triu(mask, k=1)
+                rows, cols = np.nonzero(mask)
+                for row, col in zip(rows.tolist(), cols.tolist()):
+                    edges.append((i0 + row, j0 + col, min(float(block[row, col]), 1.0)))
+        return edges
+
+    def query(self, corpus: 'QuantizedEmbeddings', threshold: float, block_size: int = 1024,
+              cache_bytes: int = DEFAULT_BLOCK_CACHE_BYTES) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        本矩阵每行(查询)在corpus中不低于阈值的匹配
+
+        Returns:
+            {查询行: [(语料行, 相似度)]},只包含有匹配的行,匹配按相似度降序
+        """
+        matches: Dict[int, List[Tuple[int, float]]] = {}
+        corpus_blocks = _BlockCache(corpus, block_size, cache_bytes)
+        for q0 in range(0, len(self), block_size):
+            left = self.block(q0, block_size)
+            for c0 in range(0, len(corpus), block_size):
+                block = left @ corpus_blocks.get(c0).T
+                rows, cols = np.nonzero(block >= threshold)
+                for row, col in zip(rows.tolist(), cols.tolist()):
+                    matches.setdefault(q0 + row, []).append((c0 + col, min(float(block[row, col]), 1.0)))
+
+        for hits in matches.values():
+            hits.sort(key=lambda hit: (-hit[1], hit[0]))
+        return matches
+
+
+class _BlockCache:
+    """一次打分内的反量化块缓存(超出上限的块不缓存,下次使用时重新反量化)"""
+
+    def __init__(self, embeddings: QuantizedEmbeddings, block_size: int, max_bytes: int):
+        self.embeddings = embeddings
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._blocks: Dict[int, np.ndarray] = {}
+
+    def get(self, start: int) -> np.ndarray:
+        block = self._blocks.get(start)
+        if block is None:
+            block = self.embeddings.block(start, self.block_size)
+            # float32存储的块是视图,无需缓存
+            if self.embeddings.precision != 'float32' and self.used + block.nbytes <= self.max_bytes:
+                self._blocks[start] = block
+                self.used += block.nbytes
+        return block
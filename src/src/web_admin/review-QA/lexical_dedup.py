@@ -0,0 +1,135 @@
+"""
+字面查重 - 规范化哈希 + MinHash LSH
+====================================
+
+在调用BGE生成向量之前,先用字面特征找出完全相同和近似逐字相同的QA
+(只差标点、全半角、空白,如 `问:` 与 `问：`):
+
+1. 规范化文本(NFKC、去除标点和空白、小写)后哈希,哈希相同即完全重复
+2. 对规范化文本的字符3-gram计算MinHash签名,按band分桶(LSH)得到候选对
+3. 候选对用精确Jaccard相似度验证,不低于阈值即近似重复
+
+同一字面簇只需为代表分段生成一次向量。
+"""
+
+import hashlib
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+# MinHash参数: 128个哈希函数分为16个band,每个band 8行
+# (Jaccard=0.9的对几乎必然成为候选,Jaccard=0.5的对约6%成为候选)
+NUM_PERM = 128
+NUM_BANDS = 16
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本: 全角转半角、去除标点和空白、小写"""
+    text = unicodedata.normalize('NFKC', text or '')
+    return _NON_WORD.sub('', text).lower()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """规范化文本的字符n-gram集合(crc32哈希,跨进程稳定)"""
+    if len(text) <= size:
+        return {zlib.crc32(text.encode('utf-8')) & _MERSENNE_PRIME}
+    return {
+        zlib.crc32(text[i:i + size].encode('utf-8')) & _MERSENNE_PRIME
+        for i in range(len(text) - size + 1)
+    }
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    """Jaccard相似度"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class LexicalDeduplicator:
+    """基于规范化哈希和MinHash LSH的字面查重"""
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = NUM_PERM, num_bands: int = NUM_BANDS):
+        """
+        Args:
+            threshold: 近似重复的Jaccard阈值
+            num_perm: MinHash哈希函数个数
+            num_bands: LSH分桶的band数(需整除num_perm)
+        """
+        if num_perm % num_bands:
+            raise ValueError("num_perm 必须能被 num_bands 整除")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.rows = num_perm // num_bands
+
+        # 固定种子,签名跨进程可复现
+        rng = np.random.default_rng(20240101)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: Set[int]) -> np.ndarray:
+        """MinHash签名"""
+        values = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+        hashes = (np.outer(values, self._a) + self._b) % _MERSENNE_PRIME
+        return hashes.min(axis=0)
+
+    def find_pairs(self, texts: List[str]) -> List[Tuple[int, int, float]]:
+        """
+        查找字面重复的文本对
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            [(i, j, 相似度)], i < j;完全重复(规范化后相同)相似度为1.0
+        """
+        normalized = [normalize_text(text) for text in texts]
+        pairs: Dict[Tuple[int, int], float] = {}
+
+        # 1. 规范化哈希: 完全重复
+        exact_buckets = defaultdict(list)
+        for idx, text in enumerate(normalized):
+            exact_buckets[hashlib.md5(text.encode('utf-8')).hexdigest()].append(idx)
+
+        representatives = []
+        for members in exact_buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                pairs[(first, other)] = 1.0
+            representatives.append(first)
+
+        # 2. MinHash LSH: 近似重复(每个完全重复桶只取一个代表)
+        shingle_sets = {idx: shingles(normalized[idx]) for idx in representatives}
+        band_buckets = defaultdict(list)
+        for idx in representatives:
+            sig = self.signature(shingle_sets[idx])
+            for band in range(self.num_bands):
+                key = (band, sig[band * self.rows:(band + 1) * self.rows].tobytes())
+                band_buckets[key].append(idx)
+
+        candidates = set()
+        for members in band_buckets.values():
+            if len(members) < 2:
+                continue
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    i, j = sorted((members[x], members[y]))
+                    candidates.add((i, j))
+
+        # 3. 精确Jaccard验证
+        for i, j in candidates:
+            score = jaccard(shingle_sets[i], shingle_sets[j])
+            if score >= self.threshold:
+                pairs[(i, j)] = score
+
+        return sorted((i, j, score) for (i, j), score in pairs.items())
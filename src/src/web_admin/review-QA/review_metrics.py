@@ -0,0 +1,126 @@
+"""
+审核系统运行指标
+====================================
+
+指标定义与记录工具(输出见 GET /metrics):
+- review_http_request_duration_seconds / review_http_requests_total: 按路由的请求耗时与请求数
+- review_dify_request_duration_seconds / review_dify_requests_total: 按操作的Dify调用耗时与成功/失败数
+- review_cache_requests_total: 各缓存的命中/未命中数(命中率 = hit / (hit + miss))
+- review_embedding_*: 向量生成的条数、字符数、请求数、失败数和耗时(吞吐 = rate(texts) / rate(seconds))
+- review_parse_duration_seconds: 单个分段的内容解析耗时
+"""
+
+import functools
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'mcp_services'))
+from common.metrics import Counter, Histogram
+
+HTTP_LATENCY = Histogram(
+    'review_http_request_duration_seconds', '接口请求耗时(秒)', ['route', 'method']
+)
+HTTP_REQUESTS = Counter(
+    'review_http_requests_total', '接口请求数', ['route', 'method', 'status']
+)
+
+DIFY_LATENCY = Histogram(
+    'review_dify_request_duration_seconds', 'Dify调用耗时(秒)', ['operation']
+)
+DIFY_REQUESTS = Counter(
+    'review_dify_requests_total', 'Dify调用次数', ['operation', 'outcome']
+)
+
+CACHE_REQUESTS = Counter(
+    'review_cache_requests_total', '缓存查询次数', ['cache', 'result']
+)
+
+EMBEDDING_TEXTS = Counter('review_embedding_texts_total', '生成向量的文本条数')
+EMBEDDING_CHARS = Counter('review_embedding_chars_total', '生成向量的文本字符数')
+EMBEDDING_REQUESTS = Counter('review_embedding_requests_total', '向量服务请求数', ['outcome'])
+EMBEDDING_SECONDS = Counter('review_embedding_seconds_total', '向量生成累计耗时(秒)')
+EMBEDDING_RUN_LATENCY = Histogram('review_embedding_run_duration_seconds', '单次向量生成耗时(秒)')
+
+PARSE_LATENCY = Histogram(
+    'review_parse_duration_seconds', '单个分段内容解析耗时(秒)', ['parser'],
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
+)
+
+
+def observe_request(route: str, method: str, status: int, seconds: float):
+    """记录一次接口请求"""
+    HTTP_LATENCY.labels(route, method).observe(seconds)
+    HTTP_REQUESTS.labels(route, method, status).inc()
+
+
+def cache_result(cache: str, hit: bool):
+    """记录一次缓存查询"""
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_embedding(metrics: Dict):
+    """记录一次向量生成(EmbeddingClient.last_metrics)"""
+    if not metrics or not metrics.get('texts'):
+        return
+    EMBEDDING_TEXTS.inc(metrics['texts'])
+    EMBEDDING_CHARS.inc(metrics['chars'])
+    EMBEDDING_REQUESTS.labels('success').inc(metrics['requests'] - metrics['failures'])
+    EMBEDDING_REQUESTS.labels('failure').inc(metrics['failures'])
+    EMBEDDING_SECONDS.inc(metrics['seconds'])
+    EMBEDDING_RUN_LATENCY.observe(metrics['seconds'])
+
+
+def _observe_dify(operation: str, start: float, result) -> None:
+    success = isinstance(result, dict) and result.get('success')
+    DIFY_LATENCY.labels(operation).observe(time.perf_counter() - start)
+    DIFY_REQUESTS.labels(operation, 'success' if success else 'error').inc()
+
+
+def track_dify(operation: str):
+    """Dify客户端方法装饰器: 记录耗时,返回success为False或抛出异常计为失败"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                _observe_dify(operation, start, result)
+        return wrapper
+    return decorator
+
+
+def track_dify_async(operation: str):
+    """异步Dify客户端方法装饰器(同track_dify)"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = None
+            try:
+                result = await func(*args, **kwargs)
+                return result
+            finally:
+                _observe_dify(operation, start, result)
+        return wrapper
+    return decorator
+
+
+def track_parse(parser: str):
+    """内容解析函数装饰器: 记录单次解析耗时"""
+    def decorator(func):
+        child = PARSE_LATENCY.labels(parser)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,280 @@
+"""
+QA审核与修正系统 - ASGI服务
+====================================
+
+与 review_qa_backend.py 相同的路由和JSON结构,运行在单个事件循环上:
+1. 耗时的只读加载接口(未审核列表、已审核文档分段、单个已审核分段、已审核总数)
+   直接以协程实现,等待Dify/本地查询API时不占用线程,同一文档的分页与多个文档并发请求
+2. 其余接口(审核、编辑、批量、统计、查重等)交给原Flask应用,在有限的线程池中执行
+3. 查重的向量请求通过共用的异步嵌入客户端提交到同一个事件循环
+
+用法:
+    python review_qa_asgi.py
+    uvicorn review_qa_asgi:app --host 0.0.0.0 --port 5003
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+import aiohttp
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import review_qa_backend as backend
+from async_clients import AsyncDifyClient, AsyncEmbeddingClient
+from review_metrics import observe_request
+from common.tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+ASGI_WSGI_WORKERS = int(os.getenv("REVIEW_ASGI_WSGI_WORKERS", "16"))         # 执行Flask接口的线程数
+ASGI_HTTP_POOL_SIZE = int(os.getenv("REVIEW_ASGI_HTTP_POOL_SIZE", "100"))     # 共用连接池的最大连接数
+ASGI_DIFY_CONCURRENCY = int(os.getenv("REVIEW_ASGI_DIFY_CONCURRENCY", "16"))  # 同时发往Dify的最大请求数
+
+
+def read_unreviewed_mirror():
+    """本地镜像可用时读取未审核分段,否则返回None"""
+    if backend.mirror_ready(backend.UNREVIEWED_DATASET_ID, backend.UNREVIEWED_DOCUMENTS):
+        return backend.load_unreviewed_segments()
+    return None
+
+
+def read_reviewed_mirror(document_id: str):
+    """本地镜像可用时读取已审核文档的分段,否则返回None"""
+    if not backend.mirror_ready(backend.REVIEWED_DATASET_ID, backend.REVIEWED_DOCUMENTS):
+        return None
+    segments = backend.segment_store.list_segments(backend.REVIEWED_DATASET_ID, document_id)
+    for segment in segments:
+        segment['document_name'] = backend.REVIEWED_DOCUMENTS[document_id]
+    return backend.apply_pending_writes(backend.REVIEWED_DATASET_ID, segments, document_id)
+
+
+def read_reviewed_segment_mirror(segment_id: str):
+    """本地存储中的单个已审核分段: (是否以本地为准, 分段或None)"""
+    return backend.local_reviewed_segment(segment_id)
+
+
+def count_reviewed_mirror():
+    """本地镜像可用时的已审核总数,否则返回None"""
+    if backend.mirror_ready(backend.REVIEWED_DATASET_ID, backend.REVIEWED_DOCUMENTS):
+        return backend.segment_store.count(backend.REVIEWED_DATASET_ID)
+    return None
+
+
+def timed(route: str):
+    """记录异步路由的耗时与请求追踪（route使用与Flask相同的路由模板，两种模式的指标可直接对比）"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(request):
+            start = time.perf_counter()
+            TRACER.start_trace(f"{request.method} {route}", path=request.url.path, pid=os.getpid())
+            try:
+                response = await func(request)
+            except Exception as e:
+                TRACER.end_trace(error=f"{type(e).__name__}: {e}")
+                raise
+            observe_request(route, request.method, response.status_code, time.perf_counter() - start)
+            TRACER.end_trace(status=response.status_code)
+            return response
+        return wrapper
+    return decorator
+
+
+# ==================== 异步路由 ====================
+
+@timed('/api/unreviewed/segments')
+async def get_unreviewed_segments(request):
+    """获取未审核区域的所有分段"""
+    try:
+        all_segments = await run_in_threadpool(read_unreviewed_mirror)
+
+        if all_segments is None:
+            api_url = f"{backend.LOCAL_QUERY_API_BASE}?dataset_id={backend.UNREVIEWED_DATASET_ID}"
+            logger.info(f"请求本地API: {api_url}")
+
+            async with request.app.state.http.get(api_url, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                if response.status != 200:
+                    logger.error(f"本地API请求失败: status_code={response.status}")
+                    raise RuntimeError(f'本地API请求失败: {response.status}')
+                api_data = await response.json()
+
+            all_segments = await run_in_threadpool(backend.prepare_unreviewed_segments, api_data.get('data', []))
+
+        return JSONResponse({
+            'success': True,
+            'data': all_segments,
+            'total': len(all_segments)
+        })
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"本地API请求异常: {e}")
+        return JSONResponse({'success': False, 'error': f'本地API请求异常: {str(e)}'}, status_code=500)
+    except Exception as e:
+        logger.error(f"获取未审核分段失败: {e}", exc_info=True)
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+@timed('/api/reviewed/segments/<document_id>')
+async def get_reviewed_segments(request):
+    """获取已审核区域指定文档的所有分段"""
+    document_id = request.path_params['document_id']
+    try:
+        if document_id not in backend.REVIEWED_DOCUMENTS:
+            return JSONResponse({'success': False, 'error': '无效的文档ID'}, status_code=400)
+
+        # 本地镜像可用时直接读镜像（已按updated_at降序）
+        segments = await run_in_threadpool(read_reviewed_mirror, document_id)
+
+        if segments is None:
+            result = await request.app.state.dify.get_all_segments(backend.REVIEWED_DATASET_ID, document_id)
+            if not result['success']:
+                return JSONResponse(result, status_code=500)
+
+            segments = await run_in_threadpool(backend.prepare_reviewed_segments, document_id, result['data'])
+            segments.sort(key=lambda x: x.get('updated_at', 0), reverse=True)
+
+        return JSONResponse({
+            'success': True,
+            'data': segments,
+            'total': len(segments)
+        })
+
+    except Exception as e:
+        logger.error(f"获取已审核分段失败: {e}")
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+@timed('/api/reviewed/segment/<segment_id>')
+async def get_reviewed_segment_by_id(request):
+    """获取单个已审核分段（各文档并发查找）"""
+    segment_id = request.path_params['segment_id']
+    try:
+        local, cached = await run_in_threadpool(read_reviewed_segment_mirror, segment_id)
+        if local:
+            if cached is None:
+                return JSONResponse({'success': False, 'error': '分段不存在'}, status_code=404)
+            return JSONResponse({'success': True, 'data': cached})
+
+        dify = request.app.state.dify
+        results = await asyncio.gather(*[
+            dify.get_segment(backend.REVIEWED_DATASET_ID, doc_id, segment_id)
+            for doc_id in backend.REVIEWED_DOCUMENTS
+        ])
+        for result in results:
+            if result['success']:
+                return JSONResponse(result)
+
+        return JSONResponse({'success': False, 'error': '分段不存在'}, status_code=404)
+
+    except Exception as e:
+        logger.error(f"获取分段失败: {e}")
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+@timed('/api/stats/total-reviewed')
+async def get_total_reviewed(request):
+    """获取已审核区域总条数（带缓存，各文档并发请求）"""
+    try:
+        cache = backend.reviewed_total_cache
+        current_time = time.time()
+
+        if current_time - cache['timestamp'] < backend.CACHE_DURATION:
+            return JSONResponse({'success': True, 'total': cache['total'], 'cached': True})
+
+        total = await run_in_threadpool(count_reviewed_mirror)
+        if total is not None:
+            return JSONResponse({'success': True, 'total': total, 'cached': False})
+
+        logger.info("🔄 重新计算已审核总数...")
+        dify = request.app.state.dify
+        results = await asyncio.gather(*[
+            dify.get_all_segments(backend.REVIEWED_DATASET_ID, doc_id)
+            for doc_id in backend.REVIEWED_DOCUMENTS
+        ])
+        total = sum(len(result['data']) for result in results if result['success'])
+
+        cache['total'] = total
+        cache['timestamp'] = current_time
+        logger.info(f"✅ 已审核总数: {total}")
+
+        return JSONResponse({'success': True, 'total': total, 'cached': False})
+
+    except Exception as e:
+        logger.error(f"获取已审核总数失败: {e}")
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+# ==================== 应用 ====================
+
+@asynccontextmanager
+async def lifespan(app):
+    """创建共用连接池和异步客户端，启动后台任务"""
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=ASGI_HTTP_POOL_SIZE))
+    app.state.http = session
+    app.state.dify = AsyncDifyClient(
+        session, backend.DIFY_BASE_URL, backend.DIFY_API_KEY, max_concurrency=ASGI_DIFY_CONCURRENCY
+    )
+
+    embedding_config = backend.BASE_CONFIG['embedding']
+    embedding_client = AsyncEmbeddingClient(
+        session,
+        embedding_config['url'],
+        embedding_config['model'],
+        timeout=embedding_config.get('batch_timeout', 60),
+        max_in_flight=embedding_config.get('max_in_flight', 4),
+        max_batch_chars=embedding_config.get('max_batch_chars', 32000),
+        max_batch_texts=embedding_config.get('max_batch_texts', 256)
+    )
+    embedding_client.bind()
+    backend.shared_embedding_client = embedding_client
+
+    backend.start_background_workers()
+    logger.info(f"🚀 ASGI服务就绪 [Flask线程={ASGI_WSGI_WORKERS}, 连接池={ASGI_HTTP_POOL_SIZE}]")
+
+    try:
+        yield
+    finally:
+        backend.shared_embedding_client = None
+        await session.close()
+
+
+# 创建Flask应用（含启动预热），完成后才开始接收请求
+flask_app = backend.create_app()
+
+app = Starlette(
+    routes=[
+        Route('/api/unreviewed/segments', get_unreviewed_segments, methods=['GET']),
+        Route('/api/reviewed/segments/{document_id}', get_reviewed_segments, methods=['GET']),
+        Route('/api/reviewed/segment/{segment_id}', get_reviewed_segment_by_id, methods=['GET']),
+        Route('/api/stats/total-reviewed', get_total_reviewed, methods=['GET']),
+        # 其余路由（含同路径的PUT/DELETE）由Flask处理
+        Mount('/', app=WSGIMiddleware(flask_app, workers=ASGI_WSGI_WORKERS)),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=['*'],
+            allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+            allow_headers=['Content-Type', 'Authorization', 'X-Reviewer'],
+            expose_headers=['Content-Type'],
+            max_age=3600
+        )
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    logger.info("🌐 ASGI服务器启动中... [http://0.0.0.0:5003]")
+    uvicorn.run(app, host='0.0.0.0', port=5003)
@@ -8,20 +8,36 @@ QA审核与修正系统 - 后端服务
 3. 处理QA的审核、编辑、分类和转移
 """
 
-from flask import Flask, request, jsonify, render_template
+from flask import Blueprint, Flask, Response, g, request, jsonify as flask_jsonify, render_template
 from flask_cors import CORS
 import requests
+import atexit
+import contextvars
+import json
+import os
 import sys
+import threading
 import re
 import time
+from collections import OrderedDict
 from pathlib import Path
+from urllib.parse import unquote
 from datetime import datetime, timezone, timedelta
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from duplicate_checker import DuplicateChecker
+from duplicate_index import DuplicateIndex
+from segment_store import SegmentStore, FACET_FIELDS
+from write_behind import DifyOutbox
+from approval_journal import ApprovalJournal
+from stats_store import StatsStore, BufferedApprovalCounter, make_approval_event
+from review_metrics import observe_request, cache_result, track_dify, track_parse
 
 # 添加项目路径
 sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'mcp_services'))
 from common.config import BASE_CONFIG
+from common.metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from common.tracing import TRACER, span, traced
 
 # 配置日志
 logging.basicConfig(
@@ -31,21 +47,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, 
-            template_folder='.',
-            static_folder='static')
 
-# 配置CORS支持跨域访问
-CORS(app, resources={
+def jsonify(*args, **kwargs):
+    """flask.jsonify，序列化耗时计入请求追踪"""
+    with span('jsonify'):
+        return flask_jsonify(*args, **kwargs)
+
+
+# 全部路由注册在蓝图上，由create_app()创建应用时挂载
+bp = Blueprint('review_qa', __name__)
+
+# CORS跨域配置
+CORS_RESOURCES = {
     r"/api/*": {
         "origins": "*",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "allow_headers": ["Content-Type", "Authorization", "X-Reviewer"],
         "expose_headers": ["Content-Type"],
         "supports_credentials": False,
         "max_age": 3600
     }
-})
+}
 
 # Dify配置
 DIFY_CONFIG = BASE_CONFIG['dify']
@@ -57,7 +79,7 @@ UNREVIEWED_DATASET_ID = "1397b9d1-8e25-4269-ba12-046059a425b6"  # 未审核知
 REVIEWED_DATASET_ID = "2df8ca5b-ac31-4dba-8b48-fc09f678b62d"    # 已审核知识库
 
 # 本地API配置
-LOCAL_QUERY_API_BASE = "http://192.168.1.138:49154/api/local/query"
+LOCAL_QUERY_API_BASE = os.getenv("REVIEW_LOCAL_QUERY_API_BASE", "http://192.168.1.138:49154/api/local/query")
 
 # 未审核知识库的文档配置
 UNREVIEWED_DOCUMENTS = {
@@ -84,6 +106,35 @@ REVIEWED_DOCUMENTS = {
     "010a4033-033e-456d-8e13-452d86cb2c16": "操作类"
 }
 
+# 本地数据目录（审核统计、写队列、事务日志、分段镜像）- 统一存放在resource/data文件夹
+# 使用绝对路径，更可靠（不受工作目录影响）
+# 从 src/src/web_admin/review-QA/review_qa_backend.py 回到 src/resource/data（REVIEW_DATA_DIR可覆盖，如基准测试使用临时目录）
+DATA_DIR = Path(
+    os.getenv("REVIEW_DATA_DIR") or Path(__file__).resolve().parent.parent.parent.parent / 'resource' / 'data'
+).resolve()
+
+# 本地分段镜像：列表、计数、单分段查询、查重读本地镜像，后台定期与Dify同步
+MIRROR_DB = DATA_DIR / 'segment_mirror.db'
+MIRROR_ENABLED = os.getenv("REVIEW_MIRROR_ENABLED", "true").lower() == "true"
+MIRROR_SYNC_INTERVAL = int(os.getenv("REVIEW_MIRROR_SYNC_INTERVAL", "300"))   # 增量同步间隔（秒）
+MIRROR_FULL_SYNC_EVERY = max(1, int(os.getenv("REVIEW_MIRROR_FULL_SYNC_EVERY", "12")))  # 每N次增量同步做一次全量同步
+
+# 批量操作配置
+BATCH_MAX_OPERATIONS = 200  # 单次批量请求的最大操作数
+BATCH_MAX_WORKERS = 8       # 并发调用Dify的最大线程数
+
+# write-behind模式：更新/删除/审核通过先写本地分段存储并立即返回，Dify调用由后台队列重放
+WRITE_BEHIND_ENABLED = os.getenv("REVIEW_WRITE_BEHIND_ENABLED", "false").lower() == "true"
+
+# 运行指标：各进程定期把快照写入该目录，/metrics合并所有存活进程的指标
+METRICS_DIR = DATA_DIR / 'metrics'
+TRACES_DIR = METRICS_DIR / 'traces'
+
+# 请求追踪：每个进程在内存中保留最近N个请求的分阶段耗时（/debug/traces）
+TRACE_ENABLED = os.getenv("REVIEW_TRACE_ENABLED", "true").lower() == "true"
+TRACE_CAPACITY = int(os.getenv("REVIEW_TRACE_CAPACITY", "500"))
+TRACER.configure(capacity=TRACE_CAPACITY, enabled=TRACE_ENABLED)
+
 
 class DifyAPIClient:
     """Dify API客户端"""
@@ -96,6 +147,8 @@ class DifyAPIClient:
             'Content-Type': 'application/json'
         }
     
+    @traced('dify.get_segment')
+    @track_dify('get_segment')
     def get_segment(self, dataset_id: str, document_id: str, segment_id: str):
         """获取单个分段（最优方案）"""
         url = f"{self.base_url}/datasets/{dataset_id}/documents/{document_id}/segments/{segment_id}"
@@ -105,10 +158,15 @@ class DifyAPIClient:
             response.raise_for_status()
             result = response.json()
             return {'success': True, 'data': result.get('data')}
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"获取分段失败 [segment_id={segment_id}]: {e}")
+            return {'success': False, 'error': str(e), 'status_code': e.response.status_code}
         except Exception as e:
             logger.error(f"获取分段失败 [segment_id={segment_id}]: {e}")
             return {'success': False, 'error': str(e)}
     
+    @traced('dify.get_document_segments')
+    @track_dify('get_document_segments')
     def get_document_segments(self, dataset_id: str, document_id: str, page: int = 1, limit: int = 100):
         """获取文档的所有分段"""
         url = f"{self.base_url}/datasets/{dataset_id}/documents/{document_id}/segments"
@@ -122,6 +180,32 @@ class DifyAPIClient:
             logger.error(f"获取分段失败: {e}")
             return {'success': False, 'error': str(e)}
     
+    @traced('dify.get_documents')
+    @track_dify('get_documents')
+    def get_documents(self, dataset_id: str):
+        """获取知识库的所有文档（处理分页）"""
+        url = f"{self.base_url}/datasets/{dataset_id}/documents"
+        documents = []
+        page = 1
+        
+        try:
+            while True:
+                response = requests.get(url, headers=self.headers, params={'page': page, 'limit': 100}, timeout=30)
+                response.raise_for_status()
+                data = response.json()
+                documents.extend(data.get('data', []))
+                
+                if not data.get('has_more', False):
+                    break
+                page += 1
+            
+            return {'success': True, 'data': documents}
+        except Exception as e:
+            logger.error(f"获取文档列表失败 [dataset_id={dataset_id}]: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    @traced('dify.get_all_segments')
+    @track_dify('get_all_segments')
     def get_all_segments(self, dataset_id: str, document_id: str):
         """获取文档的所有分段（处理分页）"""
         all_segments = []
@@ -144,6 +228,8 @@ class DifyAPIClient:
         
         return {'success': True, 'data': all_segments}
     
+    @traced('dify.update_segment')
+    @track_dify('update_segment')
     def update_segment(self, dataset_id: str, document_id: str, segment_id: str, content: str, keywords: list = None):
         """更新分段内容"""
         url = f"{self.base_url}/datasets/{dataset_id}/documents/{document_id}/segments/{segment_id}"
@@ -161,6 +247,8 @@ class DifyAPIClient:
             logger.error(f"❌ 分段更新失败 [segment_id={segment_id}]: {e}")
             return {'success': False, 'error': str(e)}
     
+    @traced('dify.delete_segment')
+    @track_dify('delete_segment')
     def delete_segment(self, dataset_id: str, document_id: str, segment_id: str):
         """删除分段"""
         url = f"{self.base_url}/datasets/{dataset_id}/documents/{document_id}/segments/{segment_id}"
@@ -170,30 +258,43 @@ class DifyAPIClient:
             response.raise_for_status()
             logger.info(f"✅ 分段删除成功 [segment_id={segment_id}]")
             return {'success': True}
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"❌ 分段删除失败 [segment_id={segment_id}]: {e}")
+            return {'success': False, 'error': str(e), 'status_code': e.response.status_code}
         except Exception as e:
             logger.error(f"❌ 分段删除失败 [segment_id={segment_id}]: {e}")
             return {'success': False, 'error': str(e)}
     
     def add_segment(self, dataset_id: str, document_id: str, content: str, keywords: list = None):
-        """添加分段"""
+        """添加分段（委托add_segments，指标与追踪在add_segments中记录）"""
+        return self.add_segments(dataset_id, document_id, [{'content': content, 'keywords': keywords or []}])
+    
+    @traced('dify.add_segments')
+    @track_dify('add_segments')
+    def add_segments(self, dataset_id: str, document_id: str, segments: list):
+        """批量添加分段（一次请求写入多个分段，返回的分段顺序与请求一致）"""
         url = f"{self.base_url}/datasets/{dataset_id}/documents/{document_id}/segments"
         payload = {
-            'segments': [{
-                'content': content,
-                'keywords': keywords or []
-            }]
+            'segments': [
+                {'content': seg['content'], 'keywords': seg.get('keywords') or []}
+                for seg in segments
+            ]
         }
         
         try:
             response = requests.post(url, headers=self.headers, json=payload, timeout=30)
             response.raise_for_status()
-            logger.info(f"✅ 分段添加成功 [document_id={document_id}]")
+            logger.info(f"✅ 分段添加成功 [document_id={document_id}, 数量={len(segments)}]")
             return {'success': True, 'data': response.json()}
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"❌ 分段添加失败 [document_id={document_id}, 数量={len(segments)}]: {e}")
+            return {'success': False, 'error': str(e), 'status_code': e.response.status_code}
         except Exception as e:
-            logger.error(f"❌ 分段添加失败 [document_id={document_id}]: {e}")
+            logger.error(f"❌ 分段添加失败 [document_id={document_id}, 数量={len(segments)}]: {e}")
             return {'success': False, 'error': str(e)}
 
 
+@track_parse('parse_qa_content')
 def parse_qa_content(content: str):
     """从分段内容中解析问答对和元数据"""
     lines = content.split('\n')
@@ -255,6 +356,7 @@ def parse_qa_content(content: str):
     }
 
 
+@track_parse('clean_qa_content')
 def clean_qa_content(content: str, document_id: str = "") -> dict:
     """
     清理和规范化QA内容，返回解析后的字典
@@ -491,110 +593,451 @@ def determine_add_source(source: str):
     return source if source else '-'
 
 
-# ==================== 路由接口 ====================
+def parse_segment_fields(dataset_id: str, document_id: str, content: str) -> dict:
+    """解析分段内容为镜像字段（未审核区域与列表接口一致使用clean_qa_content）"""
+    if not content:
+        return {}
+    
+    if dataset_id == UNREVIEWED_DATASET_ID:
+        parsed = clean_qa_content(content, document_id=document_id)
+        parsed['add_method'] = parsed.get('add_method') or determine_add_method(document_id, parsed.get('add_type', ''))
+        return parsed
+    
+    return parse_qa_content(content)
 
-@app.route('/')
-def index():
-    """主页面"""
-    return render_template('review_qa.html')
 
+# 本地分段存储（Dify知识库的本地镜像，按segment_id定位分段）
+segment_store = SegmentStore(MIRROR_DB, parser=parse_segment_fields)
 
-@app.route('/api/unreviewed/segments', methods=['GET'])
-def get_unreviewed_segments():
-    """获取未审核区域的所有分段"""
-    try:
-        # 调用本地API获取数据
-        dataset_id = UNREVIEWED_DATASET_ID
-        api_url = f"{LOCAL_QUERY_API_BASE}?dataset_id={dataset_id}"
-        
-        logger.info(f"请求本地API: {api_url}")
-        response = requests.get(api_url, timeout=30)
-        
-        if response.status_code != 200:
-            logger.error(f"本地API请求失败: status_code={response.status_code}")
-            return jsonify({'success': False, 'error': f'本地API请求失败: {response.status_code}'}), 500
-        
-        api_data = response.json()
-        segments = api_data.get('data', [])
-        
-        if not segments:
-            logger.warning("本地API返回数据为空")
-            return jsonify({
-                'success': True,
-                'data': [],
-                'total': 0
-            })
+
+def mirror_ready(dataset_id: str, documents: dict) -> bool:
+    """本地镜像是否可用于读取（已启用且所有文档都已完成过同步）"""
+    return MIRROR_ENABLED and segment_store.is_synced(dataset_id, documents.keys())
+
+
+# 排队中尚未添加到Dify的分段在读取结果中的临时ID前缀
+PENDING_SEGMENT_PREFIX = 'pending-'
+PENDING_SEGMENT_ERROR = '分段正在同步到Dify，请稍后刷新再操作'
+
+
+def pending_write_ids() -> set:
+    """write-behind模式下有尚未同步到Dify的写操作的分段ID"""
+    return outbox.pending_segment_ids() if WRITE_BEHIND_ENABLED else set()
+
+
+def apply_pending_writes(dataset_id: str, segments: list, document_id: str = None) -> list:
+    """
+    write-behind模式：在读取结果上叠加尚未同步到Dify的写操作（以本地分段存储为准）
+    
+    1. 有排队操作的分段：已删除/已转移走的不再返回，已修改的返回本地存储中的内容
+    2. 排队中的添加（如审核通过）以临时ID pending-<队列ID> 出现在目标文档的最前面（不可编辑/删除）
+    
+    Args:
+        document_id: 只叠加该文档的添加（None表示整个知识库）
+    """
+    if not WRITE_BEHIND_ENABLED:
+        return segments
+    entries = outbox.pending_entries()
+    if not entries:
+        return segments
+    
+    documents = REVIEWED_DOCUMENTS if dataset_id == REVIEWED_DATASET_ID else UNREVIEWED_DOCUMENTS
+    pending_ids = {entry['segment_id'] for entry in entries}
+    
+    merged = []
+    for seg in segments:
+        if seg.get('id') in pending_ids:
+            local = segment_store.get(seg['id'])
+            if not local or local['dataset_id'] != dataset_id:
+                continue
+            seg = {**seg, **local}
+            if 'add_source' in seg:
+                seg['add_source'] = determine_add_source(local['source'])
+        merged.append(seg)
+    
+    added = []
+    for entry in entries:
+        payload = entry['payload']
+        if entry['op'] != 'add' or payload['dataset_id'] != dataset_id:
+            continue
+        if document_id and payload['document_id'] != document_id:
+            continue
+        seg = {
+            'id': f"{PENDING_SEGMENT_PREFIX}{entry['id']}",
+            'dataset_id': dataset_id,
+            'document_id': payload['document_id'],
+            'document_name': documents.get(payload['document_id'], '未知文档'),
+            'content': payload['content'],
+            'keywords': payload['keywords'],
+            'created_at': entry['created_at'],
+            'updated_at': entry['created_at'],
+            'pending': True
+        }
+        seg.update(parse_segment_fields(dataset_id, payload['document_id'], payload['content']))
+        if dataset_id == UNREVIEWED_DATASET_ID:
+            seg['add_source'] = determine_add_source(seg.get('source', ''))
+        added.append(seg)
+    
+    # 最新入队的添加排在最前（与按updated_at降序一致）
+    return added[::-1] + merged
+
+
+def local_reviewed_segment(segment_id: str) -> tuple:
+    """
+    本地分段存储中的单个已审核分段
+    
+    本地镜像可用或分段有排队中的写操作时以本地存储为准。
+    
+    Returns:
+        (是否以本地为准, 分段或None)，以本地为准且分段为None表示已删除/已转移
+    """
+    cached = segment_store.get(segment_id)
+    if cached and cached['dataset_id'] != REVIEWED_DATASET_ID:
+        cached = None
+    pending = WRITE_BEHIND_ENABLED and outbox.has_pending(segment_id)
+    if pending or (cached and mirror_ready(REVIEWED_DATASET_ID, REVIEWED_DOCUMENTS)):
+        return True, cached
+    return False, None
+
+
+@traced('parse_qa_content.batch')
+def prepare_reviewed_segments(document_id: str, segments: list) -> list:
+    """
+    Dify返回的已审核分段：写入本地分段存储并补充document_name、question、answer、classification
+    
+    有排队中写操作的分段不写入本地存储（Dify中的内容尚未更新），并叠加排队中的操作。
+    """
+    pending_ids = pending_write_ids()
+    segment_store.put_many(
+        REVIEWED_DATASET_ID, document_id, [seg for seg in segments if seg.get('id') not in pending_ids]
+    )
+    for seg in segments:
+        parsed = parse_qa_content(seg.get('content', ''))
+        seg['document_id'] = document_id
+        seg['document_name'] = REVIEWED_DOCUMENTS[document_id]
+        seg['question'] = parsed['question']
+        seg['answer'] = parsed['answer']
+        seg['classification'] = parsed.get('classification', '-')
+    return apply_pending_writes(REVIEWED_DATASET_ID, segments, document_id)
+
+
+def load_reviewed_segments(failed_documents: list = None) -> list:
+    """
+    加载所有已审核分段（含document_name、question、answer、classification）
+    
+    本地镜像可用时直接读镜像，否则逐个文档请求Dify；获取失败的文档跳过。
+    
+    Args:
+        failed_documents: 传入时追加获取失败的文档ID（调用方据此判断结果是否完整）
+    """
+    all_segments = []
+    client = None if mirror_ready(REVIEWED_DATASET_ID, REVIEWED_DOCUMENTS) else DifyAPIClient()
+    cache_result('mirror_reviewed', client is None)
+    
+    for doc_id, doc_name in REVIEWED_DOCUMENTS.items():
+        if client is None:
+            segments = segment_store.list_segments(REVIEWED_DATASET_ID, doc_id)
+            for seg in segments:
+                seg['document_id'] = doc_id
+                seg['document_name'] = doc_name
+            segments = apply_pending_writes(REVIEWED_DATASET_ID, segments, doc_id)
+        else:
+            result = client.get_all_segments(REVIEWED_DATASET_ID, doc_id)
+            if not result['success']:
+                logger.warning(f"⚠️ 获取已审核文档分段失败，已跳过 [document_id={doc_id}]: {result.get('error')}")
+                if failed_documents is not None:
+                    failed_documents.append(doc_id)
+                continue
+            segments = prepare_reviewed_segments(doc_id, result['data'])
         
-        all_segments = []
+        all_segments.extend(segments)
+    
+    return all_segments
+
+
+def load_unreviewed_segments(failed_documents: list = None) -> list:
+    """
+    加载所有未审核分段（含document_name、question、answer、add_method、add_source、classification）
+    
+    本地镜像可用时直接读镜像，否则请求本地查询API并写入本地分段存储。
+    请求失败时抛出异常。
+    
+    Args:
+        failed_documents: 与load_reviewed_segments一致（本地API一次返回全部文档，失败时整体抛出异常，不会追加）
+    """
+    # 本地镜像可用时直接读镜像
+    use_mirror = mirror_ready(UNREVIEWED_DATASET_ID, UNREVIEWED_DOCUMENTS)
+    cache_result('mirror_unreviewed', use_mirror)
+    if use_mirror:
+        all_segments = segment_store.list_segments(UNREVIEWED_DATASET_ID)
+        for seg in all_segments:
+            seg['document_name'] = UNREVIEWED_DOCUMENTS.get(seg['document_id'], '未知文档')
+            seg['add_source'] = determine_add_source(seg['source'])
+        return apply_pending_writes(UNREVIEWED_DATASET_ID, all_segments)
+    
+    # 调用本地API获取数据
+    dataset_id = UNREVIEWED_DATASET_ID
+    api_url = f"{LOCAL_QUERY_API_BASE}?dataset_id={dataset_id}"
+    
+    logger.info(f"请求本地API: {api_url}")
+    response = requests.get(api_url, timeout=30)
+    
+    if response.status_code != 200:
+        logger.error(f"本地API请求失败: status_code={response.status_code}")
+        raise RuntimeError(f'本地API请求失败: {response.status_code}')
+    
+    return prepare_unreviewed_segments(response.json().get('data', []))
+
+
+@traced('clean_qa_content.batch')
+def prepare_unreviewed_segments(segments: list) -> list:
+    """
+    本地查询API返回的未审核分段：字段转换、时间转换、内容解析，写入本地分段存储
+    
+    Returns:
+        按updated_at降序排列的分段列表
+    """
+    dataset_id = UNREVIEWED_DATASET_ID
+    
+    if not segments:
+        logger.warning("本地API返回数据为空")
+        return []
+    
+    all_segments = []
+    
+    # write-behind模式：有排队中写操作的分段不用本地API的旧内容覆盖本地存储
+    pending_ids = pending_write_ids()
+    
+    # 遍历所有分段，进行数据转换和处理
+    for seg in segments:
+        # 1. 字段名转换：segment_id → id
+        if 'segment_id' in seg:
+            seg['id'] = seg.pop('segment_id')
+        elif 'id' not in seg:
+            logger.warning(f"分段缺少id字段: {seg}")
+            continue
+        
+        # 2. 时间格式转换：字符串(UTC) → 时间戳(东八区)
+        created_at_str = seg.get('created_at', '')
+        if isinstance(created_at_str, str):
+            try:
+                # 解析为UTC时间
+                dt_utc = datetime.strptime(created_at_str, '%Y-%m-%d %H:%M:%S')
+                dt_utc = dt_utc.replace(tzinfo=timezone.utc)
+                # 转换为东八区时间（UTC+8）
+                dt_cst = dt_utc.astimezone(timezone(timedelta(hours=8)))
+                seg['created_at'] = int(dt_cst.timestamp())
+            except ValueError as e:
+                logger.warning(f"时间格式解析失败: {created_at_str}, 错误: {e}")
+                seg['created_at'] = 0
+        elif not isinstance(created_at_str, (int, float)):
+            seg['created_at'] = 0
         
-        # 遍历所有分段，进行数据转换和处理
-        for seg in segments:
-            # 1. 字段名转换：segment_id → id
-            if 'segment_id' in seg:
-                seg['id'] = seg.pop('segment_id')
-            elif 'id' not in seg:
-                logger.warning(f"分段缺少id字段: {seg}")
-                continue
-            
-            # 2. 时间格式转换：字符串(UTC) → 时间戳(东八区)
-            created_at_str = seg.get('created_at', '')
-            if isinstance(created_at_str, str):
+        # 3. 处理 updated_at：如果没有则使用 created_at
+        updated_at = seg.get('updated_at')
+        if updated_at:
+            if isinstance(updated_at, str):
                 try:
                     # 解析为UTC时间
-                    dt_utc = datetime.strptime(created_at_str, '%Y-%m-%d %H:%M:%S')
+                    dt_utc = datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S')
                     dt_utc = dt_utc.replace(tzinfo=timezone.utc)
                     # 转换为东八区时间（UTC+8）
                     dt_cst = dt_utc.astimezone(timezone(timedelta(hours=8)))
-                    seg['created_at'] = int(dt_cst.timestamp())
-                except ValueError as e:
-                    logger.warning(f"时间格式解析失败: {created_at_str}, 错误: {e}")
-                    seg['created_at'] = 0
-            elif not isinstance(created_at_str, (int, float)):
-                seg['created_at'] = 0
-            
-            # 3. 处理 updated_at：如果没有则使用 created_at
-            updated_at = seg.get('updated_at')
-            if updated_at:
-                if isinstance(updated_at, str):
-                    try:
-                        # 解析为UTC时间
-                        dt_utc = datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S')
-                        dt_utc = dt_utc.replace(tzinfo=timezone.utc)
-                        # 转换为东八区时间（UTC+8）
-                        dt_cst = dt_utc.astimezone(timezone(timedelta(hours=8)))
-                        seg['updated_at'] = int(dt_cst.timestamp())
-                    except ValueError:
-                        seg['updated_at'] = seg.get('created_at', 0)
-                elif not isinstance(updated_at, (int, float)):
+                    seg['updated_at'] = int(dt_cst.timestamp())
+                except ValueError:
                     seg['updated_at'] = seg.get('created_at', 0)
-            else:
+            elif not isinstance(updated_at, (int, float)):
                 seg['updated_at'] = seg.get('created_at', 0)
-            
-            # 4. 获取 document_name（根据 document_id 查找）
-            doc_id = seg.get('document_id', '')
-            doc_name = UNREVIEWED_DOCUMENTS.get(doc_id, '未知文档')
-            seg['document_name'] = doc_name
-            
-            # 5. 保留原始 content 字段（用于后续解析）
-            content = seg.get('content', '')
-            
-            # 5.5. 清理content（规范化格式）并解析
-            parsed = clean_qa_content(content, document_id=doc_id)
-            
-            # 6. 使用解析后的字段
-            seg['question'] = parsed.get('question', '')
-            seg['answer'] = parsed.get('answer', '')
-            # 直接使用clean_qa_content返回的add_method
-            seg['add_method'] = parsed.get('add_method', '') or determine_add_method(doc_id, parsed.get('add_type', ''))
-            seg['add_source'] = determine_add_source(parsed.get('source', ''))
-            seg['classification'] = parsed.get('classification', '')
-            
-            all_segments.append(seg)
+        else:
+            seg['updated_at'] = seg.get('created_at', 0)
+        
+        # 4. 获取 document_name（根据 document_id 查找）
+        doc_id = seg.get('document_id', '')
+        doc_name = UNREVIEWED_DOCUMENTS.get(doc_id, '未知文档')
+        seg['document_name'] = doc_name
+        
+        # 5. 保留原始 content 字段（用于后续解析）
+        content = seg.get('content', '')
+        
+        # 5.5. 清理content（规范化格式）并解析
+        parsed = clean_qa_content(content, document_id=doc_id)
+        
+        # 6. 使用解析后的字段
+        seg['question'] = parsed.get('question', '')
+        seg['answer'] = parsed.get('answer', '')
+        # 直接使用clean_qa_content返回的add_method
+        seg['add_method'] = parsed.get('add_method', '') or determine_add_method(doc_id, parsed.get('add_type', ''))
+        seg['add_source'] = determine_add_source(parsed.get('source', ''))
+        seg['classification'] = parsed.get('classification', '')
+        
+        if seg['id'] not in pending_ids:
+            segment_store.put(dataset_id, doc_id, seg)
+        all_segments.append(seg)
+    
+    all_segments = apply_pending_writes(dataset_id, all_segments)
+    
+    # 按 updated_at 降序排列（优先使用 updated_at，如果没有则使用 created_at）
+    all_segments.sort(key=lambda x: x.get('updated_at', x.get('created_at', 0)), reverse=True)
+    
+    logger.info(f"成功获取 {len(all_segments)} 个未审核分段")
+    return all_segments
+
+
+def get_reviewer(data: dict = None) -> str:
+    """审核人标识：请求头X-Reviewer（URL编码）或参数reviewer，缺省为“未知”"""
+    reviewer = unquote(request.headers.get('X-Reviewer', '')) or (data or {}).get('reviewer') or ''
+    return reviewer.strip() or '未知'
+
+
+def run_concurrently(func, items: list, max_workers: int = BATCH_MAX_WORKERS) -> list:
+    """并发执行func(item)，按输入顺序返回结果"""
+    if not items:
+        return []
+    # 每个任务在提交时的上下文副本中执行，任务内的追踪跨度归入当前请求
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
+
+
+def add_rejected(result: dict) -> bool:
+    """
+    添加请求是否确定未生效（Dify返回4xx）
+    
+    超时、连接中断或5xx时请求可能已在Dify写入，转移保持adding状态，
+    由恢复任务在目标文档中按内容查找后完成或放弃。
+    """
+    return 400 <= (result.get('status_code') or 0) < 500
+
+
+def should_queue_write(segment_id: str, cache_hit: bool, allow_queue: bool) -> bool:
+    """
+    write-behind模式下是否排队执行写操作
+    
+    本地分段存储命中的单个操作排队；未命中和批量接口走同步路径。
+    分段已有未完成的排队操作时必须排队，保证同一分段的操作顺序。
+    """
+    if not WRITE_BEHIND_ENABLED:
+        return False
+    return (cache_hit and allow_queue) or outbox.has_pending(segment_id)
+
+
+def update_segment_qa(client: DifyAPIClient, dataset_id: str, document_id: str, segment_id: str,
+                      question: str, answer: str, original_segment: dict = None, allow_queue: bool = True):
+    """
+    更新分段的问答内容（保留原有元数据）
+    
+    固定开销：1次单分段GET + 1次POST，与文档分段数量无关；
+    已传入original_segment时跳过GET。
+    本地分段存储中记录的document_id优先于请求参数（分段可能已被转移）。
+    allow_queue为False时（批量接口）不排队，除非分段已有排队中的操作。
+    
+    Returns:
+        (result, status_code)
+    """
+    if segment_id.startswith(PENDING_SEGMENT_PREFIX):
+        return {'success': False, 'error': PENDING_SEGMENT_ERROR}, 409
+    
+    cached = segment_store.get(segment_id)
+    cache_hit = bool(cached and cached['dataset_id'] == dataset_id)
+    cache_result('segment_store', cache_hit)
+    queue = should_queue_write(segment_id, cache_hit, allow_queue)
+    if cache_hit:
+        document_id = cached['document_id']
+        # 排队时本地存储命中即可，无需GET
+        if original_segment is None and queue:
+            original_segment = cached
+    
+    # 1. 获取原分段以保留元数据
+    if original_segment is None:
+        result = client.get_segment(dataset_id, document_id, segment_id)
         
-        # 按 updated_at 降序排列（优先使用 updated_at，如果没有则使用 created_at）
-        all_segments.sort(key=lambda x: x.get('updated_at', x.get('created_at', 0)), reverse=True)
+        if not result['success']:
+            if result.get('status_code') == 404:
+                return {'success': False, 'error': '分段不存在'}, 404
+            return result, 500
         
-        logger.info(f"成功获取 {len(all_segments)} 个未审核分段")
+        original_segment = result['data']
+        if not original_segment:
+            return {'success': False, 'error': '分段不存在'}, 404
+    
+    # 2. 解析原内容并构造新内容
+    parsed = parse_qa_content(original_segment.get('content', ''))
+    new_content = format_qa_content(
+        question,
+        answer,
+        parsed.get('source', ''),
+        parsed.get('add_type', ''),
+        parsed.get('classification', '')
+    )
+    
+    # 3. 更新分段
+    keywords = [question[:50]] if len(question) > 0 else []
+    
+    if queue:
+        segment_store.put(dataset_id, document_id, original_segment)
+        segment_store.update_content(segment_id, new_content, keywords)
+        refresh_duplicate_index([segment_id])
+        outbox.enqueue('update', segment_id, {
+            'dataset_id': dataset_id,
+            'document_id': document_id,
+            'segment_id': segment_id,
+            'content': new_content,
+            'keywords': keywords
+        })
+        return {'success': True, 'queued': True}, 200
+    
+    result = client.update_segment(dataset_id, document_id, segment_id, new_content, keywords)
+    
+    if not result['success']:
+        return result, 200
+    
+    # 4. 同步本地分段存储
+    updated_segment = (result.get('data') or {}).get('data') or dict(original_segment, content=new_content)
+    segment_store.put(dataset_id, document_id, updated_segment)
+    refresh_duplicate_index([segment_id])
+    
+    return result, 200
+
+
+
+def delete_segment_qa(client: DifyAPIClient, dataset_id: str, document_id: str, segment_id: str,
+                      allow_queue: bool = True):
+    """删除分段并同步本地分段存储（write-behind模式下本地存储命中时排队执行）"""
+    if segment_id.startswith(PENDING_SEGMENT_PREFIX):
+        return {'success': False, 'error': PENDING_SEGMENT_ERROR}
+    
+    cached = segment_store.get(segment_id)
+    if should_queue_write(segment_id, bool(cached and cached['dataset_id'] == dataset_id), allow_queue):
+        segment_store.remove(segment_id)
+        refresh_duplicate_index([segment_id])
+        outbox.enqueue('delete', segment_id, {
+            'dataset_id': dataset_id,
+            'document_id': document_id,
+            'segment_id': segment_id
+        })
+        return {'success': True, 'queued': True}
+    
+    result = client.delete_segment(dataset_id, document_id, segment_id)
+    
+    if result['success']:
+        segment_store.remove(segment_id)
+        refresh_duplicate_index([segment_id])
+    
+    return result
+
+# ==================== 路由接口 ====================
+
+@bp.route('/')
+def index():
+    """主页面"""
+    return render_template('review_qa.html')
+
+
+@bp.route('/api/unreviewed/segments', methods=['GET'])
+def get_unreviewed_segments():
+    """获取未审核区域的所有分段"""
+    try:
+        all_segments = load_unreviewed_segments()
         
         return jsonify({
             'success': True,
@@ -610,7 +1053,7 @@ def get_unreviewed_segments():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/reviewed/documents', methods=['GET'])
+@bp.route('/api/reviewed/documents', methods=['GET'])
 def get_reviewed_documents():
     """获取已审核文档列表"""
     try:
@@ -629,7 +1072,7 @@ def get_reviewed_documents():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/document-categories', methods=['GET'])
+@bp.route('/api/document-categories', methods=['GET'])
 def get_document_categories():
     """获取所有文档分类列表(用于下拉选择)"""
     try:
@@ -649,30 +1092,36 @@ def get_document_categories():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/reviewed/segments/<document_id>', methods=['GET'])
+@bp.route('/api/reviewed/segments/<document_id>', methods=['GET'])
 def get_reviewed_segments(document_id):
     """获取已审核区域指定文档的所有分段"""
     try:
         if document_id not in REVIEWED_DOCUMENTS:
             return jsonify({'success': False, 'error': '无效的文档ID'}), 400
         
+        # 本地镜像可用时直接读镜像（已按updated_at降序）
+        use_mirror = mirror_ready(REVIEWED_DATASET_ID, REVIEWED_DOCUMENTS)
+        cache_result('mirror_reviewed', use_mirror)
+        if use_mirror:
+            segments = segment_store.list_segments(REVIEWED_DATASET_ID, document_id)
+            for segment in segments:
+                segment['document_name'] = REVIEWED_DOCUMENTS[document_id]
+            segments = apply_pending_writes(REVIEWED_DATASET_ID, segments, document_id)
+            
+            return jsonify({
+                'success': True,
+                'data': segments,
+                'total': len(segments)
+            })
+        
         client = DifyAPIClient()
         result = client.get_all_segments(REVIEWED_DATASET_ID, document_id)
         
         if not result['success']:
             return jsonify(result), 500
         
-        segments = result['data']
-        
         # 为每个分段添加元数据
-        for segment in segments:
-            content = segment.get('content', '')
-            parsed = parse_qa_content(content)
-            
-            segment['document_id'] = document_id
-            segment['document_name'] = REVIEWED_DOCUMENTS[document_id]
-            segment['question'] = parsed['question']
-            segment['answer'] = parsed['answer']
+        segments = prepare_reviewed_segments(document_id, result['data'])
         
         # 按updated_at降序排序
         segments.sort(key=lambda x: x.get('updated_at', 0), reverse=True)
@@ -688,7 +1137,7 @@ def get_reviewed_segments(document_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/segment/update', methods=['POST'])
+@bp.route('/api/segment/update', methods=['POST'])
 def update_segment():
     """更新分段内容"""
     try:
@@ -702,47 +1151,88 @@ def update_segment():
         if not all([dataset_id, document_id, segment_id, question, answer]):
             return jsonify({'success': False, 'error': '缺少必要参数'}), 400
         
-        # 获取原分段以保留元数据
         client = DifyAPIClient()
-        result = client.get_document_segments(dataset_id, document_id)
+        result, status_code = update_segment_qa(client, dataset_id, document_id, segment_id, question, answer)
         
-        if not result['success']:
-            return jsonify(result), 500
+        return jsonify(result), status_code
         
-        # 查找原分段
-        original_segment = None
-        for seg in result['data'].get('data', []):
-            if seg['id'] == segment_id:
-                original_segment = seg
-                break
+    except Exception as e:
+        logger.error(f"更新分段失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/segment/batch-update', methods=['POST'])
+def batch_update_segments():
+    """
+    批量更新分段内容（一页的编辑一次提交）
+    
+    请求参数: {"dataset_id": "知识库ID", "updates": [{document_id, segment_id, question, answer}]}
+    
+    原分段优先从本地分段存储读取（一次查找，无需GET），
+    未命中的分段再单独获取；Dify更新请求以有限并发执行。
+    """
+    try:
+        data = request.json or {}
+        dataset_id = data.get('dataset_id')
+        updates = data.get('updates') or []
         
-        if not original_segment:
-            return jsonify({'success': False, 'error': '分段不存在'}), 404
+        if not dataset_id or not updates:
+            return jsonify({'success': False, 'error': '缺少必要参数'}), 400
         
-        # 解析原内容以保留元数据
-        original_content = original_segment.get('content', '')
-        parsed = parse_qa_content(original_content)
+        if len(updates) > BATCH_MAX_OPERATIONS:
+            return jsonify({'success': False, 'error': f'单次最多{BATCH_MAX_OPERATIONS}个操作'}), 400
         
-        # 构造新内容
-        new_content = format_qa_content(
-            question, 
-            answer,
-            parsed.get('source', ''),
-            parsed.get('add_type', '')
-        )
+        results = []
+        jobs = []
         
-        # 更新分段
-        keywords = [question[:50]] if len(question) > 0 else []
-        result = client.update_segment(dataset_id, document_id, segment_id, new_content, keywords)
+        for update in updates:
+            segment_id = update.get('segment_id')
+            document_id = update.get('document_id')
+            question = (update.get('question') or '').strip()
+            answer = (update.get('answer') or '').strip()
+            item = {'segment_id': segment_id, 'success': False}
+            results.append(item)
+            
+            if not all([document_id, segment_id, question, answer]):
+                item['error'] = '缺少必要参数'
+                continue
+            
+            cached = segment_store.get(segment_id)
+            original_segment = cached if cached and cached['dataset_id'] == dataset_id else None
+            jobs.append((item, document_id, segment_id, question, answer, original_segment))
         
-        return jsonify(result)
+        client = DifyAPIClient()
+        
+        def run_update(job):
+            _, document_id, segment_id, question, answer, original_segment = job
+            result, _ = update_segment_qa(
+                client, dataset_id, document_id, segment_id, question, answer, original_segment, allow_queue=False
+            )
+            return result
+        
+        for job, result in zip(jobs, run_concurrently(run_update, jobs)):
+            item = job[0]
+            item['success'] = result['success']
+            if not result['success']:
+                item['error'] = result.get('error')
+        
+        succeeded = sum(1 for item in results if item['success'])
+        logger.info(f"✅ 批量更新完成 [总数={len(results)}, 成功={succeeded}, 失败={len(results) - succeeded}]")
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded
+        })
         
     except Exception as e:
-        logger.error(f"更新分段失败: {e}")
+        logger.error(f"批量更新分段失败: {e}", exc_info=True)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/segment/delete', methods=['POST'])
+@bp.route('/api/segment/delete', methods=['POST'])
 def delete_segment():
     """删除分段"""
     try:
@@ -755,7 +1245,7 @@ def delete_segment():
             return jsonify({'success': False, 'error': '缺少必要参数'}), 400
         
         client = DifyAPIClient()
-        result = client.delete_segment(dataset_id, document_id, segment_id)
+        result = delete_segment_qa(client, dataset_id, document_id, segment_id)
         
         return jsonify(result)
         
@@ -764,10 +1254,17 @@ def delete_segment():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/reviewed/segment/<segment_id>', methods=['GET'])
+@bp.route('/api/reviewed/segment/<segment_id>', methods=['GET'])
 def get_reviewed_segment_by_id(segment_id):
     """获取单个已审核分段(RESTful风格)"""
     try:
+        local, cached = local_reviewed_segment(segment_id)
+        cache_result('segment_store', local)
+        if local:
+            if cached is None:
+                return jsonify({'success': False, 'error': '分段不存在'}), 404
+            return jsonify({'success': True, 'data': cached})
+        
         # 需要遍历所有文档查找该分段
         client = DifyAPIClient()
         
@@ -782,7 +1279,7 @@ def get_reviewed_segment_by_id(segment_id):
         logger.error(f"获取分段失败: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/reviewed/segments/<segment_id>', methods=['PUT'])
+@bp.route('/api/reviewed/segments/<segment_id>', methods=['PUT'])
 def update_reviewed_segment(segment_id):
     """更新已审核分段内容(RESTful风格)"""
     try:
@@ -794,39 +1291,16 @@ def update_reviewed_segment(segment_id):
         if not all([document_id, question, answer]):
             return jsonify({'success': False, 'error': '缺少必要参数'}), 400
         
-        # 获取原分段以保留元数据
         client = DifyAPIClient()
-        result = client.get_segment(REVIEWED_DATASET_ID, document_id, segment_id)
-        
-        if not result['success']:
-            return jsonify(result), 500
-        
-        original_segment = result['data']
+        result, status_code = update_segment_qa(client, REVIEWED_DATASET_ID, document_id, segment_id, question, answer)
         
-        # 解析原内容以保留元数据
-        original_content = original_segment.get('content', '')
-        parsed = parse_qa_content(original_content)
-        
-        # 构造新内容
-        new_content = format_qa_content(
-            question, 
-            answer,
-            parsed.get('source', ''),
-            parsed.get('add_type', ''),
-            parsed.get('classification', '')
-        )
-        
-        # 更新分段
-        keywords = [question[:50]] if len(question) > 0 else []
-        result = client.update_segment(REVIEWED_DATASET_ID, document_id, segment_id, new_content, keywords)
-        
-        return jsonify(result)
+        return jsonify(result), status_code
         
     except Exception as e:
         logger.error(f"更新分段失败: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/reviewed/segments/<segment_id>', methods=['DELETE'])
+@bp.route('/api/reviewed/segments/<segment_id>', methods=['DELETE'])
 def delete_reviewed_segment(segment_id):
     """删除已审核分段(RESTful风格)"""
     try:
@@ -837,7 +1311,7 @@ def delete_reviewed_segment(segment_id):
             return jsonify({'success': False, 'error': '缺少document_id参数'}), 400
         
         client = DifyAPIClient()
-        result = client.delete_segment(REVIEWED_DATASET_ID, document_id, segment_id)
+        result = delete_segment_qa(client, REVIEWED_DATASET_ID, document_id, segment_id)
         
         return jsonify(result)
         
@@ -845,7 +1319,7 @@ def delete_reviewed_segment(segment_id):
         logger.error(f"删除分段失败: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/segment/approve', methods=['POST'])
+@bp.route('/api/segment/approve', methods=['POST'])
 def approve_segment():
     """通过审核（转移到已审核知识库）"""
     try:
@@ -862,6 +1336,46 @@ def approve_segment():
         if target_document_id not in REVIEWED_DOCUMENTS:
             return jsonify({'success': False, 'error': '无效的目标文档ID'}), 400
         
+        # write-behind模式：本地存储命中时立即确认，转移（添加 + 删除）排队执行
+        cached = segment_store.get(segment_id)
+        if WRITE_BEHIND_ENABLED and cached and cached['dataset_id'] == UNREVIEWED_DATASET_ID:
+            parsed = parse_qa_content(cached['content'])
+            new_content = format_qa_content(
+                question,
+                answer,
+                parsed.get('source', ''),
+                parsed.get('add_type', '')
+            )
+            keywords = [question[:50]] if len(question) > 0 else []
+            
+            with span('sqlite.outbox'):
+                outbox.enqueue_many([
+                    ('add', segment_id, {
+                        'dataset_id': REVIEWED_DATASET_ID,
+                        'document_id': target_document_id,
+                        'content': new_content,
+                        'keywords': keywords
+                    }),
+                    ('delete', segment_id, {
+                        'dataset_id': UNREVIEWED_DATASET_ID,
+                        'document_id': cached['document_id'],
+                        'segment_id': segment_id
+                    })
+                ])
+            with span('sqlite.segment_store'):
+                segment_store.remove(segment_id)
+            refresh_duplicate_index([segment_id])
+            record_approval([
+                make_approval_event(get_reviewer(data), cached['document_id'], target_document_id, segment_id)
+            ])
+            
+            logger.info(f"✅ 审核通过（已排队） [segment_id={segment_id}] -> [目标文档={REVIEWED_DOCUMENTS[target_document_id]}]")
+            return jsonify({
+                'success': True,
+                'queued': True,
+                'message': f'已转移到 {REVIEWED_DOCUMENTS[target_document_id]}'
+            })
+        
         client = DifyAPIClient()
         
         # 1. 使用单个分段查询API（最优方案）
@@ -889,24 +1403,49 @@ def approve_segment():
             parsed.get('add_type', '')
         )
         
-        # 4. 在目标文档中添加分段
+        # 4. 在目标文档中添加分段（先写事务日志，崩溃后由恢复任务完成）
         keywords = [question[:50]] if len(question) > 0 else []
+        with span('sqlite.journal'):
+            move_id = approval_journal.begin(
+                segment_id, UNREVIEWED_DATASET_ID, source_document_id,
+                REVIEWED_DATASET_ID, target_document_id, new_content
+            )
         add_result = client.add_segment(REVIEWED_DATASET_ID, target_document_id, new_content, keywords)
         
         if not add_result['success']:
+            if add_rejected(add_result):
+                approval_journal.mark_aborted(move_id, add_result.get('error'))
+            else:
+                approval_journal.record_error(move_id, add_result.get('error'))
             return jsonify({'success': False, 'error': f'添加到目标文档失败: {add_result.get("error")}'}), 500
         
+        created = add_result['data'].get('data', [])
+        with span('sqlite.journal'):
+            approval_journal.mark_added(move_id, created[0].get('id') if created else None)
+        with span('sqlite.segment_store'):
+            segment_store.put_many(REVIEWED_DATASET_ID, target_document_id, created)
+        
         # 5. 删除原分段
         delete_result = client.delete_segment(UNREVIEWED_DATASET_ID, source_document_id, segment_id)
         
-        if not delete_result['success']:
-            logger.warning(f"⚠️ 删除原分段失败，但已添加到目标文档: {delete_result.get('error')}")
+        if delete_result['success'] or delete_result.get('status_code') == 404:
+            with span('sqlite.journal'):
+                approval_journal.mark_done(move_id)
+            with span('sqlite.segment_store'):
+                segment_store.remove(segment_id)
+        else:
+            approval_journal.record_error(move_id, delete_result.get('error'))
+            logger.warning(f"⚠️ 删除原分段失败，但已添加到目标文档（待恢复任务重试）: {delete_result.get('error')}")
+        
+        refresh_duplicate_index([seg.get('id') for seg in created] + [segment_id])
         
         target_doc_name = REVIEWED_DOCUMENTS.get(target_document_id, '未知文档')
         logger.info(f"✅ 审核通过 [segment_id={segment_id}] -> [目标文档={target_doc_name}]")
         
         # 记录审核统计
-        record_approval()
+        record_approval([
+            make_approval_event(get_reviewer(data), source_document_id, target_document_id, segment_id)
+        ])
         
         return jsonify({
             'success': True,
@@ -918,87 +1457,730 @@ def approve_segment():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-# 审核统计数据库 - 统一存放在resource/data文件夹
-# 使用绝对路径，更可靠（不受工作目录影响）
-_current_file = Path(__file__).resolve()
-# 从 src/src/web_admin/review-QA/review_qa_backend.py 回到 src/src/
-STATS_DB = _current_file.parent.parent.parent.parent / 'resource' / 'data' / 'approval_stats.db'
-
-
-def ensure_stats_db_dir():
-    """确保数据库目录存在（跨平台兼容）"""
-    STATS_DB.parent.mkdir(parents=True, exist_ok=True)
-
-def init_stats_db():
-    """初始化统计数据库"""
-    import sqlite3
-    
-    # 确保目录存在
-    ensure_stats_db_dir()
-    
-    conn = sqlite3.connect(str(STATS_DB))
-    cursor = conn.cursor()
+@bp.route('/api/segments/batch', methods=['POST'])
+def batch_segment_operations():
+    """
+    批量审核操作（批量通过 / 删除 / 转移）
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS approval_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            approval_date DATE NOT NULL,
-            count INTEGER DEFAULT 0,
-            UNIQUE(approval_date)
-        )
-    ''')
+    请求参数: {"operations": [{"op": "approve" | "delete" | "move", ...}]}
+    - approve: source_document_id, segment_id, target_document_id, question, answer
+    - delete: dataset_id, document_id, segment_id
+    - move: document_id, segment_id, target_document_id（已审核文档之间转移，内容不变）
     
-    conn.commit()
-    conn.close()
-    logger.info("✅ 审核统计数据库初始化完成 [db_path=%s]", STATS_DB)
-
-# 模块加载时自动初始化数据库，确保表存在
-init_stats_db()
+    处理流程：
+    1. 并发获取所有待转移的原分段
+    2. 按目标文档分组，每个目标文档只发送一次add_segment请求（segments数组）
+    3. 添加成功的原分段与待删除分段并发删除
+    4. 返回每个操作的执行结果
+    """
+    try:
+        data = request.json or {}
+        operations = data.get('operations') or []
+        
+        if not operations:
+            return jsonify({'success': False, 'error': '缺少operations参数'}), 400
+        
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            return jsonify({'success': False, 'error': f'单次最多{BATCH_MAX_OPERATIONS}个操作'}), 400
+        
+        results = []
+        transfers = []  # 需要 GET + add + delete 的操作
+        deletes = []    # 仅需 delete 的操作
+        
+        seen_segment_ids = set()
+        
+        # 1. 参数校验
+        for index, op in enumerate(operations):
+            if not isinstance(op, dict):
+                results.append({'index': index, 'op': None, 'segment_id': None, 'success': False, 'error': '操作格式错误'})
+                continue
+            
+            op_type = op.get('op')
+            segment_id = op.get('segment_id')
+            item = {'index': index, 'op': op_type, 'segment_id': segment_id, 'success': False}
+            results.append(item)
+            
+            if segment_id is not None and not isinstance(segment_id, str):
+                item['error'] = '参数格式错误'
+                continue
+            # 同一分段在一个批次内只处理一次
+            if segment_id and segment_id in seen_segment_ids:
+                item['error'] = '同一批次中分段重复'
+                continue
+            if segment_id:
+                seen_segment_ids.add(segment_id)
+            
+            if op_type == 'approve':
+                source_document_id = op.get('source_document_id')
+                target_document_id = op.get('target_document_id')
+                question = (op.get('question') or '').strip()
+                answer = (op.get('answer') or '').strip()
+                
+                if not all([source_document_id, segment_id, target_document_id, question, answer]):
+                    item['error'] = '缺少必要参数'
+                elif target_document_id not in REVIEWED_DOCUMENTS:
+                    item['error'] = '无效的目标文档ID'
+                else:
+                    transfers.append({
+                        'index': index,
+                        'dataset_id': UNREVIEWED_DATASET_ID,
+                        'document_id': source_document_id,
+                        'segment_id': segment_id,
+                        'target_document_id': target_document_id,
+                        'question': question,
+                        'answer': answer
+                    })
+            elif op_type == 'move':
+                document_id = op.get('document_id')
+                target_document_id = op.get('target_document_id')
+                
+                if not all([document_id, segment_id, target_document_id]):
+                    item['error'] = '缺少必要参数'
+                elif document_id not in REVIEWED_DOCUMENTS or target_document_id not in REVIEWED_DOCUMENTS:
+                    item['error'] = '无效的文档ID'
+                elif document_id == target_document_id:
+                    item['error'] = '源文档与目标文档相同'
+                else:
+                    transfers.append({
+                        'index': index,
+                        'dataset_id': REVIEWED_DATASET_ID,
+                        'document_id': document_id,
+                        'segment_id': segment_id,
+                        'target_document_id': target_document_id
+                    })
+            elif op_type == 'delete':
+                dataset_id = op.get('dataset_id')
+                document_id = op.get('document_id')
+                
+                if not all([dataset_id, document_id, segment_id]):
+                    item['error'] = '缺少必要参数'
+                else:
+                    deletes.append({
+                        'index': index,
+                        'dataset_id': dataset_id,
+                        'document_id': document_id,
+                        'segment_id': segment_id
+                    })
+            else:
+                item['error'] = f'未知的操作类型: {op_type}'
+        
+        client = DifyAPIClient()
+        
+        # 2. 并发获取原分段
+        fetched = run_concurrently(
+            lambda t: client.get_segment(t['dataset_id'], t['document_id'], t['segment_id']),
+            transfers
+        )
+        
+        groups = {}  # target_document_id -> [(transfer, new_segment)]
+        for transfer, result in zip(transfers, fetched):
+            item = results[transfer['index']]
+            original_segment = result.get('data') if result['success'] else None
+            
+            if not result['success']:
+                item['error'] = f"获取原分段失败: {result.get('error')}"
+                continue
+            if not original_segment:
+                item['error'] = '原分段不存在'
+                continue
+            
+            original_content = original_segment.get('content', '')
+            if 'question' in transfer:
+                # 审核通过：使用编辑后的问答，保留元数据
+                parsed = parse_qa_content(original_content)
+                new_segment = {
+                    'content': format_qa_content(
+                        transfer['question'],
+                        transfer['answer'],
+                        parsed.get('source', ''),
+                        parsed.get('add_type', '')
+                    ),
+                    'keywords': [transfer['question'][:50]]
+                }
+            else:
+                # 文档间转移：内容保持不变
+                new_segment = {
+                    'content': original_content,
+                    'keywords': original_segment.get('keywords') or []
+                }
+            
+            groups.setdefault(transfer['target_document_id'], []).append((transfer, new_segment))
+        
+        # 3. 按目标文档批量添加（先写事务日志，崩溃后由恢复任务完成）
+        for target_document_id, entries in groups.items():
+            for transfer, new_segment in entries:
+                transfer['move_id'] = approval_journal.begin(
+                    transfer['segment_id'], transfer['dataset_id'], transfer['document_id'],
+                    REVIEWED_DATASET_ID, target_document_id, new_segment['content']
+                )
+        
+        def add_group(group):
+            target_document_id, entries = group
+            return client.add_segments(REVIEWED_DATASET_ID, target_document_id, [seg for _, seg in entries])
+        
+        group_items = list(groups.items())
+        for (target_document_id, entries), add_result in zip(group_items, run_concurrently(add_group, group_items)):
+            if not add_result['success']:
+                for transfer, _ in entries:
+                    if add_rejected(add_result):
+                        approval_journal.mark_aborted(transfer['move_id'], add_result.get('error'))
+                    else:
+                        approval_journal.record_error(transfer['move_id'], add_result.get('error'))
+                    results[transfer['index']]['error'] = f"添加到目标文档失败: {add_result.get('error')}"
+                continue
+            
+            created = add_result['data'].get('data', [])
+            segment_store.put_many(REVIEWED_DATASET_ID, target_document_id, created)
+            refresh_duplicate_index([seg.get('id') for seg in created])
+            
+            for position, (transfer, _) in enumerate(entries):
+                new_segment_id = created[position].get('id') if position < len(created) else None
+                approval_journal.mark_added(transfer['move_id'], new_segment_id)
+                item = results[transfer['index']]
+                item['success'] = True
+                item['message'] = f'已转移到 {REVIEWED_DOCUMENTS[target_document_id]}'
+                deletes.append({
+                    'index': transfer['index'],
+                    'dataset_id': transfer['dataset_id'],
+                    'document_id': transfer['document_id'],
+                    'segment_id': transfer['segment_id'],
+                    'move_id': transfer['move_id']
+                })
+        
+        # 4. 并发删除
+        deleted = run_concurrently(
+            lambda d: client.delete_segment(d['dataset_id'], d['document_id'], d['segment_id']),
+            deletes
+        )
+        
+        for delete, delete_result in zip(deletes, deleted):
+            item = results[delete['index']]
+            move_id = delete.get('move_id')
+            if delete_result['success'] or (move_id and delete_result.get('status_code') == 404):
+                if move_id:
+                    approval_journal.mark_done(move_id)
+                segment_store.remove(delete['segment_id'])
+                refresh_duplicate_index([delete['segment_id']])
+                item['success'] = True
+            elif move_id:
+                # 与单条审核一致：已添加到目标文档即视为成功，原分段由恢复任务重试删除
+                approval_journal.record_error(move_id, delete_result.get('error'))
+                logger.warning(f"⚠️ 删除原分段失败，但已添加到目标文档: {delete_result.get('error')}")
+                item['warning'] = f"删除原分段失败: {delete_result.get('error')}"
+            else:
+                item['error'] = delete_result.get('error')
+        
+        # 5. 记录审核统计
+        reviewer = get_reviewer(data)
+        record_approval([
+            make_approval_event(reviewer, t['document_id'], t['target_document_id'], t['segment_id'])
+            for t in transfers
+            if 'question' in t and results[t['index']]['success']
+        ])
+        
+        succeeded = sum(1 for item in results if item['success'])
+        logger.info(f"✅ 批量操作完成 [总数={len(results)}, 成功={succeeded}, 失败={len(results) - succeeded}]")
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded
+        })
+        
+    except Exception as e:
+        logger.error(f"批量操作失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def get_facet_filters() -> dict:
+    """从查询参数中读取分面过滤条件"""
+    return {
+        field: request.args[field]
+        for field in FACET_FIELDS
+        if request.args.get(field) is not None and request.args.get(field) != ''
+    }
+
+
+# 搜索范围 -> (知识库ID, 文档名称映射)
+SEARCH_SCOPES = {
+    'unreviewed': (UNREVIEWED_DATASET_ID, UNREVIEWED_DOCUMENTS),
+    'reviewed': (REVIEWED_DATASET_ID, REVIEWED_DOCUMENTS)
+}
+SEARCH_MAX_PAGE_SIZE = 100
+
 
-def record_approval():
-    """记录一次审核"""
-    import sqlite3
-    from datetime import date
+@bp.route('/api/search', methods=['GET'])
+def search_segments():
+    """
+    全文搜索分段（本地镜像的FTS5索引）
     
-    today = date.today().isoformat()
+    参数: q（空格分隔的关键词，全部命中）、scope（unreviewed / reviewed / all）、
+    分面过滤（document_id / add_method / add_type / classification，可选）、page、page_size
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        scope = request.args.get('scope', 'all')
+        filters = get_facet_filters()
+        page = max(request.args.get('page', 1, type=int), 1)
+        page_size = min(max(request.args.get('page_size', 20, type=int), 1), SEARCH_MAX_PAGE_SIZE)
+        
+        if not query:
+            return jsonify({'success': False, 'error': '缺少搜索关键词'}), 400
+        if scope != 'all' and scope not in SEARCH_SCOPES:
+            return jsonify({'success': False, 'error': '无效的搜索范围'}), 400
+        
+        scopes = SEARCH_SCOPES.values() if scope == 'all' else [SEARCH_SCOPES[scope]]
+        
+        start = time.perf_counter()
+        result = segment_store.search(
+            query,
+            dataset_id=None if scope == 'all' else SEARCH_SCOPES[scope][0],
+            filters=filters,
+            limit=page_size,
+            offset=(page - 1) * page_size
+        )
+        took_ms = round((time.perf_counter() - start) * 1000, 2)
+        
+        for item in result['items']:
+            document_names = UNREVIEWED_DOCUMENTS if item['dataset_id'] == UNREVIEWED_DATASET_ID else REVIEWED_DOCUMENTS
+            item['document_name'] = document_names.get(item['document_id'], '未知文档')
+            item['add_source'] = determine_add_source(item['source'])
+        
+        return jsonify({
+            'success': True,
+            'data': result['items'],
+            'total': result['total'],
+            'page': page,
+            'page_size': page_size,
+            'took_ms': took_ms,
+            # 镜像尚未完成首次同步时结果可能不完整
+            'complete': all(mirror_ready(dataset_id, documents) for dataset_id, documents in scopes)
+        })
+        
+    except Exception as e:
+        logger.error(f"搜索分段失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/facets', methods=['GET'])
+def get_facets():
+    """
+    分面计数（按文档、添加方式、添加类型、分类）
     
-    # 确保目录存在
-    ensure_stats_db_dir()
+    无条件时读取本地镜像的预计算计数器；带搜索关键词q或分面过滤条件时，
+    在命中结果内聚合计数。
+    """
+    try:
+        scope = request.args.get('scope', 'unreviewed')
+        query = request.args.get('q', '').strip()
+        filters = get_facet_filters()
+        
+        if scope not in SEARCH_SCOPES:
+            return jsonify({'success': False, 'error': '无效的范围'}), 400
+        
+        dataset_id, documents = SEARCH_SCOPES[scope]
+        
+        if query or filters:
+            counts = segment_store.filtered_facet_counts(dataset_id, query, filters)
+        else:
+            counts = segment_store.facet_counts(dataset_id)
+        
+        facets = {}
+        for facet, values in counts.items():
+            items = [{'value': value, 'count': count} for value, count in values.items()]
+            if facet == 'document_id':
+                for item in items:
+                    item['name'] = documents.get(item['value'], '未知文档')
+            items.sort(key=lambda item: item['count'], reverse=True)
+            facets[facet] = items
+        
+        return jsonify({
+            'success': True,
+            'scope': scope,
+            'data': facets,
+            'total': sum(values['count'] for values in facets['document_id']),
+            'filtered': bool(query or filters),
+            'complete': mirror_ready(dataset_id, documents)
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取分面计数失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# 审核统计数据库 - 统一存放在resource/data文件夹
+STATS_DB = DATA_DIR / 'approval_stats.db'
+
+
+# 统计数据库访问层（连接池 + WAL）
+stats_store = StatsStore(STATS_DB)
+
+# 审核计数缓冲：内存合并增量，每5秒及进程退出时一次事务写入
+# 多进程部署时未写入的增量对其他进程不可见，serve.py在进程数大于1时开启直写（REVIEW_STATS_WRITE_THROUGH）
+STATS_WRITE_THROUGH = os.getenv("REVIEW_STATS_WRITE_THROUGH", "false").lower() == "true"
+approval_counter = BufferedApprovalCounter(stats_store, flush_interval=5.0, write_through=STATS_WRITE_THROUGH)
+atexit.register(approval_counter.stop)
+
+
+def init_stats_db():
+    """初始化统计数据库（由create_app()调用）"""
+    stats_store.init_db()
+
+
+# ==================== write-behind写队列 ====================
+
+# Dify写队列数据库，与审核统计数据库放在同一目录
+OUTBOX_DB = STATS_DB.parent / 'dify_outbox.db'
+
+
+def replay_update(payload: dict, attempted: bool = False):
+    """重放分段更新（幂等）"""
+    return DifyAPIClient().update_segment(
+        payload['dataset_id'], payload['document_id'], payload['segment_id'],
+        payload['content'], payload['keywords']
+    )
+
+
+def replay_add(payload: dict, attempted: bool = False):
+    """
+    重放分段添加，成功后将新分段写入本地分段存储
     
-    conn = sqlite3.connect(str(STATS_DB))
-    cursor = conn.cursor()
+    之前执行过的添加（如响应超时但Dify已写入）先在目标文档中按内容查找，找到则不再重复添加
+    """
+    client = DifyAPIClient()
     
-    cursor.execute('''
-        INSERT INTO approval_stats (approval_date, count)
-        VALUES (?, 1)
-        ON CONFLICT(approval_date) 
-        DO UPDATE SET count = count + 1
-    ''', (today,))
+    if attempted:
+        existing = client.get_all_segments(payload['dataset_id'], payload['document_id'])
+        if not existing['success']:
+            return existing
+        
+        created = [seg for seg in existing['data'] if seg.get('content') == payload['content']][:1]
+        if created:
+            logger.info(f"✅ 分段此前已添加，跳过重复添加 [segment_id={created[0].get('id')}]")
+            segment_store.put_many(payload['dataset_id'], payload['document_id'], created)
+            refresh_duplicate_index([seg.get('id') for seg in created])
+            return {'success': True}
     
-    conn.commit()
-    conn.close()
+    result = client.add_segments(
+        payload['dataset_id'], payload['document_id'],
+        [{'content': payload['content'], 'keywords': payload['keywords']}]
+    )
+    if result['success']:
+        created = result['data'].get('data', [])
+        segment_store.put_many(payload['dataset_id'], payload['document_id'], created)
+        refresh_duplicate_index([seg.get('id') for seg in created])
+    return result
 
-@app.route('/api/stats/today', methods=['GET'])
-def get_today_stats():
-    """获取今日审核统计"""
+
+def replay_delete(payload: dict, attempted: bool = False):
+    """重放分段删除（分段已不存在视为成功）"""
+    result = DifyAPIClient().delete_segment(payload['dataset_id'], payload['document_id'], payload['segment_id'])
+    if result.get('status_code') == 404:
+        return {'success': True}
+    return result
+
+
+outbox = DifyOutbox(OUTBOX_DB, {
+    'update': replay_update,
+    'add': replay_add,
+    'delete': replay_delete
+})
+
+
+# ==================== 本地分段镜像同步 ====================
+
+_mirror_sync_lock = threading.Lock()
+mirror_sync_status = {'last_sync': 0, 'last_full_sync': 0, 'running': False, 'last_error': None, 'last_summary': None}
+
+
+def document_signature(document: dict) -> str:
+    """文档签名（Dify文档列表中的字数/token数/更新时间），未变化的文档增量同步时跳过"""
+    return '{}:{}:{}'.format(
+        document.get('word_count', ''),
+        document.get('tokens', ''),
+        document.get('updated_at') or document.get('created_at', '')
+    )
+
+
+def sync_mirror(full: bool = False) -> dict:
+    """
+    将两个知识库同步到本地镜像
+    
+    Dify没有变更订阅接口，增量同步按文档签名跳过未变化的文档，
+    变化的文档拉取全部分段后只写入差异；全量同步不比较签名。
+    
+    Args:
+        full: 是否全量同步
+    
+    Returns:
+        同步汇总 {'documents', 'skipped', 'failed', 'added', 'updated', 'deleted'}
+    """
+    if not _mirror_sync_lock.acquire(blocking=False):
+        return {'success': False, 'error': '同步正在进行中'}
+    
+    summary = {'documents': 0, 'skipped': 0, 'failed': 0, 'added': 0, 'updated': 0, 'deleted': 0}
+    mirror_sync_status['running'] = True
+    
     try:
-        import sqlite3
-        from datetime import date
+        client = DifyAPIClient()
+        tasks = []
+        
+        for dataset_id, documents in (
+            (UNREVIEWED_DATASET_ID, UNREVIEWED_DOCUMENTS),
+            (REVIEWED_DATASET_ID, REVIEWED_DOCUMENTS)
+        ):
+            result = client.get_documents(dataset_id)
+            signatures = (
+                {doc['id']: document_signature(doc) for doc in result['data']}
+                if result['success'] else {}
+            )
+            
+            for document_id in documents:
+                signature = signatures.get(document_id)
+                state = segment_store.get_sync_state(dataset_id, document_id)
+                if not full and signature and state and state['signature'] == signature:
+                    summary['skipped'] += 1
+                    continue
+                tasks.append((dataset_id, document_id, signature))
+        
+        def sync_one(task):
+            dataset_id, document_id, signature = task
+            started_at = time.time()
+            result = client.get_all_segments(dataset_id, document_id)
+            if not result['success']:
+                return None
+            # 有排队中写操作的分段以本地为准（快照拉取完成后再读取，覆盖拉取期间入队的操作）
+            protected_ids = outbox.pending_segment_ids() if WRITE_BEHIND_ENABLED else None
+            return segment_store.sync_document(
+                dataset_id, document_id, result['data'], started_at, signature, protected_ids
+            )
+        
+        for task, document_summary in zip(tasks, run_concurrently(sync_one, tasks, max_workers=4)):
+            if document_summary is None:
+                summary['failed'] += 1
+                logger.warning(f"⚠️ 镜像同步文档失败 [dataset_id={task[0]}, document_id={task[1]}]")
+                continue
+            summary['documents'] += 1
+            for key in ('added', 'updated', 'deleted'):
+                summary[key] += document_summary[key]
+        
+        now = time.time()
+        mirror_sync_status['last_sync'] = now
+        if full:
+            mirror_sync_status['last_full_sync'] = now
+        mirror_sync_status['last_summary'] = summary
+        mirror_sync_status['last_error'] = None
+        
+        logger.info(
+            f"✅ 镜像同步完成 [{'全量' if full else '增量'}, 文档={summary['documents']}, 跳过={summary['skipped']}, "
+            f"失败={summary['failed']}, 新增={summary['added']}, 更新={summary['updated']}, 删除={summary['deleted']}]"
+        )
+        return {'success': True, **summary}
         
-        today = date.today().isoformat()
+    except Exception as e:
+        mirror_sync_status['last_error'] = str(e)
+        logger.error(f"❌ 镜像同步失败: {e}", exc_info=True)
+        return {'success': False, 'error': str(e)}
         
-        # 确保目录存在（跨平台兼容）
-        ensure_stats_db_dir()
+    finally:
+        mirror_sync_status['running'] = False
+        _mirror_sync_lock.release()
+
+
+def mirror_sync_loop():
+    """后台定期同步本地镜像（启动时先全量同步一次，启动预热已全量同步过则从增量开始）"""
+    rounds = 1 if mirror_sync_status['last_full_sync'] else 0
+    while True:
+        sync_mirror(full=(rounds % MIRROR_FULL_SYNC_EVERY == 0))
+        rounds += 1
+        time.sleep(MIRROR_SYNC_INTERVAL)
+
+
+@bp.route('/api/mirror/status', methods=['GET'])
+def get_mirror_status():
+    """获取本地镜像状态"""
+    try:
+        return jsonify({
+            'success': True,
+            'enabled': MIRROR_ENABLED,
+            'ready': {
+                'unreviewed': mirror_ready(UNREVIEWED_DATASET_ID, UNREVIEWED_DOCUMENTS),
+                'reviewed': mirror_ready(REVIEWED_DATASET_ID, REVIEWED_DOCUMENTS)
+            },
+            'segments': {
+                'unreviewed': segment_store.count(UNREVIEWED_DATASET_ID),
+                'reviewed': segment_store.count(REVIEWED_DATASET_ID)
+            },
+            'sync': mirror_sync_status,
+            'documents': segment_store.sync_states()
+        })
         
-        conn = sqlite3.connect(str(STATS_DB))
-        cursor = conn.cursor()
+    except Exception as e:
+        logger.error(f"获取镜像状态失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/mirror/sync', methods=['POST'])
+def trigger_mirror_sync():
+    """立即同步本地镜像"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result = sync_mirror(full=bool(data.get('full', False)))
+        return jsonify(result), (200 if result['success'] else 409 if mirror_sync_status['running'] else 500)
+        
+    except Exception as e:
+        logger.error(f"同步镜像失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ==================== 审核转移事务日志 ====================
+
+# 事务日志数据库，与审核统计数据库放在同一目录
+JOURNAL_DB = STATS_DB.parent / 'approval_journal.db'
+approval_journal = ApprovalJournal(JOURNAL_DB)
+
+# 转移恢复：后台持锁进程每隔RECOVERY_INTERVAL秒处理超过RECOVERY_STALE_SECONDS秒没有进展的未完成转移
+# （不干扰正在进行的请求；运行中删除原分段失败、被终止的工作进程遗留的转移都会被处理）
+RECOVERY_INTERVAL = int(os.getenv("REVIEW_RECOVERY_INTERVAL", "60"))
+RECOVERY_STALE_SECONDS = int(os.getenv("REVIEW_RECOVERY_STALE_SECONDS", "120"))
+_background_lock = threading.Lock()
+_background_started = False
+
+# 多进程部署时只有持有该文件锁的进程运行后台任务（写队列重放、转移恢复、镜像同步）；
+# 其他进程每隔BACKGROUND_LOCK_RETRY秒重试，持锁进程退出后由其他进程接管
+BACKGROUND_LOCK_FILE = DATA_DIR / 'background.lock'
+BACKGROUND_LOCK_RETRY = 30
+_background_lock_handle = None
+_background_next_try = 0.0
+
+
+def acquire_background_lock() -> bool:
+    """尝试获得后台任务文件锁（不支持fcntl的平台为单进程部署，直接视为获得）"""
+    global _background_lock_handle
+    
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    
+    handle = open(BACKGROUND_LOCK_FILE, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    
+    # 文件保持打开，进程退出时锁自动释放
+    _background_lock_handle = handle
+    return True
+
+
+def recover_approval_moves():
+    """完成或放弃没有进展的未完成转移"""
+    try:
+        approval_journal.recover(DifyAPIClient(), stale_seconds=RECOVERY_STALE_SECONDS)
+    except Exception as e:
+        logger.error(f"❌ 审核转移恢复失败: {e}", exc_info=True)
+
+
+def approval_recovery_loop():
+    """后台定期恢复未完成的转移"""
+    while True:
+        recover_approval_moves()
+        time.sleep(RECOVERY_INTERVAL)
+
+
+@bp.before_app_request
+def start_background_workers():
+    """在处理请求的进程中启动后台任务（避免调试模式的重载进程和预加载的主进程重复执行）"""
+    global _background_started, _background_next_try
+    
+    if _background_started or time.time() < _background_next_try:
+        return
+    
+    with _background_lock:
+        if _background_started or time.time() < _background_next_try:
+            return
+        
+        # 审核计数缓冲、运行指标和预热状态在每个进程内，各进程都要定期写入/重试
+        approval_counter.start()
+        REGISTRY.enable_multiprocess(METRICS_DIR)
+        TRACER.enable_multiprocess(TRACES_DIR)
+        start_warmup_retry()
+        
+        if not acquire_background_lock():
+            _background_next_try = time.time() + BACKGROUND_LOCK_RETRY
+            return
+        _background_started = True
+    
+    logger.info(f"✅ 后台任务已在本进程启动 [pid={os.getpid()}]")
+    if WRITE_BEHIND_ENABLED:
+        outbox.start()
+    threading.Thread(target=approval_recovery_loop, name='approval-recovery', daemon=True).start()
+    if MIRROR_ENABLED:
+        threading.Thread(target=mirror_sync_loop, name='mirror-sync', daemon=True).start()
+
+
+@bp.route('/api/outbox/status', methods=['GET'])
+def get_outbox_status():
+    """获取写队列状态及最近失败的操作"""
+    try:
+        return jsonify({
+            'success': True,
+            'enabled': WRITE_BEHIND_ENABLED,
+            'stats': outbox.stats(),
+            'failures': outbox.failures()
+        })
         
-        cursor.execute('SELECT count FROM approval_stats WHERE approval_date = ?', (today,))
-        result = cursor.fetchone()
+    except Exception as e:
+        logger.error(f"获取写队列状态失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/outbox/retry', methods=['POST'])
+def retry_outbox_entry():
+    """将失败的写操作重新排队"""
+    try:
+        data = request.json or {}
+        entry_id = data.get('id')
+        
+        if not entry_id:
+            return jsonify({'success': False, 'error': '缺少id参数'}), 400
         
-        conn.close()
+        # 被前序失败取消的操作会与前序操作一起重新排队
+        requeued = outbox.retry(int(entry_id))
+        if not requeued:
+            return jsonify({'success': False, 'error': '操作不存在或未失败'}), 404
         
-        count = result[0] if result else 0
+        return jsonify({'success': True, 'requeued': requeued})
+        
+    except Exception as e:
+        logger.error(f"重试写操作失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@traced('record_approval')
+def record_approval(events: list):
+    """记录审核通过（每条审核事件计一次，按日期合并计数）"""
+    by_date = {}
+    for event in events:
+        by_date.setdefault(event['approval_date'], []).append(event)
+    
+    for approval_date, day_events in by_date.items():
+        approval_counter.record(approval_date, len(day_events), day_events)
+
+@bp.route('/api/stats/today', methods=['GET'])
+def get_today_stats():
+    """获取今日审核统计"""
+    try:
+        from datetime import date
+        
+        today = date.today().isoformat()
+        count = approval_counter.get_day_count(today)
         
         return jsonify({
             'success': True,
@@ -1008,13 +2190,13 @@ def get_today_stats():
         
     except Exception as e:
         logger.error(f"获取今日统计失败: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        # 统计库连接池繁忙（TimeoutError）可重试，返回503
+        return jsonify({'success': False, 'error': str(e)}), (503 if isinstance(e, TimeoutError) else 500)
 
-@app.route('/api/stats/monthly', methods=['GET'])
+@bp.route('/api/stats/monthly', methods=['GET'])
 def get_monthly_stats():
     """获取月度审核统计"""
     try:
-        import sqlite3
         from datetime import date
         
         year = request.args.get('year', date.today().year, type=int)
@@ -1027,24 +2209,12 @@ def get_monthly_stats():
         else:
             end_date = f"{year}-{month + 1:02d}-01"
         
-        # 确保目录存在（跨平台兼容）
-        ensure_stats_db_dir()
-        
-        conn = sqlite3.connect(str(STATS_DB))
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT approval_date, count 
-            FROM approval_stats 
-            WHERE approval_date >= ? AND approval_date < ?
-            ORDER BY approval_date
-        ''', (start_date, end_date))
-        
-        results = cursor.fetchall()
-        conn.close()
-        
-        # 转换为字典
-        stats = {row[0]: row[1] for row in results}
+        reviewer = request.args.get('reviewer')
+        if reviewer:
+            # 单个审核人的日历：查按日汇总表（合并未写入的审核事件）
+            stats = approval_counter.get_reviewer_range(reviewer, start_date, end_date)
+        else:
+            stats = approval_counter.get_range(start_date, end_date)
         
         return jsonify({
             'success': True,
@@ -1055,13 +2225,152 @@ def get_monthly_stats():
         
     except Exception as e:
         logger.error(f"获取月度统计失败: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return jsonify({'success': False, 'error': str(e)}), (503 if isinstance(e, TimeoutError) else 500)
+
+# 区间统计缓存：结束日期不晚于今天的区间已封闭，结果不再变化（LRU，多线程访问需加锁）
+range_stats_cache = OrderedDict()
+range_stats_cache_lock = threading.Lock()
+RANGE_STATS_CACHE_SIZE = 256
+RANGE_STATS_MAX_DAYS = 3660  # 单次查询最多约10年
+
+@bp.route('/api/stats/range', methods=['GET'])
+def get_range_stats():
+    """
+    区间审核统计（年视图等）
+    
+    参数：start/end=YYYY-MM-DD（[start, end)），bucket=day|week|month，window=移动平均窗口（桶数，默认7）
+    """
+    try:
+        from datetime import date
+        
+        today = date.today()
+        start_date = request.args.get('start', date(today.year, 1, 1).isoformat())
+        end_date = request.args.get('end', (today + timedelta(days=1)).isoformat())
+        bucket = request.args.get('bucket', 'day')
+        window = request.args.get('window', 7, type=int)
+        
+        try:
+            start = date.fromisoformat(start_date)
+            end = date.fromisoformat(end_date)
+        except ValueError:
+            return jsonify({'success': False, 'error': '日期格式应为YYYY-MM-DD'}), 400
+        
+        if bucket not in ('day', 'week', 'month'):
+            return jsonify({'success': False, 'error': 'bucket参数应为day/week/month'}), 400
+        
+        if not 0 < (end - start).days <= RANGE_STATS_MAX_DAYS:
+            return jsonify({'success': False, 'error': f'区间需在1到{RANGE_STATS_MAX_DAYS}天之间'}), 400
+        
+        cache_key = (start_date, end_date, bucket, window)
+        with range_stats_cache_lock:
+            cached = range_stats_cache.get(cache_key)
+            if cached:
+                range_stats_cache.move_to_end(cache_key)
+        cache_result('range_stats', bool(cached))
+        if cached:
+            return jsonify(dict(cached, cached=True))
+        
+        # 先写入缓冲中的审核计数
+        approval_counter.flush()
+        rows = stats_store.get_bucketed(start_date, end_date, bucket, window)
+        
+        total = sum(row['count'] for row in rows)
+        result = {
+            'success': True,
+            'data': rows,
+            'total': total,
+            'average': round(total / len(rows), 2) if rows else 0,
+            'max': max((row['count'] for row in rows), default=0),
+            'start': start_date,
+            'end': end_date,
+            'bucket': bucket,
+            'window': window
+        }
+        
+        # 已封闭的区间（不含今天）才缓存
+        if end <= today:
+            with range_stats_cache_lock:
+                range_stats_cache[cache_key] = result
+                range_stats_cache.move_to_end(cache_key)
+                while len(range_stats_cache) > RANGE_STATS_CACHE_SIZE:
+                    range_stats_cache.popitem(last=False)
+        
+        return jsonify(dict(result, cached=False))
+        
+    except Exception as e:
+        logger.error(f"获取区间统计失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), (503 if isinstance(e, TimeoutError) else 500)
+
+@bp.route('/api/stats/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """
+    审核人排行
+    
+    参数：month=YYYY-MM（查按月汇总表），或 start/end=YYYY-MM-DD（[start, end)，查按日汇总表）
+    """
+    try:
+        from datetime import date
+        
+        limit = request.args.get('limit', 20, type=int)
+        month = request.args.get('month')
+        start_date = request.args.get('start')
+        end_date = request.args.get('end')
+        
+        # 合并缓冲中未写入的审核事件，保证排行实时
+        if start_date and end_date:
+            leaderboard = approval_counter.get_leaderboard(start_date, end_date, limit)
+        else:
+            month = month or date.today().strftime('%Y-%m')
+            leaderboard = approval_counter.get_monthly_leaderboard(month, limit)
+        
+        return jsonify({
+            'success': True,
+            'data': leaderboard,
+            'month': month,
+            'start': start_date,
+            'end': end_date
+        })
+        
+    except Exception as e:
+        logger.error(f"获取审核排行失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), (503 if isinstance(e, TimeoutError) else 500)
+
+@bp.route('/api/stats/categories', methods=['GET'])
+def get_category_stats():
+    """各已审核分类的审核通过条数（参数：start/end=YYYY-MM-DD，reviewer可选）"""
+    try:
+        from datetime import date
+        
+        today = date.today()
+        start_date = request.args.get('start', today.replace(day=1).isoformat())
+        end_date = request.args.get('end', (today + timedelta(days=1)).isoformat())
+        reviewer = request.args.get('reviewer')
+        
+        counts = approval_counter.get_category_counts(start_date, end_date, reviewer)
+        
+        categories = [
+            {'id': doc_id, 'name': REVIEWED_DOCUMENTS.get(doc_id, '未知文档'), 'count': count}
+            for doc_id, count in counts.items()
+        ]
+        categories.sort(key=lambda x: x['count'], reverse=True)
+        
+        return jsonify({
+            'success': True,
+            'data': categories,
+            'total': sum(c['count'] for c in categories),
+            'start': start_date,
+            'end': end_date
+        })
+        
+    except Exception as e:
+        logger.error(f"获取分类统计失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), (503 if isinstance(e, TimeoutError) else 500)
 
 # 缓存已审核总数
 reviewed_total_cache = {'total': 0, 'timestamp': 0}
 CACHE_DURATION = 300  # 5分钟缓存
 
-@app.route('/api/stats/total-reviewed', methods=['GET'])
+@bp.route('/api/stats/total-reviewed', methods=['GET'])
 def get_total_reviewed():
     """获取已审核区域总条数（带缓存）"""
     try:
@@ -1069,7 +2378,9 @@ def get_total_reviewed():
         current_time = time.time()
         
         # 检查缓存是否有效
-        if current_time - reviewed_total_cache['timestamp'] < CACHE_DURATION:
+        cache_valid = current_time - reviewed_total_cache['timestamp'] < CACHE_DURATION
+        cache_result('reviewed_total', cache_valid)
+        if cache_valid:
             logger.info(f"✅ 使用缓存的已审核总数: {reviewed_total_cache['total']}")
             return jsonify({
                 'success': True,
@@ -1077,6 +2388,14 @@ def get_total_reviewed():
                 'cached': True
             })
         
+        # 本地镜像可用时直接计数
+        if mirror_ready(REVIEWED_DATASET_ID, REVIEWED_DOCUMENTS):
+            return jsonify({
+                'success': True,
+                'total': segment_store.count(REVIEWED_DATASET_ID),
+                'cached': False
+            })
+        
         # 缓存过期，重新计算
         client = DifyAPIClient()
         total = 0
@@ -1104,49 +2423,156 @@ def get_total_reviewed():
         logger.error(f"获取已审核总数失败: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/reviewed/check-duplicates', methods=['POST'])
+# 查重范围
+DUPLICATE_SCOPES = ('reviewed', 'unreviewed', 'cross')
+
+# 查重向量精度（float32 / float16 / int8）
+DEDUP_PRECISION = os.getenv("REVIEW_DEDUP_PRECISION", "float32")
+
+# 共用的嵌入服务客户端（ASGI模式下替换为绑定事件循环的异步客户端，默认每个查重器各自新建）
+shared_embedding_client = None
+
+
+def new_duplicate_checker() -> DuplicateChecker:
+    """创建查重器（使用共用的嵌入服务客户端）"""
+    return DuplicateChecker(precision=DEDUP_PRECISION, embedding_client=shared_embedding_client)
+
+# 增量查重索引：首次查重时建立，审核操作后只重算变化的分段
+DEDUP_INDEX_DB = DATA_DIR / 'duplicate_index.db'
+DEDUP_INDEX_FLOOR = float(os.getenv("REVIEW_DEDUP_INDEX_FLOOR", "0.8"))  # 保存相似对的下限阈值
+DEDUP_MIN_THRESHOLD = float(os.getenv("REVIEW_DEDUP_MIN_THRESHOLD", "0.5"))  # 查重阈值的最小值（索引下限不会低于该值）
+DEDUP_MAX_TOP_K = 50  # cross查重每个未审核分段最多返回的匹配数
+duplicate_index = DuplicateIndex(
+    DEDUP_INDEX_DB,
+    new_duplicate_checker,
+    min_threshold=DEDUP_INDEX_FLOOR
+)
+_duplicate_index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='duplicate-index')
+
+# 知识库 -> 查重范围
+DUPLICATE_INDEX_SCOPES = {
+    'reviewed': (REVIEWED_DATASET_ID, load_reviewed_segments),
+    'unreviewed': (UNREVIEWED_DATASET_ID, load_unreviewed_segments)
+}
+
+
+def refresh_duplicate_index(segment_ids: list):
+    """
+    审核操作后在后台重算分段的相似对
+    
+    分段仍在本地分段存储中则按当前内容重算，否则从索引中删除；
+    索引尚未建立的知识库忽略。
+    """
+    segment_ids = [segment_id for segment_id in segment_ids if segment_id]
+    if not segment_ids:
+        return
+    
+    def run():
+        try:
+            removed = []
+            changed = {}
+            for segment_id in segment_ids:
+                segment = segment_store.get(segment_id)
+                if segment:
+                    changed.setdefault(segment['dataset_id'], []).append(segment)
+                else:
+                    removed.append(segment_id)
+            
+            duplicate_index.remove(removed)
+            for dataset_id, segments in changed.items():
+                duplicate_index.upsert_many(dataset_id, segments)
+        except Exception as e:
+            logger.error(f"❌ 更新查重索引失败 [segment_ids={segment_ids}]: {e}", exc_info=True)
+    
+    _duplicate_index_executor.submit(run)
+
+
+@bp.route('/api/reviewed/check-duplicates', methods=['POST'])
+@bp.route('/api/duplicates/check', methods=['POST'])
 def check_duplicates():
-    """查重功能 - 使用BGE模型 + 余弦相似度"""
+    """
+    查重功能 - 使用BGE模型 + 余弦相似度
+    
+    scope: reviewed（已审核区域内，默认）/ unreviewed（未审核区域内）/
+    cross（未审核 vs 已审核，按未审核分段分组）
+    """
     try:
         data = request.json
-        similarity_threshold = data.get('similarity_threshold', 0.8)  # 默认0.8 (80%)
+        scope = data.get('scope', 'reviewed')
         
-        logger.info(f"🔍 开始查重 [阈值={similarity_threshold}]")
+        if scope not in DUPLICATE_SCOPES:
+            return jsonify({'success': False, 'error': '无效的查重范围'}), 400
         
-        # 1. 加载所有已审核文档的分段
-        client = DifyAPIClient()
-        all_segments = []
+        try:
+            similarity_threshold = float(data.get('similarity_threshold', 0.8))  # 默认0.8 (80%)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'similarity_threshold 必须是数字'}), 400
+        if not DEDUP_MIN_THRESHOLD <= similarity_threshold <= 1.0:
+            return jsonify({
+                'success': False,
+                'error': f'similarity_threshold 需在 {DEDUP_MIN_THRESHOLD} ~ 1.0 之间'
+            }), 400
         
-        for doc_id, doc_name in REVIEWED_DOCUMENTS.items():
-            result = client.get_all_segments(REVIEWED_DATASET_ID, doc_id)
+        try:
+            top_k = min(max(int(data.get('top_k', 5)), 1), DEDUP_MAX_TOP_K)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'top_k 必须是整数'}), 400
+        
+        logger.info(f"🔍 开始查重 [范围={scope}, 阈值={similarity_threshold}]")
+        
+        checker = new_duplicate_checker()
+        
+        if scope == 'cross':
+            # 未审核分段逐个查询已审核分段
+            unreviewed_segments = load_unreviewed_segments()
+            reviewed_segments = load_reviewed_segments()
+            logger.info(f"✅ 加载完成 [未审核={len(unreviewed_segments)}, 已审核={len(reviewed_segments)}]")
             
-            if result['success']:
-                segments = result['data']
-                
-                # 为每个分段添加元数据
-                for seg in segments:
-                    content = seg.get('content', '')
-                    parsed = parse_qa_content(content)
-                    
-                    seg['document_id'] = doc_id
-                    seg['document_name'] = doc_name
-                    seg['question'] = parsed['question']
-                    seg['answer'] = parsed['answer']
-                    seg['classification'] = parsed.get('classification', '-')
-                    
-                    all_segments.append(seg)
-        
-        logger.info(f"✅ 加载完成 [总数={len(all_segments)}]")
-        
-        # 2. 调用查重器
-        checker = DuplicateChecker()
-        duplicate_groups = checker.find_duplicates(
-            all_segments, 
-            similarity_threshold=similarity_threshold
-        )
+            results = checker.find_cross_duplicates(
+                unreviewed_segments,
+                reviewed_segments,
+                similarity_threshold=similarity_threshold,
+                top_k=top_k
+            )
+            result = checker.format_cross_duplicates(results)
+        else:
+            # 1. 加载范围内的所有分段
+            dataset_id, load_segments = DUPLICATE_INDEX_SCOPES[scope]
+            failed_documents = []
+            all_segments = load_segments(failed_documents)
+            
+            logger.info(f"✅ 加载完成 [总数={len(all_segments)}, 获取失败的文档={len(failed_documents)}]")
+            
+            # 2. 查重索引：未建立或下限高于本次阈值时重建，否则只对账变化的分段
+            index_covers = duplicate_index.covers(dataset_id, similarity_threshold)
+            cache_result('duplicate_index', index_covers)
+            if index_covers:
+                # 部分文档获取失败时不删除索引中缺失的分段（否则这些文档的分段会被误删）
+                changes = duplicate_index.reconcile(
+                    dataset_id, all_segments, checker, remove_missing=not failed_documents
+                )
+                logger.info(f"✅ 查重索引对账完成 [重算={changes['upserted']}, 删除={changes['removed']}]")
+            else:
+                duplicate_index.rebuild(
+                    dataset_id, all_segments,
+                    min_threshold=max(min(similarity_threshold, DEDUP_INDEX_FLOOR), DEDUP_MIN_THRESHOLD),
+                    checker=checker
+                )
+            
+            # 3. 按阈值读取相似对并分组
+            duplicate_groups = duplicate_index.groups(dataset_id, all_segments, similarity_threshold)
+            
+            # 4. 格式化结果
+            result = checker.format_duplicate_groups(duplicate_groups)
+            result['index'] = duplicate_index.state(dataset_id)
+            
+            # 5. 阈值扫描直方图（各阈值下的相似对数/重复组数，供前端滑块预览）
+            result['histogram'] = duplicate_index.sweep(
+                dataset_id, segment_ids=[seg['id'] for seg in all_segments]
+            )
         
-        # 3. 格式化结果
-        result = checker.format_duplicate_groups(duplicate_groups)
+        result['scope'] = scope
+        result['embedding_metrics'] = checker.embedding_metrics
         
         logger.info(f"✅ 查重完成 [重复组={result['total_groups']}, 重复条目={result['total_duplicates']}]")
         
@@ -1161,6 +2587,256 @@ def check_duplicates():
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@bp.route('/api/duplicates/sweep', methods=['GET'])
+def duplicate_sweep():
+    """
+    阈值扫描 - 基于已建立的查重索引，返回各阈值档位的相似对数/重复组数
+    
+    参数: scope（reviewed/unreviewed，默认reviewed）、step（档位间隔，默认0.01）
+    """
+    try:
+        scope = request.args.get('scope', 'reviewed')
+        if scope not in DUPLICATE_INDEX_SCOPES:
+            return jsonify({'success': False, 'error': '无效的查重范围'}), 400
+        
+        step = request.args.get('step', 0.01, type=float)
+        if not 0.001 <= step <= 0.5:
+            return jsonify({'success': False, 'error': 'step 需在 0.001 ~ 0.5 之间'}), 400
+        
+        dataset_id, _ = DUPLICATE_INDEX_SCOPES[scope]
+        state = duplicate_index.state(dataset_id)
+        if not state:
+            return jsonify({'success': False, 'error': '查重索引尚未建立，请先执行一次查重'}), 409
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'scope': scope,
+                'index': state,
+                'histogram': duplicate_index.sweep(dataset_id, step=step)
+            }
+        })
+        
+    except Exception as e:
+        logger.error(f"❌ 阈值扫描失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== 运行指标与请求追踪 ====================
+
+# 不记录追踪的路径（静态文件、指标与追踪接口本身）
+TRACE_EXCLUDED_PREFIXES = ('/static/', '/metrics', '/debug/')
+
+
+@bp.before_app_request
+def start_request_timer():
+    """记录请求开始时间，开始请求追踪"""
+    g.request_started = time.perf_counter()
+    if not request.path.startswith(TRACE_EXCLUDED_PREFIXES):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        TRACER.start_trace(f"{request.method} {route}", path=request.path, pid=os.getpid())
+
+
+@bp.after_app_request
+def record_request_metrics(response):
+    """记录接口耗时（按路由模板统计，未匹配的路径归为unmatched）"""
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+    
+    trace = TRACER.current_trace()
+    if trace is not None:
+        trace.root.set_attribute('status', response.status_code)
+    return response
+
+
+@bp.teardown_app_request
+def finish_request_trace(error=None):
+    """请求结束（含未处理异常）时保存追踪"""
+    TRACER.end_trace(error=f"{type(error).__name__}: {error}" if error else None)
+
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """运行指标（Prometheus文本格式）"""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@bp.route('/debug/traces', methods=['GET'])
+def get_debug_traces():
+    """
+    最近请求中耗时最长的追踪（合并所有工作进程，其他进程的追踪最多滞后5秒），按阶段汇总耗时
+    
+    参数:
+        limit: 返回条数，默认20
+        route: 只看指定请求（如 "POST /api/segment/approve"）
+        format: json（默认）/ otlp（OTLP/JSON文件下载，可导入Jaeger等）
+    """
+    try:
+        limit = max(1, request.args.get('limit', 20, type=int))
+        route = request.args.get('route') or None
+        export_format = request.args.get('format', 'json')
+        if export_format not in ('json', 'otlp'):
+            return flask_jsonify({'success': False, 'error': '无效的导出格式'}), 400
+        
+        merged = TRACER.merged_slowest(limit, name=route)
+        traces = merged['traces']
+        
+        if export_format == 'otlp':
+            payload = json.dumps(TRACER.export_otlp('review-qa', traces), ensure_ascii=False)
+            return Response(payload, content_type='application/json', headers={
+                'Content-Disposition': f'attachment; filename=traces-{os.getpid()}-{int(time.time())}.json'
+            })
+        
+        return flask_jsonify({
+            'success': True,
+            'enabled': TRACER.enabled,
+            'pid': os.getpid(),
+            'processes': merged['processes'],
+            'capacity': TRACER.capacity,
+            'recorded': len(TRACER.traces()),
+            'data': TRACER.export_json(traces)
+        })
+        
+    except Exception as e:
+        logger.error(f"❌ 获取请求追踪失败: {e}")
+        return flask_jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ==================== 应用工厂与启动预热 ====================
+
+WARMUP_ENABLED = os.getenv("REVIEW_WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_RETRY_INTERVAL = int(os.getenv("REVIEW_WARMUP_RETRY_INTERVAL", "30"))  # 预热失败后的重试间隔（秒）
+
+# 启动预热状态（/api/ready）
+readiness = {
+    'ready': False, 'warming': False, 'warmed_at': None, 'seconds': None, 'segments': {}, 'error': None, 'attempts': 0
+}
+_warmup_retry_thread = None
+
+
+def warm_caches() -> dict:
+    """
+    启动预热：在接收请求之前加载并解析两个知识库
+    
+    1. 启用本地镜像时先全量同步一次，之后的列表请求直接读镜像
+    2. 加载并解析未审核、已审核全部分段（写入本地分段存储，填充已审核总数缓存）
+    3. 预加载查重索引的向量表和相似对
+    
+    预加载模式（preload）下在主进程执行，fork出的工作进程共享预热结果。
+    任一步骤失败（含部分已审核文档获取失败）时不就绪，由后台重试（见start_warmup_retry）。
+    """
+    start = time.time()
+    readiness['warming'] = True
+    readiness['attempts'] += 1
+    
+    try:
+        if MIRROR_ENABLED:
+            sync_mirror(full=True)
+        
+        failed_documents = []
+        unreviewed = load_unreviewed_segments()
+        reviewed = load_reviewed_segments(failed_documents)
+        if failed_documents:
+            raise RuntimeError(f'{len(failed_documents)}个已审核文档获取失败: {", ".join(failed_documents)}')
+        
+        reviewed_total_cache['total'] = len(reviewed)
+        reviewed_total_cache['timestamp'] = time.time()
+        
+        for dataset_id in (REVIEWED_DATASET_ID, UNREVIEWED_DATASET_ID):
+            duplicate_index.warm(dataset_id)
+        
+        readiness.update({
+            'ready': True,
+            'warmed_at': time.time(),
+            'seconds': round(time.time() - start, 2),
+            'segments': {'unreviewed': len(unreviewed), 'reviewed': len(reviewed)},
+            'error': None
+        })
+        logger.info(
+            f"✅ 启动预热完成 [未审核={len(unreviewed)}, 已审核={len(reviewed)}, 耗时={readiness['seconds']}秒]"
+        )
+        
+    except Exception as e:
+        readiness['error'] = str(e)
+        logger.error(f"❌ 启动预热失败: {e}", exc_info=True)
+        
+    finally:
+        readiness['warming'] = False
+    
+    return readiness
+
+
+def warmup_retry_loop():
+    """预热失败后每隔WARMUP_RETRY_INTERVAL秒重试，直到成功"""
+    while not readiness['ready']:
+        time.sleep(WARMUP_RETRY_INTERVAL)
+        if not readiness['ready'] and not readiness['warming']:
+            logger.info(f"🔄 重试启动预热 [第{readiness['attempts'] + 1}次]")
+            warm_caches()
+
+
+def start_warmup_retry():
+    """未就绪时在本进程启动预热重试线程（幂等；预热状态在每个进程内，各进程分别重试）"""
+    global _warmup_retry_thread
+    
+    if readiness['ready'] or (_warmup_retry_thread and _warmup_retry_thread.is_alive()):
+        return
+    _warmup_retry_thread = threading.Thread(target=warmup_retry_loop, name='warmup-retry', daemon=True)
+    _warmup_retry_thread.start()
+
+
+@bp.route('/api/ready', methods=['GET'])
+def get_readiness():
+    """就绪检查：预热完成（或本地镜像已可用）返回200，否则返回503"""
+    ready = readiness['ready'] or (
+        MIRROR_ENABLED
+        and mirror_ready(UNREVIEWED_DATASET_ID, UNREVIEWED_DOCUMENTS)
+        and mirror_ready(REVIEWED_DATASET_ID, REVIEWED_DOCUMENTS)
+    )
+    return jsonify({'success': True, **readiness, 'ready': ready, 'pid': os.getpid()}), (200 if ready else 503)
+
+
+def create_app(warmup: bool = None) -> Flask:
+    """
+    应用工厂
+    
+    Args:
+        warmup: 是否在返回前执行启动预热，默认读取REVIEW_WARMUP_ENABLED
+    """
+    app = Flask(__name__,
+                template_folder='.',
+                static_folder='static')
+    
+    # 配置CORS支持跨域访问
+    CORS(app, resources=CORS_RESOURCES)
+    app.register_blueprint(bp)
+    
+    init_stats_db()
+    
+    if WARMUP_ENABLED if warmup is None else warmup:
+        warm_caches()
+    else:
+        readiness['ready'] = True
+    
+    return app
+
+
+def before_fork():
+    """预加载模式下fork工作进程之前关闭主进程持有的SQLite连接（连接不能跨进程共用），写入主进程的指标快照"""
+    segment_store.close()
+    stats_store.close()
+    REGISTRY.enable_multiprocess(METRICS_DIR)
+    REGISTRY.write_snapshot()
+
+
+def after_fork():
+    """工作进程中重新打开SQLite连接，清空从主进程继承的指标和追踪（主进程的指标由其快照提供）"""
+    segment_store.reopen()
+    REGISTRY.reset()
+    TRACER.clear()
+
+
 if __name__ == '__main__':
     logger.info("="*60)
     logger.info("🚀 QA审核与修正系统启动")
@@ -1170,7 +2846,12 @@ if __name__ == '__main__':
     logger.info(f"📄 未审核文档数: {len(UNREVIEWED_DOCUMENTS)}")
     logger.info(f"📄 已审核文档数: {len(REVIEWED_DOCUMENTS)}")
     logger.info("✨ 使用单个分段查询API，数据实时同步")
+    logger.info(f"📮 write-behind写队列: {'启用' if WRITE_BEHIND_ENABLED else '关闭'}")
     logger.info("="*60)
     
+    # 开发服务器（单进程）；生产部署使用 serve.py
+    debug = os.getenv("REVIEW_DEBUG", "false").lower() == "true"
+    # 调试模式的重载监视进程不处理请求，无需预热
+    app = create_app(warmup=False if debug and not os.environ.get('WERKZEUG_RUN_MAIN') else None)
     logger.info("🌐 服务器启动中... [http://0.0.0.0:5003]")
-    app.run(host='0.0.0.0', port=5003, debug=True)
+    app.run(host='0.0.0.0', port=5003, debug=debug, threaded=True)
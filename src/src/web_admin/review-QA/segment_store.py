@@ -0,0 +1,611 @@
+"""
+本地分段存储 - Dify知识库的本地镜像
+====================================
+
+功能:
+1. 以SQLite保存两个知识库全部分段(原始内容 + 解析后的问答/元数据字段),按segment_id索引;
+   其余Dify字段(position、word_count、hit_count等)原样保存,读取时合并回分段,与Dify返回的结构一致
+2. 列表、计数、单分段查询、查重直接读本地镜像,读延迟为本地磁盘延迟,Dify不可用时仍可浏览
+3. 按文档做快照同步:全量拉取后与本地比对,只写入新增/变化(updated_at或内容不同)的分段,
+   删除快照中已不存在的分段;增量同步时文档签名未变化的文档直接跳过
+4. 审核操作(更新/删除/转移)成功后立即写入本地副本;本地删除记录墓碑,
+   避免删除前开始的同步把分段重新写回
+5. 问题/答案/来源/分类建立FTS5全文索引(trigram分词,支持中文和型号子串),
+   由触发器随分段写入同步更新;SQLite不支持trigram分词(低于3.34或未编译FTS5)时
+   不建索引,搜索全部以LIKE子串匹配
+6. 按文档/添加方式/添加类型/分类维护分面计数器,每次写入由触发器O(1)增减
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_fields(dataset_id: str, document_id: str, content: str) -> Dict:
+    return {}
+
+
+# 解析后的字段（由解析函数提供，缺省为空字符串）
+PARSED_FIELDS = ('question', 'answer', 'source', 'add_type', 'classification', 'add_method')
+
+# 有独立列或由接口补充的字段,其余分段字段原样存入extra列
+COLUMN_FIELDS = frozenset((
+    'id', 'dataset_id', 'document_id', 'document_name', 'content', 'keywords',
+    'created_at', 'updated_at', 'synced_at', 'extra', 'similarity_score', 'score', *PARSED_FIELDS
+))
+
+# 全文索引字段及bm25权重
+SEARCH_FIELDS = ('question', 'answer', 'source', 'classification')
+SEARCH_WEIGHTS = (4.0, 2.0, 1.0, 1.0)
+
+# 分面计数字段(每个字段每个取值一个计数器,由触发器随分段写入增减)
+FACET_FIELDS = ('document_id', 'add_method', 'add_type', 'classification')
+
+# trigram分词最短可索引长度,更短的关键词回退为LIKE匹配
+TRIGRAM_MIN_LENGTH = 3
+
+
+class SegmentStore:
+    """线程安全的本地分段存储（SQLite镜像）"""
+
+    def __init__(
+        self,
+        db_path: Path = None,
+        parser: Callable[[str, str, str], Dict] = None,
+        tombstone_ttl: float = 3600.0
+    ):
+        """
+        Args:
+            db_path: 镜像数据库路径,为空时使用内存数据库
+            parser: 解析函数(dataset_id, document_id, content) -> {question, answer, source, ...}
+            tombstone_ttl: 本地删除墓碑的有效期(秒)
+        """
+        self.db_path = Path(db_path) if db_path else None
+        self.parser = parser or _empty_fields
+        self.tombstone_ttl = tombstone_ttl
+
+        self._lock = threading.RLock()
+        # SQLite支持FTS5 trigram分词时为True(init_db中检测)
+        self.fts_enabled = False
+
+        if self.db_path:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = self._open()
+        self.init_db()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            str(self.db_path) if self.db_path else ':memory:',
+            check_same_thread=False,
+            timeout=10
+        )
+        conn.row_factory = sqlite3.Row
+        if self.db_path:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        # INSERT OR REPLACE替换旧行时也触发删除触发器,保持全文索引一致
+        conn.execute('PRAGMA recursive_triggers=ON')
+        return conn
+
+    def close(self):
+        """关闭数据库连接(多进程部署时在fork前调用,子进程中用reopen()重新连接)"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def reopen(self):
+        """重新打开数据库连接(内存数据库不支持)"""
+        if not self.db_path:
+            return
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = self._open()
+
+    def init_db(self):
+        """初始化镜像表"""
+        with self._lock, self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS segments (
+                    id TEXT PRIMARY KEY,
+                    dataset_id TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    content TEXT NOT NULL DEFAULT '',
+                    keywords TEXT NOT NULL DEFAULT '[]',
+                    question TEXT NOT NULL DEFAULT '',
+                    answer TEXT NOT NULL DEFAULT '',
+                    source TEXT NOT NULL DEFAULT '',
+                    add_type TEXT NOT NULL DEFAULT '',
+                    classification TEXT NOT NULL DEFAULT '',
+                    add_method TEXT NOT NULL DEFAULT '',
+                    created_at INTEGER NOT NULL DEFAULT 0,
+                    updated_at INTEGER NOT NULL DEFAULT 0,
+                    synced_at REAL NOT NULL DEFAULT 0,
+                    extra TEXT NOT NULL DEFAULT '{}'
+                )
+            ''')
+            # 旧版本镜像补充extra列(下次全量同步时按Dify快照补齐)
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(segments)')}
+            if 'extra' not in columns:
+                self._conn.execute("ALTER TABLE segments ADD COLUMN extra TEXT NOT NULL DEFAULT '{}'")
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_segments_document '
+                'ON segments(dataset_id, document_id, updated_at DESC)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_segments_dataset ON segments(dataset_id, updated_at DESC)'
+            )
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS segment_tombstones (
+                    id TEXT PRIMARY KEY,
+                    removed_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    dataset_id TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    signature TEXT,
+                    segment_count INTEGER NOT NULL DEFAULT 0,
+                    max_updated_at INTEGER NOT NULL DEFAULT 0,
+                    last_sync REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (dataset_id, document_id)
+                )
+            ''')
+            self._init_search_index()
+            self._init_facet_counters()
+
+    @staticmethod
+    def _trigram_supported(conn: sqlite3.Connection) -> bool:
+        """SQLite是否支持FTS5 trigram分词(3.34起)"""
+        try:
+            conn.execute("CREATE VIRTUAL TABLE temp.trigram_probe USING fts5(value, tokenize='trigram')")
+            conn.execute('DROP TABLE temp.trigram_probe')
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def _init_search_index(self):
+        """
+        创建全文索引(外部内容表)及维护触发器,已有镜像首次创建时重建索引
+
+        不支持trigram分词时删除维护触发器(否则分段写入会失败),搜索回退为LIKE匹配。
+        """
+        self.fts_enabled = self._trigram_supported(self._conn)
+        if not self.fts_enabled:
+            logger.warning(
+                f"⚠️ SQLite {sqlite3.sqlite_version} 不支持FTS5 trigram分词(需3.34+)，全文搜索回退为LIKE匹配"
+            )
+            for trigger in ('segments_fts_insert', 'segments_fts_delete', 'segments_fts_update'):
+                self._conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            return
+
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'segments_fts'"
+        ).fetchone()
+
+        fields = ', '.join(SEARCH_FIELDS)
+        new_fields = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+        old_fields = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+
+        # 触发器被回退模式删除过时(期间的写入未进索引),重建索引
+        stale = exists and not self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'segments_fts_insert'"
+        ).fetchone()
+
+        self._conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+                {fields}, content='segments', content_rowid='rowid', tokenize='trigram'
+            )
+        ''')
+        self._conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS segments_fts_insert AFTER INSERT ON segments BEGIN
+                INSERT INTO segments_fts (rowid, {fields}) VALUES (new.rowid, {new_fields});
+            END
+        ''')
+        self._conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS segments_fts_delete AFTER DELETE ON segments BEGIN
+                INSERT INTO segments_fts (segments_fts, rowid, {fields}) VALUES ('delete', old.rowid, {old_fields});
+            END
+        ''')
+        self._conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS segments_fts_update AFTER UPDATE ON segments BEGIN
+                INSERT INTO segments_fts (segments_fts, rowid, {fields}) VALUES ('delete', old.rowid, {old_fields});
+                INSERT INTO segments_fts (rowid, {fields}) VALUES (new.rowid, {new_fields});
+            END
+        ''')
+
+        if not exists or stale:
+            self._conn.execute("INSERT INTO segments_fts (segments_fts) VALUES ('rebuild')")
+
+    def _init_facet_counters(self):
+        """创建分面计数器表及维护触发器,已有镜像首次创建时按现有分段回填"""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'segment_facets'"
+        ).fetchone()
+
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS segment_facets (
+                dataset_id TEXT NOT NULL,
+                facet TEXT NOT NULL,
+                value TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dataset_id, facet, value)
+            )
+        ''')
+
+        increments = '\n'.join(
+            f"INSERT INTO segment_facets (dataset_id, facet, value, count) "
+            f"VALUES (new.dataset_id, '{facet}', new.{facet}, 1) "
+            f"ON CONFLICT (dataset_id, facet, value) DO UPDATE SET count = count + 1;"
+            for facet in FACET_FIELDS
+        )
+        decrements = '\n'.join(
+            f"UPDATE segment_facets SET count = count - 1 "
+            f"WHERE dataset_id = old.dataset_id AND facet = '{facet}' AND value = old.{facet};"
+            for facet in FACET_FIELDS
+        )
+        self._conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS segment_facets_insert AFTER INSERT ON segments BEGIN
+                {increments}
+            END
+        ''')
+        self._conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS segment_facets_delete AFTER DELETE ON segments BEGIN
+                {decrements}
+            END
+        ''')
+        self._conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS segment_facets_update AFTER UPDATE ON segments BEGIN
+                {decrements}
+                {increments}
+            END
+        ''')
+
+        if not exists:
+            for facet in FACET_FIELDS:
+                self._conn.execute(f'''
+                    INSERT INTO segment_facets (dataset_id, facet, value, count)
+                    SELECT dataset_id, '{facet}', {facet}, COUNT(*) FROM segments GROUP BY dataset_id, {facet}
+                ''')
+
+    # ==================== 读取 ====================
+
+    @staticmethod
+    def _row_to_segment(row: sqlite3.Row) -> Dict:
+        columns = dict(row)
+        columns['keywords'] = json.loads(columns['keywords'] or '[]')
+        columns.pop('synced_at', None)
+        extra = json.loads(columns.pop('extra', None) or '{}')
+        return {**extra, **columns}
+
+    def get(self, segment_id: str) -> Optional[Dict]:
+        """获取分段副本,不存在返回None"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM segments WHERE id = ?', (segment_id,)).fetchone()
+        return self._row_to_segment(row) if row else None
+
+    def list_segments(self, dataset_id: str, document_id: str = None) -> List[Dict]:
+        """列出知识库(或其中一个文档)的分段,按updated_at降序"""
+        with self._lock:
+            if document_id:
+                rows = self._conn.execute('''
+                    SELECT * FROM segments WHERE dataset_id = ? AND document_id = ?
+                    ORDER BY updated_at DESC, created_at DESC
+                ''', (dataset_id, document_id)).fetchall()
+            else:
+                rows = self._conn.execute('''
+                    SELECT * FROM segments WHERE dataset_id = ?
+                    ORDER BY updated_at DESC, created_at DESC
+                ''', (dataset_id,)).fetchall()
+        return [self._row_to_segment(row) for row in rows]
+
+    def count(self, dataset_id: str, document_id: str = None) -> int:
+        """统计分段数量"""
+        with self._lock:
+            if document_id:
+                row = self._conn.execute(
+                    'SELECT COUNT(*) FROM segments WHERE dataset_id = ? AND document_id = ?',
+                    (dataset_id, document_id)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    'SELECT COUNT(*) FROM segments WHERE dataset_id = ?', (dataset_id,)
+                ).fetchone()
+        return row[0]
+
+    def _filter_clause(self, query: str = '', dataset_id: str = None, filters: Dict = None) -> tuple:
+        """
+        构造搜索/过滤条件
+
+        所有关键词都需命中(AND)。长度不少于3的关键词走FTS5索引,
+        更短的关键词(或不支持trigram分词时的全部关键词)以LIKE过滤;filters为分面字段的等值过滤。
+
+        Returns:
+            (FROM子句, WHERE子句, 参数, 是否使用了FTS5索引)
+        """
+        terms = list(dict.fromkeys((query or '').split()))
+        min_length = TRIGRAM_MIN_LENGTH if self.fts_enabled else float('inf')
+        indexed = [term for term in terms if len(term) >= min_length]
+        short = [term for term in terms if len(term) < min_length]
+
+        conditions = ['1 = 1']
+        params = []
+        if indexed:
+            conditions.append('segments_fts MATCH ?')
+            params.append(' AND '.join('"{}"'.format(term.replace('"', '""')) for term in indexed))
+        for term in short:
+            pattern = '%{}%'.format(term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+            conditions.append(
+                '(' + ' OR '.join(f"s.{field} LIKE ? ESCAPE '\\'" for field in SEARCH_FIELDS) + ')'
+            )
+            params.extend([pattern] * len(SEARCH_FIELDS))
+        if dataset_id:
+            conditions.append('s.dataset_id = ?')
+            params.append(dataset_id)
+        for field, value in (filters or {}).items():
+            if field not in FACET_FIELDS:
+                raise ValueError(f"不支持的过滤字段: {field}")
+            conditions.append(f's.{field} = ?')
+            params.append(value)
+
+        source = 'segments_fts JOIN segments s ON s.rowid = segments_fts.rowid' if indexed else 'segments s'
+        return source, ' AND '.join(conditions), params, bool(indexed)
+
+    def search(self, query: str, dataset_id: str = None, filters: Dict = None,
+               limit: int = 20, offset: int = 0) -> Dict:
+        """
+        全文搜索(问题/答案/来源/分类)
+
+        使用FTS5索引时按bm25排序(问题权重最高),只有短关键词或未建索引时按updated_at降序。
+
+        Returns:
+            {'total': 命中总数, 'items': 当前页分段(含score)}
+        """
+        if not (query or '').split():
+            return {'total': 0, 'items': []}
+
+        source, where, params, indexed = self._filter_clause(query, dataset_id, filters)
+        if indexed:
+            score = 'bm25(segments_fts, {})'.format(', '.join(str(weight) for weight in SEARCH_WEIGHTS))
+            order = 'score, s.updated_at DESC'
+        else:
+            score = '0.0'
+            order = 's.updated_at DESC, s.created_at DESC'
+
+        with self._lock:
+            total = self._conn.execute(f'SELECT COUNT(*) FROM {source} WHERE {where}', params).fetchone()[0]
+            rows = self._conn.execute(f'''
+                SELECT s.*, {score} AS score FROM {source}
+                WHERE {where}
+                ORDER BY {order}
+                LIMIT ? OFFSET ?
+            ''', (*params, limit, offset)).fetchall()
+
+        return {'total': total, 'items': [self._row_to_segment(row) for row in rows]}
+
+    # ==================== 分面统计 ====================
+
+    def facet_counts(self, dataset_id: str) -> Dict[str, Dict[str, int]]:
+        """知识库各分面字段的取值计数(读取预计算计数器)"""
+        counts = {facet: {} for facet in FACET_FIELDS}
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT facet, value, count FROM segment_facets WHERE dataset_id = ? AND count > 0',
+                (dataset_id,)
+            ).fetchall()
+        for facet, value, count in rows:
+            counts[facet][value] = count
+        return counts
+
+    def filtered_facet_counts(self, dataset_id: str, query: str = '', filters: Dict = None) -> Dict[str, Dict[str, int]]:
+        """搜索/过滤结果内各分面字段的取值计数(按条件实时聚合)"""
+        source, where, params, _ = self._filter_clause(query, dataset_id, filters)
+        counts = {}
+        with self._lock:
+            for facet in FACET_FIELDS:
+                rows = self._conn.execute(
+                    f'SELECT s.{facet}, COUNT(*) FROM {source} WHERE {where} GROUP BY s.{facet}', params
+                ).fetchall()
+                counts[facet] = {value: count for value, count in rows}
+        return counts
+
+    # ==================== 本地写入 ====================
+
+    def _segment_values(self, dataset_id: str, document_id: str, segment: Dict, synced_at: float) -> tuple:
+        content = segment.get('content') or ''
+        parsed = self.parser(dataset_id, document_id, content) or {}
+        created_at = segment.get('created_at') or 0
+        return (
+            segment['id'],
+            dataset_id,
+            document_id,
+            content,
+            json.dumps(segment.get('keywords') or [], ensure_ascii=False),
+            *(parsed.get(field) or '' for field in PARSED_FIELDS),
+            int(created_at),
+            int(segment.get('updated_at') or created_at),
+            synced_at,
+            self._extra_json(segment),
+        )
+
+    @staticmethod
+    def _extra_json(segment: Dict) -> str:
+        return json.dumps(
+            {key: value for key, value in segment.items() if key not in COLUMN_FIELDS},
+            ensure_ascii=False, sort_keys=True
+        )
+
+    def _upsert(self, values: List[tuple]):
+        self._conn.executemany('''
+            INSERT OR REPLACE INTO segments (
+                id, dataset_id, document_id, content, keywords,
+                question, answer, source, add_type, classification, add_method,
+                created_at, updated_at, synced_at, extra
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', values)
+
+    def put(self, dataset_id: str, document_id: str, segment: Dict):
+        """写入(或覆盖)单个分段"""
+        self.put_many(dataset_id, document_id, [segment])
+
+    def put_many(self, dataset_id: str, document_id: str, segments: Iterable[Dict]):
+        """批量写入同一文档的分段"""
+        now = time.time()
+        values = [
+            self._segment_values(dataset_id, document_id, segment, now)
+            for segment in segments if segment.get('id')
+        ]
+        if not values:
+            return
+        with self._lock, self._conn:
+            self._upsert(values)
+            self._conn.executemany(
+                'DELETE FROM segment_tombstones WHERE id = ?', [(value[0],) for value in values]
+            )
+
+    def update_content(self, segment_id: str, content: str, keywords: List[str] = None):
+        """更新分段内容(仅当分段已在存储中)"""
+        with self._lock:
+            segment = self.get(segment_id)
+            if not segment:
+                return
+            segment['content'] = content
+            if keywords is not None:
+                segment['keywords'] = keywords
+            segment['updated_at'] = int(time.time())
+            self.put(segment['dataset_id'], segment['document_id'], segment)
+
+    def remove(self, segment_id: str):
+        """移除分段(记录墓碑)"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM segments WHERE id = ?', (segment_id,))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO segment_tombstones (id, removed_at) VALUES (?, ?)',
+                (segment_id, time.time())
+            )
+
+    # ==================== 快照同步 ====================
+
+    def sync_document(self, dataset_id: str, document_id: str, segments: List[Dict],
+                      started_at: float, signature: str = None,
+                      protected_ids: Set[str] = None) -> Dict[str, int]:
+        """
+        用Dify快照同步一个文档
+
+        Args:
+            segments: 该文档在Dify中的全部分段
+            started_at: 开始拉取快照的时间,此后本地写入的分段不会被快照覆盖或删除
+            signature: 文档签名(用于下次增量同步判断是否变化)
+            protected_ids: 本地有尚未同步到Dify的写操作的分段,快照不覆盖也不删除
+
+        Returns:
+            {'added', 'updated', 'deleted', 'unchanged'}
+        """
+        summary = {'added': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        protected_ids = protected_ids or set()
+        now = time.time()
+
+        with self._lock, self._conn:
+            existing = {
+                row['id']: row
+                for row in self._conn.execute(
+                    'SELECT id, content, updated_at, synced_at, extra FROM segments '
+                    'WHERE dataset_id = ? AND document_id = ?',
+                    (dataset_id, document_id)
+                )
+            }
+            tombstones = {
+                row[0] for row in self._conn.execute(
+                    'SELECT id FROM segment_tombstones WHERE removed_at >= ?',
+                    (now - self.tombstone_ttl,)
+                )
+            }
+
+            seen = set()
+            values = []
+            max_updated_at = 0
+            for segment in segments:
+                segment_id = segment.get('id')
+                if not segment_id or segment_id in tombstones:
+                    continue
+                seen.add(segment_id)
+                updated_at = int(segment.get('updated_at') or segment.get('created_at') or 0)
+                max_updated_at = max(max_updated_at, updated_at)
+                if segment_id in protected_ids:
+                    continue
+
+                old = existing.get(segment_id)
+                if old is not None:
+                    # 内容未变但其他Dify字段(如hit_count)变化时也写入
+                    if (old['updated_at'] == updated_at and old['content'] == (segment.get('content') or '')
+                            and old['extra'] == self._extra_json(segment)):
+                        summary['unchanged'] += 1
+                        continue
+                    if old['synced_at'] >= started_at:
+                        # 快照开始后本地已写入,以本地为准
+                        continue
+                    summary['updated'] += 1
+                else:
+                    summary['added'] += 1
+                values.append(self._segment_values(dataset_id, document_id, segment, now))
+
+            if values:
+                self._upsert(values)
+
+            stale = [
+                (segment_id,) for segment_id, row in existing.items()
+                if segment_id not in seen and segment_id not in protected_ids and row['synced_at'] < started_at
+            ]
+            if stale:
+                self._conn.executemany('DELETE FROM segments WHERE id = ?', stale)
+            summary['deleted'] = len(stale)
+
+            self._conn.execute('''
+                INSERT OR REPLACE INTO sync_state (
+                    dataset_id, document_id, signature, segment_count, max_updated_at, last_sync
+                ) VALUES (?, ?, ?, ?, ?, ?)
+            ''', (dataset_id, document_id, signature, len(seen), max_updated_at, now))
+
+            self._conn.execute(
+                'DELETE FROM segment_tombstones WHERE removed_at < ?', (now - self.tombstone_ttl,)
+            )
+
+        return summary
+
+    def get_sync_state(self, dataset_id: str, document_id: str) -> Optional[Dict]:
+        """文档的同步状态"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT * FROM sync_state WHERE dataset_id = ? AND document_id = ?',
+                (dataset_id, document_id)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def sync_states(self) -> List[Dict]:
+        """全部文档的同步状态"""
+        with self._lock:
+            rows = self._conn.execute('SELECT * FROM sync_state ORDER BY dataset_id, document_id').fetchall()
+        return [dict(row) for row in rows]
+
+    def is_synced(self, dataset_id: str, document_ids: Iterable[str]) -> bool:
+        """知识库中的指定文档是否都已完成过同步"""
+        document_ids = list(document_ids)
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT COUNT(*) FROM sync_state WHERE dataset_id = ? '
+                f'AND document_id IN ({",".join("?" * len(document_ids))})',
+                (dataset_id, *document_ids)
+            ).fetchone()
+        return row[0] == len(document_ids)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM segments').fetchone()[0]
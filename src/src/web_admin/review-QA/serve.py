@@ -0,0 +1,123 @@
+"""
+QA审核与修正系统 - 生产部署入口
+====================================
+
+使用gunicorn运行 review_qa_backend.create_app():
+1. 多进程 × 多线程(gthread),进程数/线程数可配置
+2. 预加载(preload): 主进程创建应用并完成启动预热(拉取并解析两个知识库、预加载查重索引),
+   之后才fork工作进程开始接收请求,部署后第一个审核员无需等待冷加载
+3. fork前关闭主进程的SQLite连接,工作进程中重新打开
+4. 后台任务(写队列重放、转移恢复、镜像同步)只在持有文件锁的一个工作进程中运行
+5. 进程数大于1时审核计数直接写入统计数据库(REVIEW_STATS_WRITE_THROUGH=true),
+   各进程的今日/区间统计都包含其他进程刚记录的审核
+
+就绪检查: GET /api/ready (预热完成返回200,否则503)
+
+用法:
+    python serve.py
+    python serve.py --workers 4 --threads 16 --bind 0.0.0.0:5003
+
+环境变量(命令行参数优先):
+    REVIEW_BIND            监听地址,默认 0.0.0.0:5003
+    REVIEW_WORKERS         工作进程数,默认 2
+    REVIEW_THREADS         每个进程的线程数,默认 8
+    REVIEW_WORKER_TIMEOUT  单个请求超时(秒),默认 300(查重首次建索引耗时较长)
+    REVIEW_PRELOAD         是否预加载,默认 true
+    REVIEW_WARMUP_ENABLED  是否启动预热,默认 true(失败时各进程每 REVIEW_WARMUP_RETRY_INTERVAL 秒重试)
+
+gunicorn不可用(如Windows)时退化为单进程多线程的Werkzeug服务器。
+"""
+
+import argparse
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def pre_fork(server, worker):
+    """fork工作进程前关闭主进程持有的SQLite连接"""
+    import review_qa_backend
+    review_qa_backend.before_fork()
+
+
+def post_fork(server, worker):
+    """工作进程中重新打开SQLite连接"""
+    import review_qa_backend
+    review_qa_backend.after_fork()
+    server.log.info(f"工作进程已启动 [pid={worker.pid}]")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='QA审核与修正系统 - 生产部署入口')
+    parser.add_argument('--bind', default=os.getenv('REVIEW_BIND', '0.0.0.0:5003'), help='监听地址')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('REVIEW_WORKERS', '2')), help='工作进程数')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('REVIEW_THREADS', '8')), help='每个进程的线程数')
+    parser.add_argument('--timeout', type=int, default=int(os.getenv('REVIEW_WORKER_TIMEOUT', '300')),
+                        help='单个请求超时(秒)')
+    parser.add_argument('--no-preload', dest='preload', action='store_false',
+                        default=os.getenv('REVIEW_PRELOAD', 'true').lower() == 'true',
+                        help='不预加载(每个工作进程各自创建应用并预热)')
+    return parser.parse_args()
+
+
+def serve_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class ReviewApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': args.bind,
+                'workers': args.workers,
+                'threads': args.threads,
+                'worker_class': 'gthread',
+                'timeout': args.timeout,
+                'graceful_timeout': 30,
+                'preload_app': args.preload,
+                'pre_fork': pre_fork,
+                'post_fork': post_fork,
+                'accesslog': '-',
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from review_qa_backend import create_app
+            return create_app()
+
+    logger.info(
+        f"🌐 gunicorn启动中 [bind={args.bind}, 进程={args.workers}, 线程={args.threads}, "
+        f"预加载={'是' if args.preload else '否'}]"
+    )
+    ReviewApplication().run()
+
+
+def serve_werkzeug(args):
+    from werkzeug.serving import run_simple
+    from review_qa_backend import create_app
+
+    host, _, port = args.bind.rpartition(':')
+    logger.warning("⚠️ gunicorn不可用，使用单进程多线程的Werkzeug服务器")
+    run_simple(host or '0.0.0.0', int(port), create_app(), threaded=True, use_reloader=False, use_debugger=False)
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    args = parse_args()
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        serve_werkzeug(args)
+    else:
+        # 审核计数缓冲在各进程内，多进程时改为直写，保证统计接口在任一进程都准确
+        if args.workers > 1:
+            os.environ['REVIEW_STATS_WRITE_THROUGH'] = 'true'
+        serve_gunicorn(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -29,7 +29,10 @@ const state = {
     monthlyStats: {},
     
     // 编辑追踪状态
-    editedSegments: new Map() // 存储被编辑的分段 {segmentId: {question, answer, documentId}}
+    editedSegments: new Map(), // 存储被编辑的分段 {segmentId: {question, answer, documentId}}
+    
+    // 本页是否已询问过审核人
+    reviewerPrompted: false
 };
 
 // ==================== 初始化 ====================
@@ -769,7 +772,7 @@ async function confirmDocumentSelection() {
         
         const response = await fetch(`${API_BASE}/api/segment/approve`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: reviewerHeaders(true),
             body: JSON.stringify({
                 source_document_id: documentId,
                 segment_id: segmentId,
@@ -1371,55 +1374,63 @@ async function saveCurrentPageEdits() {
     
     console.log(`💾 开始保存 ${state.editedSegments.size} 个编辑...`);
     
-    const savePromises = [];
+    // 一页的编辑合并为一次批量请求
+    const updates = [];
+    const sentEdits = new Map(state.editedSegments);
+    for (const [segmentId, editData] of sentEdits) {
+        updates.push({
+            document_id: editData.documentId,
+            segment_id: segmentId,
+            question: editData.question,
+            answer: editData.answer
+        });
+    }
     
-    for (const [segmentId, editData] of state.editedSegments) {
-        const promise = fetch(`${API_BASE}/api/segment/update`, {
+    try {
+        const response = await fetch(`${API_BASE}/api/segment/batch-update`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: reviewerHeaders(),
             body: JSON.stringify({
                 dataset_id: '1397b9d1-8e25-4269-ba12-046059a425b6', // 未审核知识库
-                document_id: editData.documentId,
-                segment_id: segmentId,
-                question: editData.question,
-                answer: editData.answer
+                updates
             })
-        })
-        .then(response => response.json())
-        .then(result => {
-            if (result.success) {
-                console.log(`✅ 分段 ${segmentId} 保存成功`);
-                // 更新state中的原始数据
-                const item = state.unreviewedData.find(i => i.id === segmentId);
-                if (item) {
-                    item.question = editData.question;
-                    item.answer = editData.answer;
+        });
+        
+        const result = await response.json();
+        
+        if (!result.success) {
+            console.error('❌ 批量保存失败:', result.error);
+            showToast('保存失败: ' + result.error, 'error');
+            return;
+        }
+        
+        // 更新state中的原始数据,只清除保存成功的编辑记录(失败的保留,下次保存时重试)
+        const editsById = new Map(updates.map(u => [u.segment_id, u]));
+        result.results.forEach(r => {
+            if (r.success) {
+                // 请求期间又被编辑过的分段保留新的编辑记录
+                if (state.editedSegments.get(r.segment_id) === sentEdits.get(r.segment_id)) {
+                    state.editedSegments.delete(r.segment_id);
+                }
+                const edit = editsById.get(r.segment_id);
+                const item = state.unreviewedData.find(i => i.id === r.segment_id);
+                if (item && edit) {
+                    item.question = edit.question;
+                    item.answer = edit.answer;
                 }
-                return { success: true, segmentId };
             } else {
-                console.error(`❌ 分段 ${segmentId} 保存失败:`, result.error);
-                return { success: false, segmentId, error: result.error };
+                console.error(`❌ 分段 ${r.segment_id} 保存失败:`, r.error);
             }
-        })
-        .catch(error => {
-            console.error(`❌ 分段 ${segmentId} 保存异常:`, error);
-            return { success: false, segmentId, error: error.message };
         });
         
-        savePromises.push(promise);
-    }
-    
-    const results = await Promise.all(savePromises);
-    const successCount = results.filter(r => r.success).length;
-    const failCount = results.filter(r => !r.success).length;
-    
-    // 清空编辑记录
-    state.editedSegments.clear();
-    
-    if (failCount === 0) {
-        showToast(`✅ 成功保存 ${successCount} 个编辑`, 'success');
-    } else {
-        showToast(`⚠️ 保存完成: 成功 ${successCount} 个, 失败 ${failCount} 个`, 'warning');
+        if (result.failed === 0) {
+            showToast(`✅ 成功保存 ${result.succeeded} 个编辑`, 'success');
+        } else {
+            showToast(`⚠️ 保存完成: 成功 ${result.succeeded} 个, 失败 ${result.failed} 个`, 'warning');
+        }
+    } catch (error) {
+        console.error('❌ 批量保存异常:', error);
+        showToast('网络错误，请稍后重试', 'error');
     }
 }
 
@@ -1443,7 +1454,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const similarityValue = document.getElementById('similarity-value');
     if (similaritySlider && similarityValue) {
         similaritySlider.addEventListener('input', (e) => {
-            similarityValue.textContent = e.target.value + '%';
+            similarityValue.textContent = formatSimilarityLabel(e.target.value);
         });
     }
     
@@ -1487,6 +1498,14 @@ async function handleCheckDuplicates() {
     await performDuplicateCheck(threshold);
 }
 
+// 最近一次查重返回的阈值扫描直方图（拖动滑块时预览重复组数）
+let duplicateHistogram = [];
+
+function formatSimilarityLabel(value) {
+    const bucket = duplicateHistogram.find(item => Math.round(item.threshold * 100) === parseInt(value));
+    return bucket ? `${value}% (${bucket.groups}组)` : `${value}%`;
+}
+
 async function performDuplicateCheck(threshold) {
     try {
         const response = await fetch(`${API_BASE}/api/reviewed/check-duplicates`, {
@@ -1498,6 +1517,11 @@ async function performDuplicateCheck(threshold) {
         const result = await response.json();
         
         if (result.success) {
+            duplicateHistogram = result.data.histogram || [];
+            const similarityValue = document.getElementById('similarity-value');
+            if (similarityValue) {
+                similarityValue.textContent = formatSimilarityLabel(Math.round(threshold * 100));
+            }
             renderDuplicateResults(result.data);
         } else {
             showToast('查重失败: ' + result.error, 'error');
@@ -1717,7 +1741,7 @@ async function performApproval(segmentId, sourceDocId, targetDocId, question, an
     try {
         const response = await fetch(`${API_BASE}/api/segment/approve`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: reviewerHeaders(true),
             body: JSON.stringify({
                 source_document_id: sourceDocId,
                 segment_id: segmentId,
@@ -1753,8 +1777,70 @@ async function performApproval(segmentId, sourceDocId, targetDocId, question, an
 document.addEventListener('DOMContentLoaded', () => {
     loadDocumentCategories();
     initThemeToggle();
+    initReviewer();
 });
 
+// ==================== 审核人 ====================
+
+const REVIEWER_STORAGE_KEY = 'review-qa-reviewer';
+
+function getReviewer() {
+    return (localStorage.getItem(REVIEWER_STORAGE_KEY) || '').trim();
+}
+
+function initReviewer() {
+    updateReviewerLabel();
+    
+    const reviewerBtn = document.getElementById('reviewer-btn');
+    if (reviewerBtn) {
+        reviewerBtn.addEventListener('click', promptReviewer);
+    }
+}
+
+// 输入审核人姓名并保存到 localStorage（取消时保持不变），返回当前审核人
+function promptReviewer() {
+    const input = window.prompt('请输入审核人姓名（用于审核统计和排行）', getReviewer());
+    if (input === null) {
+        return getReviewer();
+    }
+    
+    const reviewer = input.trim();
+    if (reviewer) {
+        localStorage.setItem(REVIEWER_STORAGE_KEY, reviewer);
+    } else {
+        localStorage.removeItem(REVIEWER_STORAGE_KEY);
+    }
+    updateReviewerLabel();
+    return reviewer;
+}
+
+function updateReviewerLabel() {
+    const reviewer = getReviewer();
+    const label = document.getElementById('reviewer-name');
+    const reviewerBtn = document.getElementById('reviewer-btn');
+    if (label) {
+        label.textContent = reviewer || '设置审核人';
+    }
+    if (reviewerBtn) {
+        reviewerBtn.classList.toggle('unset', !reviewer);
+    }
+}
+
+// 写操作请求头：携带审核人（X-Reviewer，URL编码）；askIfMissing时未设置审核人会询问一次
+function reviewerHeaders(askIfMissing = false) {
+    const headers = { 'Content-Type': 'application/json' };
+    
+    let reviewer = getReviewer();
+    if (!reviewer && askIfMissing && !state.reviewerPrompted) {
+        state.reviewerPrompted = true;
+        reviewer = promptReviewer();
+    }
+    if (reviewer) {
+        headers['X-Reviewer'] = encodeURIComponent(reviewer);
+    }
+    return headers;
+}
+
 // ==================== 主题切换 ====================
 
 function initThemeToggle() {
@@ -0,0 +1,507 @@
+"""
+审核统计存储 - 连接池 + WAL模式的SQLite访问层
+====================================
+
+功能:
+1. 复用数据库连接(连接池),避免每次请求重新connect、建目录、关闭
+2. WAL日志模式:统计读取不阻塞审核写入,写入之间按busy_timeout等待而不是立即报错
+3. SQL语句固定为模块常量,依赖sqlite3的语句缓存复用预编译语句
+4. 审核计数先在内存中合并,定期(及退出时)一次事务批量写入
+5. 审核事件明细(审核人、源文档、目标分类、分段)只追加写入,
+   同一事务内增量维护按日/按月 × 审核人 × 目标分类的汇总表,排行与分类统计只查汇总表
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 预编译语句（sqlite3按SQL文本缓存已编译语句）
+SQL_CREATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS approval_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        approval_date DATE NOT NULL,
+        count INTEGER DEFAULT 0,
+        UNIQUE(approval_date)
+    )
+'''
+SQL_INCREMENT = '''
+    INSERT INTO approval_stats (approval_date, count)
+    VALUES (?, ?)
+    ON CONFLICT(approval_date)
+    DO UPDATE SET count = count + excluded.count
+'''
+SQL_CREATE_EVENTS = '''
+    CREATE TABLE IF NOT EXISTS approval_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reviewer TEXT NOT NULL,
+        source_document_id TEXT NOT NULL,
+        target_document_id TEXT NOT NULL,
+        segment_id TEXT NOT NULL,
+        approved_at REAL NOT NULL,
+        approval_date DATE NOT NULL
+    )
+'''
+SQL_CREATE_ROLLUP_DAILY = '''
+    CREATE TABLE IF NOT EXISTS approval_rollup_daily (
+        approval_date DATE NOT NULL,
+        reviewer TEXT NOT NULL,
+        target_document_id TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (approval_date, reviewer, target_document_id)
+    )
+'''
+SQL_CREATE_ROLLUP_MONTHLY = '''
+    CREATE TABLE IF NOT EXISTS approval_rollup_monthly (
+        approval_month TEXT NOT NULL,
+        reviewer TEXT NOT NULL,
+        target_document_id TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (approval_month, reviewer, target_document_id)
+    )
+'''
+SQL_CREATE_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_events_date ON approval_events(approval_date)',
+    'CREATE INDEX IF NOT EXISTS idx_events_reviewer ON approval_events(reviewer, approval_date)',
+    'CREATE INDEX IF NOT EXISTS idx_events_segment ON approval_events(segment_id)',
+    'CREATE INDEX IF NOT EXISTS idx_rollup_daily_reviewer ON approval_rollup_daily(reviewer, approval_date)',
+    'CREATE INDEX IF NOT EXISTS idx_rollup_daily_target ON approval_rollup_daily(target_document_id, approval_date)',
+    'CREATE INDEX IF NOT EXISTS idx_rollup_monthly_reviewer ON approval_rollup_monthly(reviewer, approval_month)',
+]
+SQL_INSERT_EVENT = '''
+    INSERT INTO approval_events (
+        reviewer, source_document_id, target_document_id, segment_id, approved_at, approval_date
+    ) VALUES (?, ?, ?, ?, ?, ?)
+'''
+SQL_ROLLUP_DAILY = '''
+    INSERT INTO approval_rollup_daily (approval_date, reviewer, target_document_id, count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(approval_date, reviewer, target_document_id)
+    DO UPDATE SET count = count + excluded.count
+'''
+SQL_ROLLUP_MONTHLY = '''
+    INSERT INTO approval_rollup_monthly (approval_month, reviewer, target_document_id, count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(approval_month, reviewer, target_document_id)
+    DO UPDATE SET count = count + excluded.count
+'''
+# 区间分桶统计：递归CTE生成区间内每一天（无审核的日期补0），按桶汇总后用窗口函数计算移动平均
+BUCKET_EXPRESSIONS = {
+    'day': 'd',
+    'week': "date(d, '-6 days', 'weekday 1')",  # 所在周的周一
+    'month': "substr(d, 1, 7) || '-01'",         # 所在月的1日
+}
+SQL_BUCKETED = '''
+    WITH RECURSIVE days(d) AS (
+        SELECT date(?)
+        UNION ALL
+        SELECT date(d, '+1 day') FROM days WHERE d < date(?, '-1 day')
+    ),
+    buckets AS (
+        SELECT {bucket_expr} AS bucket, COALESCE(s.count, 0) AS count
+        FROM days LEFT JOIN approval_stats s ON s.approval_date = days.d
+    ),
+    totals AS (
+        SELECT bucket, SUM(count) AS total FROM buckets GROUP BY bucket
+    )
+    SELECT bucket, total,
+           AVG(total) OVER (ORDER BY bucket ROWS BETWEEN ? PRECEDING AND CURRENT ROW) AS moving_avg
+    FROM totals
+    ORDER BY bucket
+'''
+SQL_DAY_COUNT = 'SELECT count FROM approval_stats WHERE approval_date = ?'
+SQL_RANGE = '''
+    SELECT approval_date, count
+    FROM approval_stats
+    WHERE approval_date >= ? AND approval_date < ?
+    ORDER BY approval_date
+'''
+
+
+class StatsStore:
+    """审核统计数据库访问层（线程安全）"""
+
+    def __init__(self, db_path: Path, pool_size: int = 8, busy_timeout_ms: int = 5000):
+        """
+        Args:
+            db_path: 数据库路径
+            pool_size: 连接池最大连接数
+            busy_timeout_ms: 数据库被锁定时的等待时间(毫秒)
+        """
+        self.db_path = Path(db_path)
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._pool: queue.Queue = queue.Queue(maxsize=pool_size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=32
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """从连接池借出一个连接,用完归还(连接全部借出且busy_timeout内未归还时抛出TimeoutError)"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.pool_size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._create_connection()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._pool.get(timeout=self.busy_timeout_ms / 1000)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"统计数据库繁忙: {self.pool_size}个连接均被占用，"
+                        f"等待{self.busy_timeout_ms / 1000:g}秒后仍无空闲连接"
+                    ) from None
+
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def init_db(self):
+        """初始化统计表"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connection() as conn:
+            conn.execute(SQL_CREATE_TABLE)
+            conn.execute(SQL_CREATE_EVENTS)
+            conn.execute(SQL_CREATE_ROLLUP_DAILY)
+            conn.execute(SQL_CREATE_ROLLUP_MONTHLY)
+            for sql in SQL_CREATE_INDEXES:
+                conn.execute(sql)
+            conn.commit()
+        logger.info("✅ 审核统计数据库初始化完成 [db_path=%s]", self.db_path)
+
+    def increment(self, approval_date: str, count: int = 1):
+        """累加某日审核条数"""
+        with self.connection() as conn:
+            conn.execute(SQL_INCREMENT, (approval_date, count))
+            conn.commit()
+
+    def increment_many(self, deltas: Dict[str, int], events: List[Dict] = None):
+        """
+        在一个事务中累加多日审核条数,并追加审核事件、增量维护汇总表
+
+        Args:
+            deltas: {approval_date: count}
+            events: 审核事件列表,见 make_approval_event
+        """
+        events = events or []
+        daily: Dict[tuple, int] = {}
+        monthly: Dict[tuple, int] = {}
+        for event in events:
+            day_key = (event['approval_date'], event['reviewer'], event['target_document_id'])
+            month_key = (event['approval_date'][:7], event['reviewer'], event['target_document_id'])
+            daily[day_key] = daily.get(day_key, 0) + 1
+            monthly[month_key] = monthly.get(month_key, 0) + 1
+
+        with self.connection() as conn:
+            conn.executemany(SQL_INCREMENT, deltas.items())
+            conn.executemany(SQL_INSERT_EVENT, [
+                (event['reviewer'], event['source_document_id'], event['target_document_id'],
+                 event['segment_id'], event['approved_at'], event['approval_date'])
+                for event in events
+            ])
+            conn.executemany(SQL_ROLLUP_DAILY, [(*key, count) for key, count in daily.items()])
+            conn.executemany(SQL_ROLLUP_MONTHLY, [(*key, count) for key, count in monthly.items()])
+            conn.commit()
+
+    def get_day_count(self, approval_date: str) -> int:
+        """获取某日审核条数"""
+        with self.connection() as conn:
+            row = conn.execute(SQL_DAY_COUNT, (approval_date,)).fetchone()
+        return row[0] if row else 0
+
+    def get_range(self, start_date: str, end_date: str) -> Dict[str, int]:
+        """获取 [start_date, end_date) 区间内每日审核条数"""
+        with self.connection() as conn:
+            rows = conn.execute(SQL_RANGE, (start_date, end_date)).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def get_bucketed(self, start_date: str, end_date: str, bucket: str = 'day', window: int = 7) -> List[Dict]:
+        """
+        区间分桶统计
+
+        Args:
+            start_date: 起始日期(含) YYYY-MM-DD
+            end_date: 结束日期(不含) YYYY-MM-DD
+            bucket: day / week / month
+            window: 移动平均窗口(桶数)
+
+        Returns:
+            [{'bucket': 桶起始日期, 'count': 条数, 'moving_avg': 移动平均}]
+        """
+        if bucket not in BUCKET_EXPRESSIONS:
+            raise ValueError(f"不支持的分桶方式: {bucket}")
+
+        sql = SQL_BUCKETED.format(bucket_expr=BUCKET_EXPRESSIONS[bucket])
+        with self.connection() as conn:
+            rows = conn.execute(sql, (start_date, end_date, max(window, 1) - 1)).fetchall()
+        return [
+            {'bucket': row[0], 'count': row[1], 'moving_avg': round(row[2], 2)}
+            for row in rows
+        ]
+
+    def get_leaderboard(self, start_date: str, end_date: str, limit: int = 20) -> List[Dict]:
+        """审核人排行([start_date, end_date),查按日汇总表)"""
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT reviewer, SUM(count) AS total
+                FROM approval_rollup_daily
+                WHERE approval_date >= ? AND approval_date < ?
+                GROUP BY reviewer
+                ORDER BY total DESC, reviewer
+                LIMIT ?
+            ''', (start_date, end_date, limit)).fetchall()
+        return [{'reviewer': row[0], 'count': row[1]} for row in rows]
+
+    def get_monthly_leaderboard(self, approval_month: str, limit: int = 20) -> List[Dict]:
+        """某月审核人排行(查按月汇总表)"""
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT reviewer, SUM(count) AS total
+                FROM approval_rollup_monthly
+                WHERE approval_month = ?
+                GROUP BY reviewer
+                ORDER BY total DESC, reviewer
+                LIMIT ?
+            ''', (approval_month, limit)).fetchall()
+        return [{'reviewer': row[0], 'count': row[1]} for row in rows]
+
+    def get_category_counts(self, start_date: str, end_date: str, reviewer: str = None) -> Dict[str, int]:
+        """各目标分类的审核条数(可按审核人过滤)"""
+        sql = '''
+            SELECT target_document_id, SUM(count)
+            FROM approval_rollup_daily
+            WHERE approval_date >= ? AND approval_date < ?
+        '''
+        params = [start_date, end_date]
+        if reviewer:
+            sql += ' AND reviewer = ?'
+            params.append(reviewer)
+        sql += ' GROUP BY target_document_id'
+
+        with self.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def get_reviewer_range(self, reviewer: str, start_date: str, end_date: str) -> Dict[str, int]:
+        """某审核人 [start_date, end_date) 区间内每日审核条数(日历视图)"""
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT approval_date, SUM(count)
+                FROM approval_rollup_daily
+                WHERE reviewer = ? AND approval_date >= ? AND approval_date < ?
+                GROUP BY approval_date
+                ORDER BY approval_date
+            ''', (reviewer, start_date, end_date)).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def close(self):
+        """关闭连接池中的所有连接"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+class BufferedApprovalCounter:
+    """
+    审核计数缓冲器
+
+    审核通过只在内存中累加当日增量,后台线程定期把合并后的增量一次写入数据库,
+    读取时合并未写入的增量,保证统计结果实时准确。
+
+    未写入的增量只在本进程可见,多进程部署时需开启write_through(每次审核直接写入数据库),
+    否则其他进程读到的统计会缺少本进程尚未写入的部分。
+    """
+
+    def __init__(self, store: StatsStore, flush_interval: float = 5.0, write_through: bool = False):
+        """
+        Args:
+            store: 统计数据库访问层
+            flush_interval: 写入间隔(秒)
+            write_through: 每次记录直接写入数据库(写入失败时放入缓冲区,由定期写入重试)
+        """
+        self.store = store
+        self.flush_interval = flush_interval
+        self.write_through = write_through
+
+        self._pending: Dict[str, int] = {}
+        self._pending_events: List[Dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._worker = None
+
+    def record(self, approval_date: str, count: int = 1, events: List[Dict] = None):
+        """记录审核条数及审核事件(默认仅内存累加,write_through时直接写入数据库)"""
+        if self.write_through:
+            try:
+                self.store.increment_many({approval_date: count}, events)
+                return
+            except Exception as e:
+                logger.error(f"❌ 审核统计写入失败,放入缓冲区稍后重试: {e}")
+
+        with self._lock:
+            self._pending[approval_date] = self._pending.get(approval_date, 0) + count
+            if events:
+                self._pending_events.extend(events)
+
+    def flush(self) -> int:
+        """将未写入的增量一次事务写入数据库,返回写入的天数"""
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._pending = self._pending, {}
+                events, self._pending_events = self._pending_events, []
+
+            if not deltas and not events:
+                return 0
+
+            try:
+                self.store.increment_many(deltas, events)
+            except Exception as e:
+                # 写入失败时放回缓冲区,下次重试
+                with self._lock:
+                    for approval_date, count in deltas.items():
+                        self._pending[approval_date] = self._pending.get(approval_date, 0) + count
+                    self._pending_events[:0] = events
+                logger.error(f"❌ 审核统计写入失败,稍后重试: {e}")
+                return 0
+
+            return len(deltas)
+
+    def _pending_snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._pending)
+
+    def get_day_count(self, approval_date: str) -> int:
+        """获取某日审核条数(含未写入的增量,持有写入锁保证不重复计算)"""
+        with self._flush_lock:
+            pending = self._pending_snapshot().get(approval_date, 0)
+            return self.store.get_day_count(approval_date) + pending
+
+    def get_range(self, start_date: str, end_date: str) -> Dict[str, int]:
+        """获取 [start_date, end_date) 区间内每日审核条数(含未写入的增量)"""
+        with self._flush_lock:
+            stats = self.store.get_range(start_date, end_date)
+            for approval_date, count in self._pending_snapshot().items():
+                if start_date <= approval_date < end_date:
+                    stats[approval_date] = stats.get(approval_date, 0) + count
+        return dict(sorted(stats.items()))
+
+    def _pending_events_where(self, match: Callable[[Dict], bool]) -> List[Dict]:
+        with self._lock:
+            return [event for event in self._pending_events if match(event)]
+
+    @staticmethod
+    def _rank(rows: List[Dict], events: List[Dict], limit: int) -> List[Dict]:
+        totals = {row['reviewer']: row['count'] for row in rows}
+        for event in events:
+            totals[event['reviewer']] = totals.get(event['reviewer'], 0) + 1
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        if limit >= 0:
+            ranked = ranked[:limit]
+        return [{'reviewer': reviewer, 'count': count} for reviewer, count in ranked]
+
+    def get_leaderboard(self, start_date: str, end_date: str, limit: int = 20) -> List[Dict]:
+        """审核人排行(含未写入的审核事件)"""
+        with self._flush_lock:
+            events = self._pending_events_where(lambda e: start_date <= e['approval_date'] < end_date)
+            # 有未写入的事件时取全部审核人再合并排序(-1表示不限条数)
+            rows = self.store.get_leaderboard(start_date, end_date, -1 if events else limit)
+        return self._rank(rows, events, limit)
+
+    def get_monthly_leaderboard(self, approval_month: str, limit: int = 20) -> List[Dict]:
+        """某月审核人排行(含未写入的审核事件)"""
+        with self._flush_lock:
+            events = self._pending_events_where(lambda e: e['approval_date'][:7] == approval_month)
+            rows = self.store.get_monthly_leaderboard(approval_month, -1 if events else limit)
+        return self._rank(rows, events, limit)
+
+    def get_category_counts(self, start_date: str, end_date: str, reviewer: str = None) -> Dict[str, int]:
+        """各目标分类的审核条数(含未写入的审核事件)"""
+        with self._flush_lock:
+            counts = self.store.get_category_counts(start_date, end_date, reviewer)
+            events = self._pending_events_where(
+                lambda e: start_date <= e['approval_date'] < end_date and (not reviewer or e['reviewer'] == reviewer)
+            )
+        for event in events:
+            counts[event['target_document_id']] = counts.get(event['target_document_id'], 0) + 1
+        return counts
+
+    def get_reviewer_range(self, reviewer: str, start_date: str, end_date: str) -> Dict[str, int]:
+        """某审核人 [start_date, end_date) 区间内每日审核条数(含未写入的审核事件)"""
+        with self._flush_lock:
+            stats = self.store.get_reviewer_range(reviewer, start_date, end_date)
+            events = self._pending_events_where(
+                lambda e: e['reviewer'] == reviewer and start_date <= e['approval_date'] < end_date
+            )
+        for event in events:
+            stats[event['approval_date']] = stats.get(event['approval_date'], 0) + 1
+        return dict(sorted(stats.items()))
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        """启动定期写入线程"""
+        if self._worker and self._worker.is_alive():
+            return
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name='approval-counter', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        """停止定期写入并写入剩余增量"""
+        self._stopping.set()
+        if self._worker:
+            self._worker.join(self.flush_interval)
+        self.flush()
+
+
+def make_approval_event(reviewer: str, source_document_id: str, target_document_id: str,
+                        segment_id: str, approved_at: float = None) -> Dict:
+    """构造一条审核事件"""
+    approved_at = approved_at if approved_at is not None else datetime.now().timestamp()
+    return {
+        'reviewer': reviewer,
+        'source_document_id': source_document_id,
+        'target_document_id': target_document_id,
+        'segment_id': segment_id,
+        'approved_at': approved_at,
+        'approval_date': datetime.fromtimestamp(approved_at).date().isoformat()
+    }
@@ -0,0 +1,361 @@
+"""
+Dify写操作队列 - write-behind模式
+====================================
+
+功能:
+1. 审核操作先写入本地分段存储并立即返回,Dify调用排入SQLite持久化队列(outbox)
+2. 后台线程按入队顺序重放到Dify,同一分段的操作严格按顺序执行
+3. 失败自动重试(指数退避),超过最大次数标记为failed,并取消该分段后续的依赖操作
+4. 提供队列统计、失败列表和手动重试,供前端展示
+   (重试被取消的操作时,与导致取消的失败操作一起重新排队,保证分段内顺序)
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class DifyOutbox:
+    """SQLite持久化的Dify写操作队列"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        handlers: Dict[str, Callable[[Dict], Dict]],
+        max_attempts: int = 5,
+        poll_interval: float = 1.0,
+        max_backoff: float = 60.0
+    ):
+        """
+        Args:
+            db_path: 队列数据库路径
+            handlers: 操作类型 -> 处理函数(payload, attempted) -> {'success': bool, 'error': str}
+                attempted为True表示之前执行过(可能已在Dify生效,如响应超时),非幂等操作需先检查
+            max_attempts: 最大尝试次数
+            poll_interval: 空闲时的轮询间隔(秒)
+            max_backoff: 重试退避上限(秒)
+        """
+        self.db_path = Path(db_path)
+        self.handlers = handlers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self.init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path), timeout=10)
+
+    def init_db(self):
+        """初始化队列表"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS dify_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                op TEXT NOT NULL,
+                segment_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                executions INTEGER NOT NULL DEFAULT 0,
+                blocked_by INTEGER
+            )
+        ''')
+        # 旧版本队列表补充列: executions(累计执行次数,手动重试不清零) / blocked_by(被哪个失败操作取消)
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(dify_outbox)')}
+        if 'executions' not in columns:
+            conn.execute('ALTER TABLE dify_outbox ADD COLUMN executions INTEGER NOT NULL DEFAULT 0')
+        if 'blocked_by' not in columns:
+            conn.execute('ALTER TABLE dify_outbox ADD COLUMN blocked_by INTEGER')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_status ON dify_outbox(status, next_attempt_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_segment ON dify_outbox(segment_id, status)')
+        conn.commit()
+        conn.close()
+
+    def enqueue(self, op: str, segment_id: str, payload: Dict) -> int:
+        """写操作入队,返回队列ID"""
+        return self.enqueue_many([(op, segment_id, payload)])[0]
+
+    def enqueue_many(self, entries: List[tuple]) -> List[int]:
+        """
+        多个写操作在同一事务中入队(如转移 = 添加 + 删除)
+
+        Args:
+            entries: [(op, segment_id, payload)]
+
+        Returns:
+            队列ID列表
+        """
+        for op, _, _ in entries:
+            if op not in self.handlers:
+                raise ValueError(f"未知的队列操作类型: {op}")
+
+        now = time.time()
+        conn = self._connect()
+        entry_ids = []
+        with conn:
+            for op, segment_id, payload in entries:
+                cursor = conn.execute('''
+                    INSERT INTO dify_outbox (op, segment_id, payload, created_at, next_attempt_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (op, segment_id, json.dumps(payload, ensure_ascii=False), now, now))
+                entry_ids.append(cursor.lastrowid)
+        conn.close()
+
+        self._wakeup.set()
+        return entry_ids
+
+    # ==================== 后台重放 ====================
+
+    def start(self):
+        """启动后台重放线程(幂等)"""
+        with self._start_lock:
+            if self._worker and self._worker.is_alive():
+                return
+
+            # 上次进程退出时执行中的操作重新排队
+            conn = self._connect()
+            conn.execute("UPDATE dify_outbox SET status = 'pending' WHERE status = 'running'")
+            conn.commit()
+            conn.close()
+
+            self._stopping.clear()
+            self._worker = threading.Thread(target=self._run, name='dify-outbox', daemon=True)
+            self._worker.start()
+            logger.info(f"✅ Dify写队列已启动 [db_path={self.db_path}]")
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台重放线程"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._worker:
+            self._worker.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                processed = self.process_once()
+            except Exception as e:
+                logger.error(f"❌ Dify写队列处理异常: {e}", exc_info=True)
+                processed = 0
+
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim_ready(self, limit: int) -> List[tuple]:
+        """
+        领取可执行的操作
+
+        同一分段只领取最早的一条待执行操作,保证分段内顺序。
+        """
+        conn = self._connect()
+        rows = conn.execute('''
+            SELECT id, op, segment_id, payload, attempts, executions
+            FROM dify_outbox o
+            WHERE status = 'pending' AND next_attempt_at <= ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM dify_outbox p
+                  WHERE p.segment_id = o.segment_id
+                    AND p.status IN ('pending', 'running')
+                    AND p.id < o.id
+              )
+            ORDER BY id
+            LIMIT ?
+        ''', (time.time(), limit)).fetchall()
+
+        claimed = []
+        for row in rows:
+            cursor = conn.execute(
+                "UPDATE dify_outbox SET status = 'running', executions = executions + 1 WHERE id = ? AND status = 'pending'",
+                (row[0],)
+            )
+            if cursor.rowcount:
+                claimed.append(row)
+        conn.commit()
+        conn.close()
+        return claimed
+
+    def process_once(self, limit: int = 20) -> int:
+        """处理一轮可执行的操作,返回处理条数"""
+        claimed = self._claim_ready(limit)
+
+        for entry_id, op, segment_id, payload, attempts, executions in claimed:
+            attempts += 1
+            try:
+                result = self.handlers[op](json.loads(payload), executions > 0)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+
+            if result.get('success'):
+                self._finish(entry_id, attempts)
+            else:
+                self._fail(entry_id, segment_id, op, attempts, result.get('error', '未知错误'))
+
+        return len(claimed)
+
+    def _finish(self, entry_id: int, attempts: int):
+        conn = self._connect()
+        conn.execute(
+            "UPDATE dify_outbox SET status = 'done', attempts = ?, last_error = NULL WHERE id = ?",
+            (attempts, entry_id)
+        )
+        conn.commit()
+        conn.close()
+
+    def _fail(self, entry_id: int, segment_id: str, op: str, attempts: int, error: str):
+        conn = self._connect()
+
+        if attempts >= self.max_attempts:
+            conn.execute(
+                "UPDATE dify_outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, error, entry_id)
+            )
+            # 取消同一分段的后续操作(如转移时添加失败,则不再删除原分段)
+            conn.execute('''
+                UPDATE dify_outbox SET status = 'failed', last_error = ?, blocked_by = ?
+                WHERE segment_id = ? AND status = 'pending' AND id > ?
+            ''', (f'前序操作失败(#{entry_id})', entry_id, segment_id, entry_id))
+            logger.error(f"❌ Dify写操作失败 [id={entry_id}, op={op}, segment_id={segment_id}]: {error}")
+        else:
+            backoff = min(2 ** attempts, self.max_backoff)
+            conn.execute('''
+                UPDATE dify_outbox
+                SET status = 'pending', attempts = ?, last_error = ?, next_attempt_at = ?
+                WHERE id = ?
+            ''', (attempts, error, time.time() + backoff, entry_id))
+            logger.warning(f"⚠️ Dify写操作重试 [id={entry_id}, op={op}, 第{attempts}次, {backoff}秒后]: {error}")
+
+        conn.commit()
+        conn.close()
+
+    # ==================== 查询与管理 ====================
+
+    def stats(self) -> Dict[str, int]:
+        """各状态的操作数量"""
+        conn = self._connect()
+        rows = conn.execute('SELECT status, COUNT(*) FROM dify_outbox GROUP BY status').fetchall()
+        conn.close()
+        stats = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        stats.update({status: count for status, count in rows})
+        return stats
+
+    def failures(self, limit: int = 50) -> List[Dict]:
+        """最近失败的操作"""
+        conn = self._connect()
+        rows = conn.execute('''
+            SELECT id, op, segment_id, payload, attempts, last_error, created_at, blocked_by
+            FROM dify_outbox WHERE status = 'failed'
+            ORDER BY id DESC LIMIT ?
+        ''', (limit,)).fetchall()
+        conn.close()
+        return [
+            {
+                'id': row[0],
+                'op': row[1],
+                'segment_id': row[2],
+                'payload': json.loads(row[3]),
+                'attempts': row[4],
+                'error': row[5],
+                'created_at': int(row[6]),
+                'blocked_by': row[7]
+            }
+            for row in rows
+        ]
+
+    def retry(self, entry_id: int) -> List[int]:
+        """
+        将失败的操作重新排队
+
+        被前序失败取消的操作不能单独重试(如转移时添加失败后单独重试删除,会丢失分段),
+        重试时连同导致取消的失败操作及其取消的全部操作一起重新排队。
+
+        Returns:
+            重新排队的队列ID列表(操作不存在或未失败时为空)
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT blocked_by FROM dify_outbox WHERE id = ? AND status = 'failed'", (entry_id,)
+        ).fetchone()
+        if not row:
+            conn.close()
+            return []
+
+        root_id = row[0] or entry_id
+        requeued = [
+            row[0] for row in conn.execute('''
+                SELECT id FROM dify_outbox
+                WHERE status = 'failed' AND (id = ? OR blocked_by = ?)
+                ORDER BY id
+            ''', (root_id, root_id)).fetchall()
+        ]
+        conn.execute(f'''
+            UPDATE dify_outbox SET status = 'pending', attempts = 0, blocked_by = NULL, next_attempt_at = ?
+            WHERE id IN ({', '.join('?' * len(requeued))})
+        ''', (time.time(), *requeued))
+        conn.commit()
+        conn.close()
+
+        logger.info(f"🔄 Dify写操作重新排队 [ids={requeued}]")
+        self._wakeup.set()
+        return requeued
+
+    def has_pending(self, segment_id: str) -> bool:
+        """分段是否有尚未同步到Dify的操作"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT 1 FROM dify_outbox WHERE segment_id = ? AND status IN ('pending', 'running') LIMIT 1",
+            (segment_id,)
+        ).fetchone()
+        conn.close()
+        return row is not None
+
+    def pending_segment_ids(self, op: str = None) -> Set[str]:
+        """尚未同步到Dify的分段ID(可按操作类型过滤)"""
+        conn = self._connect()
+        if op:
+            rows = conn.execute(
+                "SELECT DISTINCT segment_id FROM dify_outbox WHERE status IN ('pending', 'running') AND op = ?",
+                (op,)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT DISTINCT segment_id FROM dify_outbox WHERE status IN ('pending', 'running')"
+            ).fetchall()
+        conn.close()
+        return {row[0] for row in rows}
+
+    def pending_entries(self) -> List[Dict]:
+        """尚未同步到Dify的操作,按入队顺序"""
+        conn = self._connect()
+        rows = conn.execute('''
+            SELECT id, op, segment_id, payload, created_at
+            FROM dify_outbox WHERE status IN ('pending', 'running')
+            ORDER BY id
+        ''').fetchall()
+        conn.close()
+        return [
+            {
+                'id': row[0],
+                'op': row[1],
+                'segment_id': row[2],
+                'payload': json.loads(row[3]),
+                'created_at': int(row[4])
+            }
+            for row in rows
+        ]
@@ -15,11 +15,17 @@ sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 import asyncio
 import json
 import logging
+import os
+import time
 from datetime import datetime
+from pathlib import Path
 from typing import Set, Dict
 import websockets
 # 使用新版websockets API
 
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'mcp_services'))
+from common.metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Gauge, Histogram
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -32,12 +38,40 @@ clients: Dict[str, set] = {
     'session_manager': set()    # 会话管理系统客户端
 }
 
+# 运行指标（GET http://localhost:8007/metrics）
+METRICS_PORT = int(os.getenv("WS_METRICS_PORT", "8007"))
+
+WS_CONNECTIONS = Gauge('ws_connections', '当前连接数', ['client_type'])
+WS_REGISTRATIONS = Counter('ws_registrations_total', '客户端注册次数', ['client_type'])
+WS_DISCONNECTS = Counter('ws_disconnects_total', '客户端断开次数', ['client_type'])
+WS_MESSAGES_RECEIVED = Counter('ws_messages_received_total', '收到的消息数', ['type'])
+# 消息类型由客户端填写,不在此列表中的计为other(避免任意取值撑大指标)
+KNOWN_MESSAGE_TYPES = {'register', 'ping', 'qa_pending', 'qa_approved', 'qa_rejected'}
+WS_BROADCASTS = Counter('ws_broadcasts_total', '广播次数', ['client_type'])
+WS_MESSAGES_SENT = Counter('ws_messages_sent_total', '成功发送的消息数', ['client_type'])
+WS_SEND_FAILURES = Counter('ws_send_failures_total', '发送失败数', ['client_type'])
+WS_BROADCAST_LATENCY = Histogram(
+    'ws_broadcast_duration_seconds', '单次广播耗时(秒)', ['client_type'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+
+
+def watch_connections(client_type: str):
+    """采集时读取该类型的当前连接数"""
+    WS_CONNECTIONS.labels(client_type).set_function(lambda: len(clients.get(client_type, ())))
+
+
+for _client_type in clients:
+    watch_connections(_client_type)
+
 async def register_client(websocket, client_type: str):
     """注册客户端"""
     if client_type not in clients:
         clients[client_type] = set()
+        watch_connections(client_type)
     
     clients[client_type].add(websocket)
+    WS_REGISTRATIONS.labels(client_type).inc()
     logger.info(f"✅ {client_type}客户端已连接, 当前连接数: {len(clients[client_type])}")
     
     # 发送连接统计
@@ -49,6 +83,7 @@ async def unregister_client(websocket):
     for client_type, client_set in clients.items():
         if websocket in client_set:
             client_set.remove(websocket)
+            WS_DISCONNECTS.labels(client_type).inc()
             logger.info(f"❌ {client_type}客户端已断开, 当前连接数: {len(client_set)}")
             break
 
@@ -64,6 +99,7 @@ async def broadcast_to_type(client_type: str, message: dict):
     
     disconnected = set()
     success_count = 0
+    started = time.perf_counter()
     
     for client in clients[client_type]:
         try:
@@ -79,6 +115,11 @@ async def broadcast_to_type(client_type: str, message: dict):
     # 清理断开的连接
     clients[client_type] -= disconnected
     
+    WS_BROADCASTS.labels(client_type).inc()
+    WS_MESSAGES_SENT.labels(client_type).inc(success_count)
+    WS_SEND_FAILURES.labels(client_type).inc(len(disconnected))
+    WS_BROADCAST_LATENCY.labels(client_type).observe(time.perf_counter() - started)
+    
     logger.info(f"📤 消息已发送到{success_count}个{client_type}客户端")
 
 async def handle_message(websocket, message: dict):
@@ -127,6 +168,9 @@ WebSocket连接处理器"""
         async for message in websocket:
             try:
                 data = json.loads(message)
+                msg_type = data.get('type')
+                known = isinstance(msg_type, str) and msg_type in KNOWN_MESSAGE_TYPES
+                WS_MESSAGES_RECEIVED.labels(msg_type if known else 'other').inc()
                 
                 # 注册客户端
                 if data.get('type') == 'register':
@@ -185,12 +229,36 @@ async def heartbeat():
             if disconnected:
                 logger.info(f"💔 清理{len(disconnected)}个{client_type}断开连接")
 
+async def serve_metrics(reader, writer):
+    """指标HTTP接口（只处理 GET /metrics）"""
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+            status, content_type, body = '200 OK', METRICS_CONTENT_TYPE, REGISTRY.render().encode('utf-8')
+        else:
+            status, content_type, body = '404 Not Found', 'text/plain; charset=utf-8', b'Not Found\n'
+        
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.error(f"❌ 指标请求处理失败: {e}")
+    finally:
+        writer.close()
+
 async def main():
     """启动WebSocket服务器"""
     print("=" * 60)
     print("🚀 WebSocket通知服务器")
     print("=" * 60)
     print("📡 监听地址: ws://localhost:8005")
+    print(f"📈 运行指标: http://localhost:{METRICS_PORT}/metrics")
     print("🔗 支持客户端:")
     print("   - conversation: 简小助系统")
     print("   - session_manager: 会话管理系统")
@@ -202,6 +270,9 @@ async def main():
     # 启动心跳检测任务
     asyncio.create_task(heartbeat())
     
+    # 指标接口与WebSocket分开监听
+    await asyncio.start_server(serve_metrics, "0.0.0.0", METRICS_PORT)
+    
     async with websockets.serve(handler, "0.0.0.0", 8005):
         logger.info("✅ WebSocket服务器已启动")
         await asyncio.Future()  # 永久运行